@@ -0,0 +1,107 @@
+"""
+Aggregate cube answers against the live query, for correctness and latency.
+
+Loads bike_sales_india.csv into the embedded engine, builds the cube from it
+and runs every query both ways (best of --repeat). Rows are compared as
+multisets with a relative tolerance on numbers, since the cube sums
+per-cell partial aggregates in a different order than a table scan; for
+statements with ORDER BY the row order must match too. Queries the cube
+can't answer are reported as "live only".
+
+The live side is DuckDB, whose text ordering is not PostgreSQL's collation;
+the cube and the embedded engine both leave ORDER BY on text columns to
+PostgreSQL for that reason, so those queries show up as "PostgreSQL only".
+
+Usage (from the backend directory):
+    python -m bench.bench_aggregate_cube --repeat 50
+"""
+import argparse
+import math
+import os
+import re
+import time
+
+from src.utils.aggregate_cube import AggregateCube
+from src.utils.local_engine import LocalEngine
+
+CSV_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "bike_sales_india.csv")
+MAX_ROWS = 10001
+
+queries = [
+    "SELECT AVG(price_inr) FROM Motorcycle_sales WHERE brand = 'Honda' AND state = 'Maharashtra';",
+    "SELECT brand, AVG(resale_price_inr * 100.0 / price_inr) AS avg_resale_percentage FROM Motorcycle_sales GROUP BY brand ORDER BY avg_resale_percentage DESC;",
+    "SELECT state, model, COUNT(*) AS count FROM Motorcycle_sales GROUP BY state, model ORDER BY state, count DESC;",
+    "SELECT brand, AVG(price_inr) AS avg_price FROM Motorcycle_sales GROUP BY brand ORDER BY avg_price DESC;",
+    "SELECT state, COUNT(*) FROM Motorcycle_sales GROUP BY state ORDER BY COUNT(*) DESC;",
+    "SELECT fuel_type, ROUND(AVG(mileage_kmpl)::numeric, 2) AS avg_mileage FROM Motorcycle_sales GROUP BY fuel_type;",
+    "SELECT AVG(mileage_kmpl) AS avg_mileage FROM Motorcycle_sales WHERE year_of_manufacture < 2020;",
+    "SELECT city_tier, MIN(price_inr), MAX(price_inr), SUM(price_inr) FROM Motorcycle_sales WHERE year_of_manufacture BETWEEN 2018 AND 2021 GROUP BY city_tier;",
+    "SELECT owner_type, COUNT(*) FROM Motorcycle_sales WHERE seller_type = 'Dealer' GROUP BY owner_type;",
+    "SELECT COUNT(*) FROM Motorcycle_sales WHERE brand IN ('Honda', 'Bajaj');",
+    "SELECT CASE WHEN year_of_manufacture < 2020 THEN 'Before 2020' ELSE '2020 and After' END AS manufacture_period, AVG(mileage_kmpl) AS avg_mileage FROM Motorcycle_sales GROUP BY manufacture_period ORDER BY manufacture_period;",
+    "SELECT state, brand, fuel_type, COUNT(*) FROM Motorcycle_sales GROUP BY state, brand, fuel_type;",
+    "SELECT brand, COUNT(*) FROM Motorcycle_sales GROUP BY brand ORDER BY brand LIMIT 4;",
+    "SELECT year_of_manufacture, AVG(price_inr) AS avg_price FROM Motorcycle_sales GROUP BY year_of_manufacture ORDER BY year_of_manufacture DESC LIMIT 3;",
+]
+
+
+def best_time(run, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def normalized(rows):
+    # Floats rounded for ordering only; the comparison itself uses isclose
+    return sorted(rows, key=lambda row: tuple(round(float(v), 6) if isinstance(v, (int, float)) or v.__class__.__name__ == "Decimal" else str(v) for v in row))
+
+
+def same_rows(left, right, ordered=False):
+    """Rows equal as multisets, or as sequences when `ordered`"""
+    if len(left) != len(right):
+        return False
+    if not ordered:
+        left, right = normalized(left), normalized(right)
+    for a, b in zip(left, right):
+        for x, y in zip(a, b):
+            if isinstance(x, str) or isinstance(y, str) or x is None or y is None:
+                if x != y:
+                    return False
+            elif not math.isclose(float(x), float(y), rel_tol=1e-9):
+                return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    engine = LocalEngine(source=CSV_PATH)
+    engine.load()
+    cube = AggregateCube()
+    cube.build(engine)
+    print(f"cube: {cube.cells} cells built in {cube.build_seconds * 1000:.0f} ms")
+
+    answered = 0
+    for query in queries:
+        live_time, live = best_time(lambda: engine.execute(query, MAX_ROWS), args.repeat)
+        cube_time, answer = best_time(lambda: cube.answer(query), args.repeat)
+        if live is None:
+            line = "PostgreSQL only (text ORDER BY)" + ("" if answer is None else "   cube ANSWERED")
+        elif answer is None:
+            line = f"live {live_time * 1000:7.3f} ms   live only"
+        else:
+            answered += 1
+            ordered = re.search(r"\border\s+by\b", query, re.IGNORECASE) is not None
+            match = "match" if same_rows(answer[1], live[1], ordered) else "MISMATCH"
+            line = f"live {live_time * 1000:7.3f} ms   cube {cube_time * 1000:7.3f} ms  {live_time / cube_time:6.1f}x  {match}"
+        print(f"{line:<60} {query[:70]}")
+    print(f"{answered}/{len(queries)} queries answered from the cube")
+
+
+if __name__ == "__main__":
+    main()
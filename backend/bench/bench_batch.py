@@ -0,0 +1,108 @@
+"""
+Throughput of /query/batch against answering the same questions one by one.
+
+Uses the stubbed LLM and database from bench_async_pipeline, with a SQL stub
+that returns a different statement per (normalized) question and a summary
+stub that answers batched prompts with one JSON summary per result. The
+question set repeats each distinct question a few times in different
+wordings, like a reporting job does. The caches stay disabled (as in
+bench_async_pipeline), so the speed-up comes from the batch itself.
+
+"one by one" awaits aresult() per question, as a job calling /query in a
+loop would; "batch" runs abatch_result() at each --concurrency.
+
+Usage (from the backend directory):
+    python -m bench.bench_batch --questions 500 --llm-latency 0.5 --db-latency 0.05 --concurrency 1 4 8 16 [--skip-one-by-one]
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import time
+
+from bench.bench_async_pipeline import StubLLM, StubMessage, install_stubs
+import src.index as index
+from src.utils import explain_query_result, generate_query
+from src.utils.sql_cache import normalize_question
+
+brands = ["Honda", "Bajaj", "Hero", "TVS", "Yamaha", "Royal Enfield", "KTM", "Suzuki"]
+states = ["Maharashtra", "Karnataka", "Delhi", "Gujarat", "Tamil Nadu", "Kerala", "Punjab", "Bihar"]
+metrics = ["price", "resale price", "mileage", "engine capacity"]
+# Wordings that normalize to the same question
+templates = [
+    "What is the average {metric} of {brand} motorcycles in {state}?",
+    "Show me the average {metric} for {brand} motorcycles in {state}",
+    "avg {metric} of {brand} bikes in {state}",
+]
+
+
+class QuestionSQLStub(StubLLM):
+    """A different statement per normalized question, as a real model would give"""
+
+    def _content(self, messages):
+        question = messages[-1][1].split("\n", 1)[-1]
+        key = hashlib.md5(normalize_question(question).encode("utf-8")).hexdigest()[:8]
+        return f"SELECT brand, AVG(price_inr) AS avg_price FROM Motorcycle_sales WHERE model = '{key}' GROUP BY brand;"
+
+    async def ainvoke(self, messages, **kwargs):
+        await asyncio.sleep(self.latency)
+        return StubMessage(self._content(messages))
+
+
+class BatchSummaryStub(StubLLM):
+    """Answers a batched prompt with a JSON object holding one summary per result"""
+
+    async def ainvoke(self, messages, **kwargs):
+        await asyncio.sleep(self.latency)
+        count = messages[-1][1].count("### Result ")
+        if count:
+            return StubMessage(json.dumps({str(number): f"{self.content} ({number})" for number in range(1, count + 1)}))
+        return StubMessage(self.content)
+
+
+def build_questions(count):
+    distinct = [(metric, brand, state) for metric in metrics for brand in brands for state in states]
+    questions = []
+    for index_ in range(count):
+        metric, brand, state = distinct[(index_ // len(templates)) % len(distinct)]
+        questions.append(templates[index_ % len(templates)].format(metric=metric, brand=brand, state=state))
+    return questions
+
+
+async def one_by_one(questions):
+    for question in questions:
+        await index.aresult(question)
+
+
+def measure(label, coro, count):
+    start = time.perf_counter()
+    asyncio.run(coro)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<16} {count:>5} questions in {elapsed:7.2f}s  ->  {count / elapsed:8.2f} questions/s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=500)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds per stubbed LLM call")
+    parser.add_argument("--db-latency", type=float, default=0.05, help="seconds per stubbed SQL execution")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--skip-one-by-one", action="store_true", help="only time the batch endpoint")
+    args = parser.parse_args()
+
+    install_stubs(args.llm_latency, args.db_latency)
+    generate_query.llm = generate_query.fast_llm = QuestionSQLStub(None, args.llm_latency)
+    explain_query_result.llm = BatchSummaryStub("Stub summary", args.llm_latency)
+
+    questions = build_questions(args.questions)
+    unique = len({normalize_question(question) for question in questions})
+    print(f"{len(questions)} questions, {unique} distinct after normalization")
+    if not args.skip_one_by_one:
+        measure("one by one", one_by_one(questions), len(questions))
+    for concurrency in args.concurrency:
+        measure(f"batch x{concurrency}", index.abatch_result(questions, concurrency=concurrency), len(questions))
+
+
+if __name__ == "__main__":
+    main()
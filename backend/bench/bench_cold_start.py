@@ -0,0 +1,110 @@
+"""
+Cold start of the API: import-time profile and time to first healthy response.
+
+The import profile runs `python -X importtime -c "import src.main"` in a
+fresh interpreter and lists the slowest top-level imports (cumulative time,
+so a package includes everything it pulls in).
+
+The startup benchmark launches uvicorn on a free port --runs times and
+measures from process start until GET / first answers 200, plus the first
+/stats answer after that. STARTUP_WARM_UP is passed through unless
+--no-warm-up is given. The app needs GROQ_API_KEY (and DATABASE_URL for
+the warm-up connection) in the environment or .env.
+
+Usage (from the backend directory):
+    python -m bench.bench_cold_start --runs 5 [--top 15] [--no-warm-up] [--imports-only]
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+BACKEND_DIR = os.path.join(os.path.dirname(__file__), "..")
+
+
+def import_profile(top):
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import src.main"],
+        cwd=BACKEND_DIR, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        print(completed.stderr.strip().splitlines()[-1])
+        return
+    entries = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((int(cumulative_us), int(self_us), depth, name.strip()))
+    total = max(entries)[0]
+    print(f"import src.main: {total / 1000:.0f} ms")
+    # Modules imported directly by site/__main__ or by a top-level package
+    for cumulative_us, self_us, depth, name in sorted((e for e in entries if e[2] <= 2), reverse=True)[:top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  (self {self_us / 1000:6.1f})  {'  ' * depth}{name}")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url, server, deadline):
+    while time.perf_counter() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"server exited with code {server.returncode}")
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return time.perf_counter()
+        except (urllib.error.URLError, ConnectionError, OSError):
+            time.sleep(0.01)
+    raise TimeoutError(f"{url} did not answer in time")
+
+
+def startup_once(warm_up, timeout):
+    port = free_port()
+    env = dict(os.environ)
+    if not warm_up:
+        env["STARTUP_WARM_UP"] = "false"
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env
+    )
+    try:
+        healthy = wait_for(f"http://127.0.0.1:{port}/", server, started + timeout)
+        stats = wait_for(f"http://127.0.0.1:{port}/stats", server, started + timeout)
+    finally:
+        server.terminate()
+        server.wait()
+    return healthy - started, stats - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds to wait for each server")
+    parser.add_argument("--no-warm-up", action="store_true", help="start with STARTUP_WARM_UP=false")
+    parser.add_argument("--imports-only", action="store_true", help="only print the import profile")
+    args = parser.parse_args()
+
+    import_profile(args.top)
+    if args.imports_only:
+        return
+    times = [startup_once(not args.no_warm_up, args.timeout) for _ in range(args.runs)]
+    healthy = [t[0] for t in times]
+    stats = [t[1] for t in times]
+    print(f"first healthy response: median {statistics.median(healthy) * 1000:.0f} ms, min {min(healthy) * 1000:.0f} ms")
+    print(f"first /stats response:  median {statistics.median(stats) * 1000:.0f} ms, min {min(stats) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
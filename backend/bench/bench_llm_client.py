@@ -0,0 +1,102 @@
+"""
+A burst of LLM calls against a rate-limited provider, with and without the
+client layer in src/utils/llm_client.py.
+
+Starts bench/stub_llm_server.py in-process with --rpm requests per minute
+per model and a slow tail (--slow-share of completions take --slow-factor
+times --latency), then sends --requests summary calls at once:
+
+    raw       ChatGroq straight at the server, no retries (the old clients)
+    limited   LLMClient: shared token buckets, backoff, no fallback
+    fallback  LLMClient with a fallback model that has its own limits
+    hedged    as fallback, plus a hedge after --hedge-after seconds
+
+Reports calls that failed, latency percentiles of the ones that answered,
+and which models answered. The layer's RPM limit is set to the server's.
+
+Usage (from the backend directory):
+    python -m bench.bench_llm_client --requests 60 --rpm 40 --latency 0.2 --hedge-after 0.5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from collections import Counter
+
+os.environ.setdefault("GROQ_API_KEY", "bench-key")
+
+from bench.stub_llm_server import StubSettings, start_stub_server  # noqa: E402
+from src.utils import llm_client  # noqa: E402
+
+PRIMARY = "llama-3.3-70b-versatile"
+FALLBACK = "llama-3.1-8b-instant"
+MESSAGES = [("system", "You are an expert data analyst."), ("human", "Summarize: Royal Enfield 201893, KTM 187345")]
+
+
+async def call(client):
+    started = time.perf_counter()
+    try:
+        response = await client.ainvoke(MESSAGES)
+    except Exception as e:
+        return None, type(e).__name__, time.perf_counter() - started
+    return response.response_metadata.get("model_name"), None, time.perf_counter() - started
+
+
+def percentile(values, share):
+    return sorted(values)[min(len(values) - 1, int(len(values) * share))] if values else float("nan")
+
+
+def run(label, make_client, settings, requests):
+    # Fresh limits and provider windows for every variant
+    llm_client._limiters.clear()
+    settings.windows.clear()
+    client = make_client()
+
+    async def burst():
+        return await asyncio.gather(*(call(client) for _ in range(requests)))
+
+    started = time.perf_counter()
+    outcomes = asyncio.run(burst())
+    elapsed = time.perf_counter() - started
+    latencies = [seconds for model, error, seconds in outcomes if error is None]
+    errors = Counter(error for _, error, _ in outcomes if error is not None)
+    models = Counter(model for model, error, _ in outcomes if error is None)
+    print(
+        f"{label:<9} {len(latencies):3d}/{requests} answered in {elapsed:5.1f}s   "
+        f"p50 {statistics.median(latencies) if latencies else float('nan'):5.2f}s  "
+        f"p95 {percentile(latencies, 0.95):5.2f}s  max {max(latencies, default=float('nan')):5.2f}s   "
+        f"errors {dict(errors) or 0}   models {dict(models)}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=60)
+    parser.add_argument("--rpm", type=int, default=40, help="requests per minute per model at the stub server")
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per stubbed completion")
+    parser.add_argument("--slow-share", type=float, default=0.1)
+    parser.add_argument("--slow-factor", type=float, default=10.0)
+    parser.add_argument("--hedge-after", type=float, default=0.5, help="seconds before the hedged variant sends a second request")
+    parser.add_argument("--fallback-after", type=float, default=2.0)
+    args = parser.parse_args()
+
+    settings = StubSettings(args.latency, args.slow_share, args.slow_factor, rpm=args.rpm, tpm=0)
+    server, url = start_stub_server(settings)
+    llm_client.GROQ_BASE_URL = url
+    llm_client.LLM_RPM, llm_client.LLM_TPM = args.rpm, 0
+    llm_client.LLM_FALLBACK_AFTER = args.fallback_after
+
+    from langchain_groq import ChatGroq
+
+    run("raw", lambda: ChatGroq(groq_api_key="bench-key", model_name=PRIMARY, base_url=url, max_retries=0), settings, args.requests)
+    llm_client.LLM_HEDGE_AFTER = 0
+    run("limited", lambda: llm_client.LLMClient(PRIMARY), settings, args.requests)
+    run("fallback", lambda: llm_client.LLMClient(PRIMARY, fallback_model=FALLBACK), settings, args.requests)
+    llm_client.LLM_HEDGE_AFTER = args.hedge_after
+    run("hedged", lambda: llm_client.LLMClient(PRIMARY, fallback_model=FALLBACK), settings, args.requests)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
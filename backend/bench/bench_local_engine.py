@@ -0,0 +1,92 @@
+"""
+Latency of the embedded engine on the example queries from generate_query.py.
+
+Loads bike_sales_india.csv into the in-memory DuckDB engine and times each
+query (best of --repeat). With --postgres, the same queries also run on the
+DATABASE_URL database through the connection pool and the answers are
+compared row by row.
+
+Usage (from the backend directory):
+    python -m bench.bench_local_engine --repeat 20 [--postgres]
+"""
+import argparse
+import math
+import os
+import time
+
+from src.utils.local_engine import LocalEngine
+
+CSV_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "bike_sales_india.csv")
+
+queries = [
+    "SELECT AVG(price_inr) FROM Motorcycle_sales WHERE brand = 'Honda' AND state = 'Maharashtra';",
+    "SELECT * FROM Motorcycle_sales WHERE engine_capacity_cc > 150 ORDER BY price_inr DESC;",
+    "SELECT brand, AVG(resale_price_inr * 100.0 / price_inr) AS avg_resale_percentage FROM Motorcycle_sales GROUP BY brand ORDER BY avg_resale_percentage DESC;",
+    "SELECT state, model, COUNT(*) AS count FROM Motorcycle_sales GROUP BY state, model ORDER BY state, count DESC;",
+    "SELECT CASE WHEN year_of_manufacture < 2020 THEN 'Before 2020' ELSE '2020 and After' END AS manufacture_period, AVG(mileage_kmpl) AS avg_mileage FROM Motorcycle_sales GROUP BY manufacture_period ORDER BY manufacture_period;",
+    "SELECT brand, AVG(price_inr) AS avg_price FROM Motorcycle_sales GROUP BY brand ORDER BY avg_price DESC;",
+]
+
+MAX_ROWS = 10001
+
+
+def best_time(run, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def postgres_rows(query):
+    from src.utils.db_pool import get_pool
+
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query)
+        rows = cursor.fetchmany(MAX_ROWS)
+        cursor.close()
+        conn.rollback()
+    return rows
+
+
+def same_rows(left, right):
+    if len(left) != len(right):
+        return False
+    for a, b in zip(left, right):
+        for x, y in zip(a, b):
+            if isinstance(x, (int, float)) or isinstance(y, (int, float)):
+                if not math.isclose(float(x), float(y), rel_tol=1e-9):
+                    return False
+            elif x != y:
+                return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--postgres", action="store_true", help="also time and cross-check against DATABASE_URL")
+    args = parser.parse_args()
+
+    engine = LocalEngine(source=CSV_PATH)
+    engine.load()
+    print(f"loaded {engine.rows} rows in {engine.load_seconds * 1000:.0f} ms")
+
+    for query in queries:
+        local_time, local = best_time(lambda: engine.execute(query, MAX_ROWS), args.repeat)
+        if local is None:
+            print(f"{'left to PostgreSQL (text ORDER BY)':<30}   {query[:70]}")
+            continue
+        local_rows = local[1]
+        line = f"local {local_time * 1000:7.2f} ms  {len(local_rows):5d} rows"
+        if args.postgres:
+            remote_time, remote_rows = best_time(lambda: postgres_rows(query), args.repeat)
+            match = "match" if same_rows(local_rows, remote_rows) else "MISMATCH"
+            line += f"   postgres {remote_time * 1000:7.2f} ms  {match}"
+        print(f"{line}   {query[:70]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Prompt size and construction cost per request for the SQL and summary prompts.
+
+"legacy" formats the old single-message ChatPromptTemplate prompts (copied
+below) for every request; "current" reuses the system messages rendered at
+import and only formats the per-request human message. For each prompt the
+bench reports the tokens sent per request, how many of them form a prefix
+that is identical across requests (what provider-side prompt caching can
+reuse), and the time to build the messages.
+
+Tokens are counted with tiktoken's cl100k_base when it is installed (close
+to, not the same as, the Llama tokenizers Groq uses), otherwise estimated
+with result_compaction.estimate_tokens().
+
+Usage (from the backend directory):
+    python -m bench.bench_prompt_tokens --repeat 2000
+"""
+import argparse
+import logging
+import os
+import time
+
+from langchain.prompts import ChatPromptTemplate
+
+from src.utils.explain_query_result import build_summary_messages, column_mapping
+from src.utils.generate_query import column_details, example_queries, format_sql_prompt
+from src.utils.query_result import QueryResult
+from src.utils.result_compaction import compact_result, estimate_tokens
+
+questions = [
+    "What is the average price of Royal Enfield motorcycles in Karnataka?",
+    "How many electric motorcycles are sold by dealers?",
+    "Top 5 models by resale price in Tier 1 cities",
+    "Compare mileage of petrol and electric bikes registered after 2021",
+]
+
+results = [
+    QueryResult(
+        sql="SELECT brand, AVG(price_inr) AS avg_price FROM Motorcycle_sales GROUP BY brand ORDER BY avg_price DESC;",
+        columns=["brand", "avg_price"],
+        rows=[("Royal Enfield", 201893.4), ("KTM", 187345.2), ("Yamaha", 160422.9), ("Honda", 151204.7),
+              ("Bajaj", 146990.1), ("Suzuki", 142870.3), ("TVS", 139455.6), ("Hero", 121640.2)],
+        explanation="Average price per brand",
+    ),
+    QueryResult(
+        sql="SELECT COUNT(*) FROM Motorcycle_sales WHERE fuel_type = 'Electric' AND seller_type = 'Dealer';",
+        columns=["count"],
+        rows=[(1674,)],
+        explanation="Number of electric motorcycles sold by dealers",
+    ),
+]
+
+# The prompts as they were before the static parts moved into system messages
+legacy_sql_prompt = ChatPromptTemplate.from_template(
+    """
+    You will generate ONLY a PostgreSQL SQL query based on the natural language question below.
+
+    Table name: Motorcycle_sales
+    Columns: {column_details}
+
+    EXTREMELY IMPORTANT INSTRUCTIONS:
+    1. Your ENTIRE response must be ONLY the SQL query - nothing else
+    2. Do NOT include any explanations before or after the query
+    3. Do NOT use <think> tags, internal monologue, or explain your reasoning AT ALL
+    4. Do NOT include markdown code blocks (```sql```)
+    5. Start your response with SELECT, WITH, or other SQL keyword
+    6. End your query with a semicolon
+    7. Include necessary WHERE, GROUP BY, HAVING, ORDER BY clauses as needed
+    8. Your response should be PURE SQL ONLY with no commentary
+
+    Examples of correct responses:
+    {example_queries}
+
+    Converting this question to SQL ONLY:
+    {input}
+    """
+)
+
+legacy_summary_prompt = ChatPromptTemplate.from_template("""
+You are an expert data analyst for a motorcycle sales database in India. Use the following column mapping to interpret results:
+{column_map}
+
+Given the result data from a SQL query and a brief explanation, produce a clean, plain-text summary that:
+- Verbally interprets the query result data
+- References the relevant column meanings
+- If there's an error message in the explanation, interpret what it means and provide troubleshooting advice
+- If the query returned no results, explain what that likely means in business terms
+- If the result data is a statistical digest (row_count, column_stats, sample_rows) rather than every row, base the summary on the statistics and treat the sample as illustrative
+
+Result Data (JSON):
+{data}
+
+Brief Explanation:
+{explanation}
+
+SQL Query:
+{sql}
+
+Respond with only the summary text (no markdown fences).
+    """)
+
+
+def legacy_sql_messages(question):
+    column_detail_str = "\n".join([f"- {col}: {desc}" for col, desc in column_details.items()])
+    return legacy_sql_prompt.format_messages(column_details=column_detail_str, example_queries=example_queries, input=question)
+
+
+def legacy_summary_messages(result):
+    column_map_str = "\n".join([f"- {col} maps to '{key}'" for col, key in column_mapping.items()])
+    return legacy_summary_prompt.format_messages(
+        column_map=column_map_str, data=compact_result(result), explanation=result.explanation, sql=result.sql or ""
+    )
+
+
+def token_counter():
+    try:
+        import tiktoken
+    except ImportError:
+        return estimate_tokens, "estimated"
+    encoding = tiktoken.get_encoding("cl100k_base")
+    return (lambda text: len(encoding.encode(text))), "cl100k_base"
+
+
+def prompt_text(messages):
+    # Messages are sent in order, so the cacheable prefix runs across them;
+    # the current prompts are (role, content) tuples, the legacy ones messages
+    parts = [message if isinstance(message, tuple) else (message.type, message.content) for message in messages]
+    return "".join(f"<{role}>{content}" for role, content in parts)
+
+
+def common_prefix(texts):
+    prefix = os.path.commonprefix(texts)
+    # A cached prefix ends on a message boundary at best; don't count a partial word
+    return prefix[:prefix.rfind("\n") + 1] if len(prefix) < min(len(t) for t in texts) else prefix
+
+
+def measure(label, build, inputs, count_tokens, repeat):
+    texts = [prompt_text(build(item)) for item in inputs]
+    tokens = sum(count_tokens(text) for text in texts) / len(texts)
+    shared = count_tokens(common_prefix(texts))
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in inputs:
+            build(item)
+        best = min(best, time.perf_counter() - start)
+    per_request = best / len(inputs)
+    print(f"  {label:<8} {tokens:7.0f} tokens/request   {shared:5d} in a shared prefix   {per_request * 1e6:7.1f} us to build")
+    return tokens, per_request
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    # build_summary_messages() logs every call; keep that out of the timings
+    logging.disable(logging.INFO)
+    count_tokens, method = token_counter()
+    print(f"tokens: {method}")
+    for name, legacy, current, inputs in (
+        ("SQL prompt", legacy_sql_messages, format_sql_prompt, questions),
+        ("summary prompt", legacy_summary_messages, build_summary_messages, results),
+    ):
+        print(name)
+        legacy_tokens, legacy_time = measure("legacy", legacy, inputs, count_tokens, args.repeat)
+        current_tokens, current_time = measure("current", current, inputs, count_tokens, args.repeat)
+        print(f"  {1 - current_tokens / legacy_tokens:.0%} fewer tokens, built {legacy_time / current_time:.0f}x faster")
+
+
+if __name__ == "__main__":
+    main()
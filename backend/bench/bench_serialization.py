@@ -0,0 +1,105 @@
+"""
+Micro-benchmark of result hand-off between pipeline stages on a 10k-row result.
+
+"legacy" replays what the pipeline used to do with a result set: DictCursor
+rows -> dict -> json.dumps in execute_sql_query -> json.loads in result() ->
+json.loads again in explain_query_response -> json.dumps(indent=4) into the
+prompt and into the output -> json.loads in result() -> FastAPI's
+jsonable_encoder + json.dumps at the HTTP boundary.
+
+"current" keeps rows as tuples in a QueryResult, renders the prompt data as
+compact columnar JSON and serializes the response once with orjson.
+
+Usage (from the backend directory):
+    python -m bench.bench_serialization --repeat 5
+"""
+import argparse
+import csv
+import json
+import os
+import time
+import tracemalloc
+
+from src.utils.query_result import QueryResult
+from src.utils.serialization import dumps
+
+CSV_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "bike_sales_india.csv")
+SQL = "SELECT * FROM Motorcycle_sales;"
+SUMMARY = "Summary of the motorcycle sales data."
+
+columns = [
+    "state", "avg_daily_distance_km", "brand", "model", "price_inr", "year_of_manufacture",
+    "engine_capacity_cc", "fuel_type", "mileage_kmpl", "owner_type", "registration_year",
+    "insurance_status", "seller_type", "resale_price_inr", "city_tier",
+]
+converters = [str, float, str, str, int, int, int, str, float, str, int, str, str, float, str]
+
+
+def load_rows():
+    with open(CSV_PATH, newline="") as f:
+        reader = csv.reader(f)
+        next(reader)
+        return [tuple(convert(value) for convert, value in zip(converters, row)) for row in reader]
+
+
+def jsonable_copy(obj):
+    # Stand-in for fastapi.encoders.jsonable_encoder, which rebuilds every container
+    if isinstance(obj, dict):
+        return {str(k): jsonable_copy(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [jsonable_copy(v) for v in obj]
+    return obj
+
+
+def legacy_pipeline(rows):
+    data = [dict(zip(columns, row)) for row in rows]
+    query_result_json = json.dumps({"sql": SQL, "data": data, "explanation": "..."}, default=str)
+    json.loads(query_result_json)  # result() checking the explanation
+    parsed = json.loads(query_result_json)  # explain_query_response
+    prompt_data = json.dumps(parsed["data"], indent=4)
+    summary_json = json.dumps({"data": parsed["data"], "summary": SUMMARY, "error": False}, indent=4)
+    response = json.loads(summary_json)  # result() returning a dict
+    body = json.dumps(jsonable_copy(response)).encode("utf-8")
+    return prompt_data, body
+
+
+def current_pipeline(rows):
+    result = QueryResult(sql=SQL, columns=columns, rows=rows, explanation="...", total_count=len(rows))
+    prompt_data = dumps({"columns": result.columns, "rows": result.rows}).decode("utf-8")
+    body = dumps({"data": result.records(), "summary": SUMMARY, "error": False, "total_count": result.total_count})
+    return prompt_data, body
+
+
+def measure(label, pipeline, rows, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        prompt_data, body = pipeline(rows)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    pipeline(rows)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(
+        f"{label:<8} best {best * 1000:8.1f} ms   peak alloc {peak / 1e6:7.1f} MB   "
+        f"prompt data {len(prompt_data) / 1e6:5.2f} MB   body {len(body) / 1e6:5.2f} MB"
+    )
+    return best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = load_rows()
+    print(f"{len(rows)} rows x {len(columns)} columns")
+    legacy_time, legacy_peak = measure("legacy", legacy_pipeline, rows, args.repeat)
+    current_time, current_peak = measure("current", current_pipeline, rows, args.repeat)
+    print(f"CPU {legacy_time / current_time:.1f}x faster, peak allocation {legacy_peak / current_peak:.1f}x smaller")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+A burst of identical questions with and without request coalescing.
+
+--requests concurrent requests ask the same question (in a few wordings
+that normalize alike), as when many users open the same dashboard at once.
+"separate" awaits aresult() for each, "coalesced" acoalesced_result(), the
+/query path. Reports wall time and how many LLM calls reached the stubbed
+model. The caches stay disabled (as in bench_async_pipeline), so calls are
+saved by coalescing alone.
+
+Usage (from the backend directory):
+    python -m bench.bench_single_flight --requests 100 --llm-latency 0.5 --db-latency 0.05
+"""
+import argparse
+import asyncio
+import time
+
+from bench.bench_async_pipeline import StubLLM, SQL_RESPONSE, SUMMARY_RESPONSE, install_stubs
+import src.index as index
+from src.utils import explain_query_result, generate_query
+
+wordings = [
+    "What is the average price of each brand?",
+    "average price of each brand",
+    "Show me the average prices of each brand",
+]
+
+
+class CountingStubLLM(StubLLM):
+    calls = 0
+
+    async def ainvoke(self, messages, **kwargs):
+        CountingStubLLM.calls += 1
+        return await super().ainvoke(messages, **kwargs)
+
+
+async def burst(answer, n):
+    return await asyncio.gather(*(answer(wordings[i % len(wordings)]) for i in range(n)))
+
+
+def measure(label, answer, n):
+    CountingStubLLM.calls = 0
+    start = time.perf_counter()
+    answers = asyncio.run(burst(answer, n))
+    elapsed = time.perf_counter() - start
+    errors = sum(1 for a in answers if a.get("error"))
+    print(f"{label:<10} {n:>5} requests in {elapsed:6.2f}s   {CountingStubLLM.calls:5d} LLM calls   {errors} errors")
+    return CountingStubLLM.calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds per stubbed LLM call")
+    parser.add_argument("--db-latency", type=float, default=0.05, help="seconds per stubbed SQL execution")
+    args = parser.parse_args()
+
+    install_stubs(args.llm_latency, args.db_latency)
+    generate_query.llm = generate_query.fast_llm = CountingStubLLM(SQL_RESPONSE, args.llm_latency)
+    explain_query_result.llm = CountingStubLLM(SUMMARY_RESPONSE, args.llm_latency)
+    separate = measure("separate", index.aresult, args.requests)
+    coalesced = measure("coalesced", index.acoalesced_result, args.requests)
+    print(f"{separate / max(coalesced, 1):.0f}x fewer LLM calls")
+
+
+if __name__ == "__main__":
+    main()
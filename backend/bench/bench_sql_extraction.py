@@ -0,0 +1,94 @@
+"""
+Accuracy and cost of pulling the SQL statement out of raw model output.
+
+Runs the corpus in data/sql_extraction_corpus.json (responses shaped like
+the SQL model's: <think> reasoning, code fences, "SQL:" prefixes, trailing
+prose, literals containing ";" or prose-like phrases) through the legacy
+extract + post-process steps and through the current single-pass
+extractor, and compares each result with the expected statement (whitespace
+normalised; "expected": null means no statement should be found).
+
+--think-scale repeats the reasoning inside every <think> block, to time
+the long reasoning traces the model produces for harder questions.
+
+Usage (from the backend directory):
+    python -m bench.bench_sql_extraction --repeat 200 [--think-scale 50]
+"""
+import argparse
+import json
+import os
+import re
+import time
+
+from bench import legacy_sql_extraction as legacy
+from src.utils.generate_query import finalize_sql_response, is_cacheable_sql, post_process_sql_query
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "data", "sql_extraction_corpus.json")
+
+_think_block = re.compile(r'(<think>)(.*?)(</think>|$)', re.DOTALL)
+
+
+def load_corpus(think_scale):
+    with open(CORPUS_PATH, encoding="utf-8") as f:
+        corpus = json.load(f)
+    if think_scale > 1:
+        for case in corpus:
+            case["response"] = _think_block.sub(
+                lambda m: m.group(1) + m.group(2) * think_scale + m.group(3), case["response"], count=1
+            )
+    return corpus
+
+
+def legacy_pipeline(response):
+    sql_query = legacy.extract_sql_query(response)
+    if not sql_query.endswith(';'):
+        sql_query = sql_query.rstrip() + ';'
+    return legacy.post_process_sql_query(sql_query)
+
+
+def current_pipeline(response):
+    return post_process_sql_query(finalize_sql_response(response))
+
+
+def normalise(sql):
+    return " ".join(sql.split())
+
+
+def is_correct(output, expected):
+    if expected is None:
+        return not is_cacheable_sql(output)
+    return normalise(output) == normalise(expected)
+
+
+def measure(label, pipeline, corpus, repeat, verbose):
+    failures = [case["name"] for case in corpus if not is_correct(pipeline(case["response"]), case["expected"])]
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for case in corpus:
+            pipeline(case["response"])
+        best = min(best, time.perf_counter() - start)
+    per_response = best / len(corpus)
+    print(f"{label:<8} {len(corpus) - len(failures):3d}/{len(corpus)} correct   {per_response * 1e6:8.1f} us per response")
+    if verbose:
+        for name in failures:
+            print(f"    wrong: {name}")
+    return per_response
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--think-scale", type=int, default=1, help="repeat each reasoning block this many times")
+    parser.add_argument("--verbose", action="store_true", help="list the responses each extractor gets wrong")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.think_scale)
+    print(f"{len(corpus)} responses, {sum(len(case['response']) for case in corpus) / len(corpus):.0f} chars on average")
+    legacy_time = measure("legacy", legacy_pipeline, corpus, args.repeat, args.verbose)
+    current_time = measure("current", current_pipeline, corpus, args.repeat, args.verbose)
+    print(f"{legacy_time / current_time:.1f}x faster")
+
+
+if __name__ == "__main__":
+    main()
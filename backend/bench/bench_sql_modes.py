@@ -0,0 +1,96 @@
+"""
+SQL generation latency and output tokens per SQL_GENERATION_MODE.
+
+Generates SQL for --questions questions (SQL cache off, database stubbed)
+once with the reasoning model only and once in fast mode, where a
+non-reasoning model writes the SQL and the reasoning model is
+asked only when that SQL fails validation. Reports latency percentiles,
+completion tokens per question for each model purpose, and how often fast
+mode fell back.
+
+By default the LLM is bench/stub_llm_server.py: the reasoning model thinks
+for a few hundred tokens before its SQL, every completion token costs
+--token-latency seconds, and --invalid-share of the fast model's statements
+are malformed. --live uses the Groq API (GROQ_API_KEY, GROQ_BASE_URL)
+instead.
+
+Usage (from the backend directory):
+    python -m bench.bench_sql_modes --questions 20 --token-latency 0.004 --invalid-share 0.1 [--live]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from bench.bench_async_pipeline import install_stubs
+from bench.stub_llm_server import StubSettings, start_stub_server
+from src.utils import generate_query, llm_client, metrics
+
+questions = [
+    "What is the average price of each brand?",
+    "How many electric motorcycles are sold by dealers?",
+    "Top 5 models by resale price in Tier 1 cities",
+    "Compare mileage of petrol and electric bikes registered after 2021",
+    "Which state has the most first-owner motorcycles?",
+    "Average engine capacity per fuel type",
+]
+
+
+def completion_tokens(purpose):
+    return metrics.llm_tokens.value(purpose=purpose, type="completion")
+
+
+def run(mode, count):
+    generate_query.SQL_GENERATION_MODE = mode
+    before = {purpose: completion_tokens(purpose) for purpose in ("sql", "sql_fast")}
+    fallbacks_before = metrics.sql_generations.value(mode="fast", outcome="rejected")
+    latencies = []
+    failures = 0
+    for index in range(count):
+        # A suffix keeps stub answers identical while making every question distinct
+        question = f"{questions[index % len(questions)]} ({index})"
+        started = time.perf_counter()
+        try:
+            asyncio.run(generate_query.agenerate_query(question))
+        except Exception:
+            failures += 1
+        latencies.append(time.perf_counter() - started)
+    tokens = {purpose: (completion_tokens(purpose) - before[purpose]) / count for purpose in before}
+    fallbacks = metrics.sql_generations.value(mode="fast", outcome="rejected") - fallbacks_before
+    latencies.sort()
+    print(
+        f"{mode:<10} p50 {statistics.median(latencies):5.2f}s  p95 {latencies[int(len(latencies) * 0.95) - 1]:5.2f}s   "
+        f"completion tokens/question: reasoning {tokens['sql']:6.1f}, fast {tokens['sql_fast']:5.1f}   "
+        f"fallbacks {fallbacks}/{count}   failed {failures}"
+    )
+    return statistics.median(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.15, help="stub: seconds per completion before generation")
+    parser.add_argument("--token-latency", type=float, default=0.004, help="stub: seconds per completion token")
+    parser.add_argument("--invalid-share", type=float, default=0.1, help="stub: share of fast-model SQL that is malformed")
+    parser.add_argument("--live", action="store_true", help="call the Groq API instead of the stub server")
+    args = parser.parse_args()
+
+    install_stubs(0, 0)
+    # Real clients, pointed at the stub server unless --live
+    generate_query.llm = generate_query.fast_llm = None
+    if not args.live:
+        settings = StubSettings(args.latency, slow_share=0, token_latency=args.token_latency, invalid_share=args.invalid_share)
+        _, url = start_stub_server(settings)
+        llm_client.GROQ_BASE_URL = url
+        llm_client.LLM_RPM = llm_client.LLM_TPM = 0
+    elif not os.getenv("GROQ_API_KEY"):
+        parser.error("--live needs GROQ_API_KEY")
+
+    reasoning = run("reasoning", args.questions)
+    fast = run("fast", args.questions)
+    print(f"fast mode: {reasoning / fast:.1f}x lower median latency")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Template SQL against a labelled question set, for accuracy and latency.
+
+Loads bike_sales_india.csv into the embedded engine, indexes its values the
+way the server does and reads every question in
+data/template_sql_questions.json (best of --repeat). A question with
+expected SQL should be answered, and its SQL must return the same rows as
+the expected query (compared as in bench_aggregate_cube); one labelled null
+should fall through to the LLM. Reports coverage, wrong answers, questions
+answered that should have fallen through, and microseconds per question.
+
+Usage (from the backend directory):
+    python -m bench.bench_template_sql --repeat 200 [--verbose]
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+from bench.bench_aggregate_cube import CSV_PATH, MAX_ROWS, best_time, same_rows
+from src.utils.local_engine import LocalEngine
+from src.utils.template_sql import TemplateSQL
+
+QUESTIONS_PATH = os.path.join(os.path.dirname(__file__), "data", "template_sql_questions.json")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--verbose", action="store_true", help="print every question with its SQL")
+    args = parser.parse_args()
+
+    with open(QUESTIONS_PATH, encoding="utf-8") as f:
+        cases = json.load(f)
+    engine = LocalEngine(source=CSV_PATH)
+    engine.load()
+    templates = TemplateSQL()
+    templates.load(engine)
+    print(f"index: {templates.values} values loaded in {templates.load_seconds * 1000:.1f} ms")
+
+    answerable = [case for case in cases if case["expected"] is not None]
+    correct, wrong, missed, false_hits = [], [], [], []
+    timings = []
+    for case in cases:
+        seconds, sql = best_time(lambda: templates.generate(case["question"]), args.repeat)
+        timings.append(seconds)
+        if args.verbose:
+            print(f"{seconds * 1e6:7.1f} us  {case['question']}\n            -> {sql}")
+        if case["expected"] is None:
+            if sql is not None:
+                false_hits.append(case["question"])
+        elif sql is None:
+            missed.append(case["question"])
+        elif same_rows(engine.execute(sql, MAX_ROWS)[1], engine.execute(case["expected"], MAX_ROWS)[1]):
+            correct.append(case["question"])
+        else:
+            wrong.append(case["question"])
+
+    print(f"answered {len(correct) + len(wrong)}/{len(answerable)} answerable questions: "
+          f"{len(correct)} correct, {len(wrong)} wrong; {len(missed)} fell through to the LLM")
+    print(f"{len(cases) - len(answerable) - len(false_hits)}/{len(cases) - len(answerable)} "
+          f"questions for the LLM fell through ({len(false_hits)} answered anyway)")
+    print(f"latency per question: median {statistics.median(timings) * 1e6:.1f} us, max {max(timings) * 1e6:.1f} us")
+    for label, questions in (("wrong", wrong), ("missed", missed), ("answered anyway", false_hits)):
+        for question in questions:
+            print(f"  {label}: {question}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Verbatim copy of extract_sql_query() and post_process_sql_query() as they
+were before the single-pass extractor, kept for bench_sql_extraction.py.
+"""
+import re
+
+
+def extract_sql_query(response_text):
+    """
+    Extract only the SQL query from the LLM response.
+    This function is significantly improved to handle cases where the LLM provides
+    thinking or explanations along with the SQL query.
+    """
+    # First, try to remove any think tags and their content
+    clean_text = re.sub(r'<think>[\s\S]*?</think>', '', response_text, re.DOTALL)
+    
+    # Also look for incomplete think tags or other reasoning blocks
+    clean_text = re.sub(r'Alternatively,.*?\.', '', clean_text, re.DOTALL)
+    clean_text = re.sub(r'Yes, because.*?\.', '', clean_text, re.DOTALL)
+    clean_text = re.sub(r'So, the query should be.*?\.', '', clean_text, re.DOTALL)
+    
+    # Remove code block formatting
+    clean_text = re.sub(r'```sql|```', '', clean_text, re.IGNORECASE)
+    
+    # Find SQL query pattern - most SQL queries start with SELECT, WITH, etc.
+    # and typically end with a semicolon
+    sql_pattern = r'((?:SELECT|WITH|CREATE|INSERT|UPDATE|DELETE|ALTER)[\s\S]*?;)'
+    matches = re.findall(sql_pattern, clean_text, re.IGNORECASE)
+    
+    if matches:
+        # Return the last complete SQL statement
+        return matches[-1].strip()
+    
+    # If no complete SQL found, look for partial SQL
+    partial_sql_pattern = r'((?:SELECT|WITH)[\s\S]*)'
+    partial_matches = re.findall(partial_sql_pattern, clean_text, re.IGNORECASE)
+    
+    if partial_matches:
+        sql = partial_matches[-1].strip()
+        # Add semicolon if missing
+        if not sql.endswith(';'):
+            sql += ';'
+        return sql
+    
+    # Last resort: if the text contains SELECT or similar keywords, 
+    # try to extract everything from there to the end
+    for keyword in ['SELECT', 'WITH', 'CREATE', 'INSERT', 'UPDATE', 'DELETE', 'ALTER']:
+        if keyword in clean_text:
+            parts = clean_text.split(keyword, 1)
+            if len(parts) > 1:
+                sql = keyword + parts[1].strip()
+                if not sql.endswith(';'):
+                    sql += ';'
+                return sql
+    
+    # If all else fails, just return the cleaned text
+    return clean_text.strip()
+
+
+def post_process_sql_query(sql_query):
+    """
+    Additional post-processing to clean up any remaining non-SQL content
+    """
+    # Remove any obvious non-SQL content
+    non_sql_patterns = [
+        r'I should.*?\.', 
+        r'Finally,.*?\.', 
+        r'This query.*?\.', 
+        r'Let me.*?\.', 
+        r'Now.*?\.', 
+        r'Here\'s.*?:',
+        r'Alternatively,.*?\.',
+        r'Yes, because.*?\.',
+        r'So, the query should be.*?\.',
+        r'.*\n</think>\n',  # Handle incomplete think tags
+        r'</?think>'  # Remove any remaining think tags without content
+    ]
+    
+    clean_query = sql_query
+    for pattern in non_sql_patterns:
+        clean_query = re.sub(pattern, '', clean_query, flags=re.IGNORECASE | re.DOTALL)
+    
+    # If we have a semicolon in the middle, keep only up to the first semicolon
+    if ';' in clean_query:
+        parts = clean_query.split(';')
+        clean_query = parts[0] + ';'
+    
+    # Final cleanup of any whitespace issues
+    clean_query = clean_query.strip()
+    
+    return clean_query
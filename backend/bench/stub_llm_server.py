@@ -0,0 +1,219 @@
+"""
+A local stand-in for the Groq chat completions API, for load tests.
+
+Serves POST /openai/v1/chat/completions (the path the groq SDK calls under
+GROQ_BASE_URL) with canned answers shaped like the real models': a <think>
+block plus SQL for the SQL prompt, one JSON summary per result for batched
+summary prompts, and a sentence otherwise. Streaming requests get
+server-sent events like the real API. It enforces per-model requests and
+tokens per minute the way Groq does (429 with retry-after), can fail a share
+of requests with 503, and adds latency with an occasional slow tail.
+
+Reasoning models (names containing "deepseek" or "r1") think at length
+before the SQL, as the real one does; --token-latency adds generation time
+per completion token, so that costs what it would. "stop" and "max_tokens"
+are honoured, and --invalid-share of the other models' SQL answers are
+malformed, to exercise validation fallbacks.
+
+Usage (from the backend directory):
+    python -m bench.stub_llm_server --port 8765 --latency 0.3 --rpm 30 --tpm 6000 [--error-rate 0.02] [--token-latency 0.004]
+    GROQ_BASE_URL=http://127.0.0.1:8765 uvicorn src.main:app
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SQL_RESPONSE = "<think>Group by brand and average the price.</think>\nSELECT brand, AVG(price_inr) AS avg_price FROM Motorcycle_sales GROUP BY brand;"
+SUMMARY_RESPONSE = "Royal Enfield has the highest average price, followed by KTM and Yamaha."
+# What the fast model gets wrong now and then: unbalanced parentheses, rejected by validation
+INVALID_SQL_RESPONSE = "SELECT brand, AVG(price_inr AS avg_price FROM Motorcycle_sales GROUP BY brand;"
+REASONING = (
+    "Okay, the user wants the average price per brand. Looking at the columns, price_inr holds "
+    "the purchase price and brand the manufacturer, so I should group by brand and average "
+    "price_inr. I don't need a WHERE clause. Let me double-check the column names again. "
+)
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+class StubSettings:
+    def __init__(self, latency=0.3, slow_share=0.05, slow_factor=8.0, rpm=0, tpm=0, error_rate=0.0,
+                 token_latency=0.0, invalid_share=0.0, reasoning_repeat=8):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.invalid_share = invalid_share
+        self.reasoning_repeat = reasoning_repeat
+        self.slow_share = slow_share
+        self.slow_factor = slow_factor
+        self.rpm = rpm
+        self.tpm = tpm
+        self.error_rate = error_rate
+        self.lock = threading.Lock()
+        self.windows = {}  # model -> deque of (time, tokens) in the last minute
+        self.counts = {"ok": 0, "rate_limited": 0, "failed": 0}
+
+    def admit(self, model, tokens):
+        """None when the request fits the model's limits, else seconds until it would"""
+        now = time.monotonic()
+        with self.lock:
+            window = self.windows.setdefault(model, deque())
+            while window and now - window[0][0] >= 60:
+                window.popleft()
+            used = sum(t for _, t in window)
+            if (self.rpm and len(window) >= self.rpm) or (self.tpm and used + tokens > self.tpm):
+                self.counts["rate_limited"] += 1
+                return 60 - (now - window[0][0]) if window else 1.0
+            window.append((now, tokens))
+            return None
+
+    def count(self, outcome):
+        with self.lock:
+            self.counts[outcome] += 1
+
+
+def is_reasoning_model(model):
+    return "deepseek" in model or "r1" in model
+
+
+def answer_for(messages, model="stub", settings=None):
+    text = " ".join(str(message.get("content", "")) for message in messages)
+    if "PostgreSQL SQL query" in text:
+        if is_reasoning_model(model):
+            repeat = settings.reasoning_repeat if settings is not None else 1
+            return SQL_RESPONSE.replace("<think>", "<think>" + REASONING * repeat, 1)
+        if settings is not None and random.random() < settings.invalid_share:
+            return INVALID_SQL_RESPONSE
+        return SQL_RESPONSE[SQL_RESPONSE.index("</think>") + len("</think>"):].strip()
+    results = text.count("### Result ")
+    if results:
+        return json.dumps({str(number): f"{SUMMARY_RESPONSE} ({number})" for number in range(1, results + 1)})
+    return SUMMARY_RESPONSE
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    settings = StubSettings()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _json(self, status, body, headers=()):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        if not self.path.endswith("/chat/completions"):
+            self._json(404, {"error": {"message": "not found"}})
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        settings = self.settings
+        model = request.get("model", "stub")
+        content = answer_for(request.get("messages", []), model, settings)
+        finish_reason = "stop"
+        stop = request.get("stop") or []
+        for sequence in [stop] if isinstance(stop, str) else stop:
+            if sequence in content:
+                content = content[:content.index(sequence)]
+        if request.get("max_tokens") and estimate_tokens(content) > request["max_tokens"]:
+            content = content[:request["max_tokens"] * 4]
+            finish_reason = "length"
+        prompt_tokens = sum(estimate_tokens(str(m.get("content", ""))) for m in request.get("messages", []))
+        completion_tokens = estimate_tokens(content)
+
+        retry_after = settings.admit(model, prompt_tokens + completion_tokens)
+        if retry_after is not None:
+            self._json(429, {"error": {"message": f"Rate limit reached for model {model}", "type": "tokens", "code": "rate_limit_exceeded"}},
+                       [("retry-after", f"{retry_after:.2f}")])
+            return
+        latency = settings.latency * (settings.slow_factor if random.random() < settings.slow_share else 1.0)
+        time.sleep(latency * random.uniform(0.8, 1.2) + completion_tokens * settings.token_latency)
+        if random.random() < settings.error_rate:
+            settings.count("failed")
+            self._json(503, {"error": {"message": "Service unavailable", "type": "internal_server_error"}})
+            return
+        settings.count("ok")
+
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+        created = int(time.time())
+        if not request.get("stream"):
+            self._json(200, {
+                "id": "chatcmpl-stub", "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": finish_reason}],
+                "usage": usage,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        words = content.split(" ")
+        for index, word in enumerate(words):
+            delta = {"content": word if index == 0 else " " + word}
+            if index == 0:
+                delta["role"] = "assistant"
+            chunk = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        final = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": created, "model": model,
+                 "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}], "x_groq": {"usage": usage}}
+        self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+
+
+class StubServer(ThreadingHTTPServer):
+    # Load tests open many connections at once
+    request_queue_size = 512
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Cancelled (e.g. hedged) calls close their connection before the answer
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+
+def start_stub_server(settings, port=0):
+    """Serve in a daemon thread; returns (server, base_url)"""
+    handler = type("Handler", (StubHandler,), {"settings": settings})
+    server = StubServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, name="stub-llm-server", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds per completion")
+    parser.add_argument("--slow-share", type=float, default=0.05, help="share of completions that take --slow-factor times longer")
+    parser.add_argument("--slow-factor", type=float, default=8.0)
+    parser.add_argument("--rpm", type=int, default=30, help="requests per minute per model (0: unlimited)")
+    parser.add_argument("--tpm", type=int, default=6000, help="tokens per minute per model (0: unlimited)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 503")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="extra seconds per completion token")
+    parser.add_argument("--invalid-share", type=float, default=0.0, help="share of non-reasoning SQL answers that are malformed")
+    args = parser.parse_args()
+
+    settings = StubSettings(args.latency, args.slow_share, args.slow_factor, args.rpm, args.tpm, args.error_rate,
+                            args.token_latency, args.invalid_share)
+    server, url = start_stub_server(settings, args.port)
+    print(f"Stub LLM server on {url} (set GROQ_BASE_URL={url})")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"completions: {settings.counts}")
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
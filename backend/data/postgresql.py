@@ -1,7 +1,10 @@
-import pandas as pd
-from sqlalchemy import create_engine
-from dotenv import load_dotenv
+import argparse
+import csv
+import io
 import os
+import time
+import psycopg2
+from dotenv import load_dotenv
 
 
 load_dotenv()
@@ -9,7 +12,21 @@ load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL")
 
 # 2. Path to your CSV file
-CSV_PATH = "bike_sales_india.csv"  # change this to your actual file path
+CSV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bike_sales_india.csv")
+
+TABLE = "motorcycle_sales"
+STAGING_TABLE = "motorcycle_sales_staging"
+# Content hash of every row loaded so far, so appends skip rows already present
+HASH_TABLE = "motorcycle_sales_hashes"
+HASH_STAGING_TABLE = "motorcycle_sales_hashes_staging"
+# Rows added by each append, tagged with their data version, so the API can
+# apply them to its in-memory copies instead of reloading everything
+DELTA_TABLE = "motorcycle_sales_delta"
+# Data versions whose delta rows are kept; a consumer further behind reloads in full
+DELTA_KEEP_VERSIONS = int(os.getenv("DELTA_KEEP_VERSIONS", "50"))
+
+# Rows per COPY when appending; bounds the loader's memory
+APPEND_CHUNK_ROWS = int(os.getenv("APPEND_CHUNK_ROWS", "50000"))
 
 # 3. Clean column mapping
 column_mapping = {
@@ -30,15 +47,236 @@ column_mapping = {
     "City Tier": "city_tier"
 }
 
-# 4. Read and clean the CSV
-df = pd.read_csv(CSV_PATH)
-df = df[list(column_mapping.keys())]  # only keep the 15 expected columns
-df.rename(columns=column_mapping, inplace=True)
+# Explicit types (the same ones pandas inferred for the old to_sql table)
+column_types = {
+    "state": "TEXT",
+    "avg_daily_distance_km": "DOUBLE PRECISION",
+    "brand": "TEXT",
+    "model": "TEXT",
+    "price_inr": "BIGINT",
+    "year_of_manufacture": "BIGINT",
+    "engine_capacity_cc": "BIGINT",
+    "fuel_type": "TEXT",
+    "mileage_kmpl": "DOUBLE PRECISION",
+    "owner_type": "TEXT",
+    "registration_year": "BIGINT",
+    "insurance_status": "TEXT",
+    "seller_type": "TEXT",
+    "resale_price_inr": "DOUBLE PRECISION",
+    "city_tier": "TEXT"
+}
+
+# Columns the generated SQL filters and groups by
+indexed_columns = ["state", "brand", "model", "fuel_type", "city_tier", "year_of_manufacture", "registration_year"]
+
+
+def csv_columns(path):
+    """Table columns in the order they appear in the CSV header"""
+    with open(path, newline="", encoding="utf-8") as f:
+        header = next(csv.reader(f))
+    unknown = [name for name in header if name not in column_mapping]
+    missing = [name for name in column_mapping if name not in header]
+    if unknown or missing:
+        raise ValueError(f"Unexpected CSV header (unknown: {unknown}, missing: {missing})")
+    return [column_mapping[name] for name in header]
+
+
+def create_table_sql(table):
+    columns = ",\n    ".join(f"{name} {kind}" for name, kind in column_types.items())
+    return f"CREATE TABLE {table} (\n    {columns}\n);"
+
+
+def table_exists(cursor, table):
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL;", (table,))
+    return cursor.fetchone()[0]
+
+
+def row_hash_sql(alias):
+    # Hashes the typed row in table column order, so drops with the columns in
+    # another order, or values that parse alike ("95" and "95.0" for mileage), hash alike
+    return f"md5(ROW({alias}.*)::text)::uuid"
+
+
+def stamp_version(cursor, mode):
+    """Record a new data version; the NOTIFY reaches the API when the transaction commits"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS dataset_versions (
+            version BIGSERIAL PRIMARY KEY,
+            mode TEXT NOT NULL DEFAULT 'replace',
+            loaded_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+    """)
+    cursor.execute("INSERT INTO dataset_versions (mode) VALUES (%s) RETURNING version;", (mode,))
+    version = cursor.fetchone()[0]
+    cursor.execute("SELECT pg_notify('dataset_version', %s);", (str(version),))
+    return version
+
+
+def replace_table(conn, path):
+    """
+    Load the CSV into a staging table and swap it in, all in one transaction.
+
+    Rows are streamed with COPY, the staging table is indexed, ANALYZEd and
+    hashed before the swap, and the old table stays readable until the final
+    rename, so queries never see a half-loaded or index-less table.
+    """
+    columns = csv_columns(path)
+    cursor = conn.cursor()
+    started = time.perf_counter()
+
+    cursor.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE};")
+    cursor.execute(create_table_sql(STAGING_TABLE))
+    with open(path, newline="", encoding="utf-8") as f:
+        cursor.copy_expert(f"COPY {STAGING_TABLE} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, HEADER true)", f)
+    cursor.execute(f"SELECT COUNT(*) FROM {STAGING_TABLE};")
+    rows = cursor.fetchone()[0]
+    loaded = time.perf_counter()
+
+    for column in indexed_columns:
+        cursor.execute(f"CREATE INDEX {STAGING_TABLE}_{column}_idx ON {STAGING_TABLE} ({column});")
+    cursor.execute(f"ANALYZE {STAGING_TABLE};")
+
+    # Start the append bookkeeping over from the new contents
+    cursor.execute(f"DROP TABLE IF EXISTS {HASH_STAGING_TABLE};")
+    cursor.execute(f"CREATE TABLE {HASH_STAGING_TABLE} AS SELECT DISTINCT {row_hash_sql('t')} AS row_hash FROM {STAGING_TABLE} t;")
+    cursor.execute(f"ALTER TABLE {HASH_STAGING_TABLE} ADD CONSTRAINT {HASH_STAGING_TABLE}_pkey PRIMARY KEY (row_hash);")
+    version = stamp_version(cursor, "replace")
+    indexed = time.perf_counter()
+
+    # The swap itself only holds the lock for the drops and the renames
+    if table_exists(cursor, TABLE):
+        cursor.execute(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE;")
+    cursor.execute(f"DROP TABLE IF EXISTS {TABLE};")
+    cursor.execute(f"ALTER TABLE {STAGING_TABLE} RENAME TO {TABLE};")
+    for column in indexed_columns:
+        cursor.execute(f"ALTER INDEX {STAGING_TABLE}_{column}_idx RENAME TO {TABLE}_{column}_idx;")
+    cursor.execute(f"DROP TABLE IF EXISTS {HASH_TABLE};")
+    cursor.execute(f"ALTER TABLE {HASH_STAGING_TABLE} RENAME TO {HASH_TABLE};")
+    cursor.execute(f"ALTER INDEX {HASH_STAGING_TABLE}_pkey RENAME TO {HASH_TABLE}_pkey;")
+    cursor.execute(f"DROP TABLE IF EXISTS {DELTA_TABLE};")
+    conn.commit()
+    cursor.close()
+
+    print(f" COPY {rows} rows in {loaded - started:.2f}s, indexes + ANALYZE + hashes in {indexed - loaded:.2f}s, swapped in at {time.perf_counter() - started:.2f}s")
+    return version
+
+
+def csv_chunks(path, chunk_rows):
+    """Yield (columns, CSV text of up to chunk_rows rows) without reading the whole file"""
+    columns = csv_columns(path)
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        next(reader)
+        while True:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            count = 0
+            for row in reader:
+                writer.writerow(row)
+                count += 1
+                if count == chunk_rows:
+                    break
+            if count == 0:
+                return
+            buffer.seek(0)
+            yield columns, buffer
+            if count < chunk_rows:
+                return
+
+
+def append_files(conn, paths, chunk_rows=APPEND_CHUNK_ROWS):
+    """
+    Append new rows from CSV drops, skipping rows already loaded.
+
+    Each file is COPYed in chunks into a temporary table; rows whose content
+    hash is new go into the table and into the delta log under a single new
+    data version, committed together with the NOTIFY. If nothing is new the
+    transaction is rolled back, so no version is recorded, and None is returned.
+    """
+    cursor = conn.cursor()
+    if not table_exists(cursor, TABLE):
+        raise ValueError(f"{TABLE} does not exist yet; run a full load first")
+    started = time.perf_counter()
+
+    cursor.execute(f"LOCK TABLE {TABLE} IN SHARE ROW EXCLUSIVE MODE;")
+    if not table_exists(cursor, HASH_TABLE):
+        # Tables loaded before hashing existed
+        cursor.execute(f"CREATE TABLE {HASH_TABLE} AS SELECT DISTINCT {row_hash_sql('t')} AS row_hash FROM {TABLE} t;")
+        cursor.execute(f"ALTER TABLE {HASH_TABLE} ADD PRIMARY KEY (row_hash);")
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {DELTA_TABLE} (version BIGINT NOT NULL, LIKE {TABLE});")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS {DELTA_TABLE}_version_idx ON {DELTA_TABLE} (version);")
+    version = stamp_version(cursor, "append")
+    cursor.execute(f"CREATE TEMP TABLE append_staging (LIKE {TABLE}) ON COMMIT DROP;")
+
+    columns = ", ".join(column_types)
+    read = appended = 0
+    for path in paths:
+        for file_columns, chunk in csv_chunks(path, chunk_rows):
+            cursor.execute("TRUNCATE append_staging;")
+            cursor.copy_expert(f"COPY append_staging ({', '.join(file_columns)}) FROM STDIN WITH (FORMAT csv)", chunk)
+            cursor.execute(f"""
+                WITH hashed AS (
+                    SELECT DISTINCT ON (row_hash) {row_hash_sql('s')} AS row_hash, s.*
+                    FROM append_staging s
+                ), new_hashes AS (
+                    INSERT INTO {HASH_TABLE} (row_hash)
+                    SELECT row_hash FROM hashed
+                    ON CONFLICT DO NOTHING
+                    RETURNING row_hash
+                ), new_rows AS (
+                    INSERT INTO {TABLE} ({columns})
+                    SELECT {columns} FROM hashed JOIN new_hashes USING (row_hash)
+                    RETURNING {columns}
+                )
+                INSERT INTO {DELTA_TABLE} (version, {columns})
+                SELECT %s, {columns} FROM new_rows;
+            """, (version,))
+            appended += cursor.rowcount
+            cursor.execute("SELECT COUNT(*) FROM append_staging;")
+            read += cursor.fetchone()[0]
+        print(f" {path}: {read} rows read so far, {appended} new")
+
+    if appended == 0:
+        # Rolls back the version stamp and its NOTIFY with it
+        conn.rollback()
+        cursor.close()
+        print(f" No new rows in {read} read ({time.perf_counter() - started:.2f}s)")
+        return None
+
+    # Consumers patch from the version they hold; only the recent ones are still asked for
+    cursor.execute(f"DELETE FROM {DELTA_TABLE} WHERE version <= %s;", (version - DELTA_KEEP_VERSIONS,))
+    cursor.execute(f"ANALYZE {TABLE};")
+    conn.commit()
+    cursor.close()
+    print(f" Appended {appended} of {read} rows ({read - appended} already loaded) in {time.perf_counter() - started:.2f}s")
+    return version
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load the motorcycle sales CSV into PostgreSQL")
+    parser.add_argument("csv_paths", nargs="*", default=[CSV_PATH], help="CSV file(s) to load (default: bike_sales_india.csv)")
+    parser.add_argument("--append", action="store_true", help="add new rows from the files instead of replacing the table")
+    args = parser.parse_args()
 
-# 5. Upload to PostgreSQL
-engine = create_engine(DATABASE_URL)
+    conn = psycopg2.connect(DATABASE_URL)
+    try:
+        if args.append:
+            version = append_files(conn, args.csv_paths)
+        elif len(args.csv_paths) == 1:
+            version = replace_table(conn, args.csv_paths[0])
+        else:
+            parser.error("a full load takes one CSV file; use --append for several")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
 
+    if version is None:
+        print(" Nothing new to append; data version unchanged.")
+    else:
+        print(f" CSV data uploaded to PostgreSQL successfully (data version {version}).")
 
-df.to_sql("motorcycle_sales", engine, if_exists="replace", index=False)
 
-print(" CSV data uploaded to PostgreSQL successfully.")
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,16 @@
-import json
+import os
+import asyncio
 import logging
-from src.utils.language import detect_language, translate_language
-from src.utils.generate_query import generate_query 
-from src.utils.execute_query import execute_sql_query  
-from src.utils.explain_query_result import explain_query_response  
+from dotenv import load_dotenv
+from src.utils.language import ato_english as alanguage_to_english
+from src.utils.generate_query import agenerate_query
+from src.utils.execute_query import aexecute_sql_query, astream_sql_query, page_token_for, RESULT_PAGE_SIZE
+from src.utils.explain_query_result import aexplain_query_response, astream_query_explanation, abatch_explain_query_responses
+from src.utils.query_result import QueryResult
+from src.utils.sql_cache import normalize_question
+from src.utils.db_pool import DB_POOL_MAX_SIZE
+from src.utils.single_flight import SingleFlight
+from src.utils import metrics
 
 # Configure logging
 logging.basicConfig(
@@ -12,67 +19,254 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def result(text):
+# Load environment variables
+load_dotenv()
+
+# Batch endpoint limits: questions per request, concurrent SQL generations
+# (and summary calls), and concurrent queries on the connection pool
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "500"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_DB_CONCURRENCY = int(os.getenv("BATCH_DB_CONCURRENCY", str(min(BATCH_CONCURRENCY, DB_POOL_MAX_SIZE))))
+
+# Identical questions asked at the same time share one pipeline run, which
+# is given up after this many seconds (0 waits indefinitely)
+COALESCE_TIMEOUT = float(os.getenv("COALESCE_TIMEOUT", "120"))
+question_flights = SingleFlight(COALESCE_TIMEOUT or None)
+
+async def ato_english(text):
+    """Detect the language of the input and translate it to English if needed"""
+    logger.info(f"Processing input text: {text}")
+    with metrics.stage("language"):
+        eng_text = await alanguage_to_english(text)
+    metrics.note("language", eng_text.language)
+    logger.info(f"Detected language: {eng_text.language}")
+    if eng_text.translated != text:
+        logger.info(f"Translated text: {eng_text.translated}")
+    return eng_text.translated
+
+
+async def agenerate_sql_for(text):
+    """Language handling plus SQL generation: the first half of the pipeline"""
+    input_text = await ato_english(text)
+
+    # Generate SQL query from natural language
+    logger.info("Generating SQL query...")
+    with metrics.stage("sql_generation"):
+        sql_query = await agenerate_query(input_text)
+    if not sql_query:
+        logger.error("No SQL query found in generate_query response")
+        raise ValueError("Failed to generate SQL query: No query in response")
+
+    logger.info(f"Generated SQL Query: {sql_query}")
+    return sql_query
+
+
+async def aresult(text):
+    """
+    The /query pipeline. Every blocking stage is either awaited natively
+    (LLM calls) or offloaded to a worker thread (language detection, translation,
+    database access), so one slow question no longer stalls the whole worker.
+    """
+    with metrics.request_trace("query") as trace:
+        try:
+            sql_query = await agenerate_sql_for(text)
+
+            # Execute the SQL query
+            logger.info("Executing SQL query...")
+            with metrics.stage("execution"):
+                query_result = await aexecute_sql_query(sql_query)
+            metrics.record_rows(len(query_result.rows))
+            logger.info(f"Query execution result: {query_result.explanation}")
+
+            # Check if there was an error in query execution
+            if query_result.error:
+                logger.warning(f"Query execution encountered an error: {query_result.explanation}")
+
+            # Generate explanation of results
+            logger.info("Generating explanation of results...")
+            with metrics.stage("summary"):
+                response = await aexplain_query_response(query_result)
+            logger.info("Processing complete")
+
+            return response
+
+        except ValueError as e:
+            trace.outcome = "error"
+            logger.error(f"Value error: {str(e)}")
+            return {
+                "data": [],
+                "summary": f"An error occurred: {str(e)}",
+                "error": True
+            }
+
+        except Exception as e:
+            trace.outcome = "error"
+            logger.error(f"Unexpected error: {str(e)}", exc_info=True)
+            return {
+                "data": [],
+                "summary": f"An error occurred: {str(e)}",
+                "error": True
+            }
+
+
+async def astream_result(text):
+    """
+    Streaming version of aresult(). Yields events as soon as each stage has
+    something to show:
+
+        {"event": "sql", "sql": ...}
+        {"event": "rows", "columns": [...], "rows": [[...], ...]}   (one per fetched chunk)
+        {"event": "explanation", "explanation": ..., "row_count": ...,
+         "total_count": ..., "next_page_token": ...}
+        {"event": "summary", "delta": ...}          (one per streamed LLM chunk)
+        {"event": "error", "stage": ..., "message": ...}
+        {"event": "done", "error": bool}
+    """
+    with metrics.request_trace("stream") as trace:
+        try:
+            sql_query = await agenerate_sql_for(text)
+            yield {"event": "sql", "sql": sql_query}
+
+            # Execute the SQL query, forwarding rows as they arrive
+            logger.info("Executing SQL query...")
+            query_result = QueryResult(sql=sql_query)
+            # Stage timings here include the time spent handing events to the client
+            with metrics.stage("execution"):
+                async for event in astream_sql_query(sql_query):
+                    if "rows" in event:
+                        query_result.rows.extend(event["rows"])
+                        yield {"event": "rows", "columns": event["columns"], "rows": event["rows"]}
+                    else:
+                        query_result.columns = event["columns"]
+                        query_result.explanation = event["explanation"]
+                        query_result.error = event["error"]
+                        query_result.total_count = event["total_count"]
+                        query_result.next_page_token = page_token_for(sql_query, event, RESULT_PAGE_SIZE)
+            metrics.record_rows(len(query_result.rows))
+            if query_result.error:
+                logger.warning(f"Query execution encountered an error: {query_result.explanation}")
+                query_result.rows = []
+            yield {
+                "event": "explanation",
+                "explanation": query_result.explanation,
+                "row_count": len(query_result.rows),
+                "total_count": query_result.total_count,
+                "next_page_token": query_result.next_page_token,
+            }
+
+            # Stream the explanation of results
+            logger.info("Generating explanation of results...")
+            try:
+                with metrics.stage("summary"):
+                    async for delta in astream_query_explanation(query_result):
+                        yield {"event": "summary", "delta": delta}
+            except Exception as e:
+                trace.outcome = "error"
+                logger.error(f"Error streaming explanation: {str(e)}", exc_info=True)
+                yield {"event": "error", "stage": "summary", "message": f"An error occurred while generating the explanation: {str(e)}"}
+            logger.info("Processing complete")
+
+            yield {"event": "done", "error": query_result.error or len(query_result.rows) == 0}
+
+        except Exception as e:
+            trace.outcome = "error"
+            logger.error(f"Unexpected error: {str(e)}", exc_info=True)
+            yield {"event": "error", "stage": "pipeline", "message": f"An error occurred: {str(e)}"}
+            yield {"event": "done", "error": True}
+
+
+def question_key(text):
+    """
+    Key under which questions count as the same: normalize_question() for
+    English; non-ASCII text keeps its exact wording, since the tokenizer
+    would drop everything but the Latin words ("Honda").
+    """
+    if text.isascii():
+        return normalize_question(text) or text.strip()
+    return text.strip()
+
+
+async def acoalesced_result(text):
+    """
+    aresult() for /query: concurrent requests whose questions normalize alike
+    (see question_key()) wait for one pipeline run and all get its
+    answer, so a burst of the same question makes one set of LLM calls.
+    """
+    key = question_key(text)
     try:
-        # Detect language of the input text
-        logger.info(f"Processing input text: {text}")
-        lang = detect_language(text)
-        logger.info(f"Detected language: {lang.name}")
-
-        # Translate to English if necessary
-        if lang.name.lower() != "english":
-            logger.info(f"Translating from {lang.name} to English")
-            eng_text = translate_language(text, "english")
-            input_text = eng_text.translated
-            logger.info(f"Translated text: {input_text}")
-        else:
-            input_text = text
-
-        # Generate SQL query from natural language
-        logger.info("Generating SQL query...")
-        query_json_str = generate_query(input_text)
-        query_data = json.loads(query_json_str)
-        
-        # Extract the SQL query from the response
-        if "sql_query" in query_data:
-            sql_query = query_data["sql_query"]
-        else:
-            logger.error("No SQL query found in generate_query response")
-            raise ValueError("Failed to generate SQL query: No query in response")
-        
-        logger.info(f"Generated SQL Query: {sql_query}")
-
-        # Execute the SQL query
-        logger.info("Executing SQL query...")
-        query_result_json = execute_sql_query(sql_query)
-        logger.info(f"Query execution result: {query_result_json[:100]}...")  # Log first 100 chars
-        
-        # Check if there was an error in query execution
-        query_result = json.loads(query_result_json)
-        if "explanation" in query_result and query_result["explanation"].startswith("Error"):
-            logger.warning(f"Query execution encountered an error: {query_result['explanation']}")
-
-        # Generate explanation of results
-        logger.info("Generating explanation of results...")
-        summary_json = explain_query_response(query_result_json)
-        logger.info("Processing complete")
-
-        return json.loads(summary_json)
-    
-    except ValueError as e:
-        logger.error(f"Value error: {str(e)}")
-        error_response = {
-            "data": [],
-            "summary": f"An error occurred: {str(e)}",
-            "error": True
-        }
-        return error_response
-        
+        return await question_flights.do(key, lambda: aresult(text))
+    except asyncio.TimeoutError:
+        logger.error(f"Question timed out after {COALESCE_TIMEOUT:.0f}s: {text}")
+        return _error_response(f"The question took longer than {COALESCE_TIMEOUT:.0f} seconds to answer")
     except Exception as e:
         logger.error(f"Unexpected error: {str(e)}", exc_info=True)
-        error_response = {
-            "data": [],
-            "summary": f"An error occurred: {str(e)}",
-            "error": True
-        }
-        return error_response
\ No newline at end of file
+        return _error_response(e)
+
+
+def _error_response(e):
+    return {
+        "data": [],
+        "summary": f"An error occurred: {str(e)}",
+        "error": True
+    }
+
+
+async def abatch_result(questions, concurrency=BATCH_CONCURRENCY, db_concurrency=BATCH_DB_CONCURRENCY):
+    """
+    Answer many questions in one go, sharing work between them.
+
+    Questions that normalize alike (see question_key()) are answered
+    once. SQL is generated for the rest at most `concurrency` at a time,
+    each distinct statement runs once with at most `db_concurrency` pooled
+    connections busy (aggregates the cube covers never reach the database),
+    and the results are summarized several per LLM call. Returns one
+    aresult()-shaped answer per question, in order, each with its question.
+    """
+    with metrics.request_trace("batch") as trace:
+        first_asked = {}
+        keys = []
+        for question in questions:
+            key = question_key(question)
+            first_asked.setdefault(key, question)
+            keys.append(key)
+        trace.note("questions", len(questions))
+        trace.note("unique_questions", len(first_asked))
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def sql_for(question):
+            async with semaphore:
+                try:
+                    return await agenerate_sql_for(question)
+                except Exception as e:
+                    logger.error(f"Batch question failed: {str(e)}")
+                    return e
+
+        generated = dict(zip(first_asked, await asyncio.gather(*(sql_for(q) for q in first_asked.values()))))
+
+        # Different questions often produce the same statement
+        distinct_sql = list(dict.fromkeys(sql for sql in generated.values() if isinstance(sql, str)))
+        trace.note("distinct_sql", len(distinct_sql))
+        db_semaphore = asyncio.Semaphore(db_concurrency)
+
+        async def execute(sql_query):
+            async with db_semaphore:
+                with metrics.stage("execution"):
+                    query_result = await aexecute_sql_query(sql_query)
+            metrics.record_rows(len(query_result.rows))
+            return query_result
+
+        executed = await asyncio.gather(*(execute(sql_query) for sql_query in distinct_sql))
+        with metrics.stage("summary"):
+            summaries = dict(zip(distinct_sql, await abatch_explain_query_responses(executed, concurrency)))
+
+        answers = []
+        for question, key in zip(questions, keys):
+            sql_query = generated[key]
+            if isinstance(sql_query, str):
+                answer = summaries[sql_query]
+            else:
+                answer = _error_response(sql_query)
+                trace.outcome = "partial"
+            answers.append({"question": question, **answer})
+        return answers
@@ -1,8 +1,99 @@
-from fastapi import FastAPI, Query
-from src.index import result
+import os
+import threading
+import time
+import logging
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+from src.index import acoalesced_result, astream_result, question_flights, abatch_result, BATCH_MAX_QUESTIONS
+from src.utils.db_pool import get_pool
+from src.utils.execute_query import aexecute_sql_page
+from src.utils.sql_cache import question_cache
+from src.utils.result_cache import result_cache
+from src.utils.explain_query_result import summary_cache
+from src.utils.language import translation_cache
+from src.utils.local_engine import get_local_engine, local_engine_stats
+from src.utils.aggregate_cube import get_aggregate_cube, aggregate_cube_stats
+from src.utils.template_sql import get_template_sql, template_sql_stats
+from src.utils.llm_client import limiter_stats
+from src.utils.serialization import FastJSONResponse, dumps
+from src.utils import explain_query_result, generate_query, language, metrics
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
+
+# Create the LLM clients, load language detection and open a database
+# connection right after startup instead of in the first request
+STARTUP_WARM_UP = os.getenv("STARTUP_WARM_UP", "true").lower() in ("1", "true", "yes")
+
+
+def warm_up():
+    started = time.perf_counter()
+    for step in (generate_query.warm_up, explain_query_result.warm_up, language.warm_up):
+        try:
+            step()
+        except Exception as e:
+            logger.warning(f"Warm-up step {step.__module__}.{step.__name__} failed: {str(e)}")
+    try:
+        with get_pool().connection():
+            pass
+    except Exception as e:
+        logger.warning(f"Warm-up could not open a database connection: {str(e)}")
+    logger.info(f"Warm-up finished in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+
+def cache_samples():
+    """Cache counters for /metrics, read from the caches' stats()"""
+    caches = {
+        "sql": question_cache,
+        "result": result_cache,
+        "summary": summary_cache,
+        "translation": translation_cache,
+    }
+    for name, cache in caches.items():
+        cache_stats = cache.stats()
+        labels = {"cache": name}
+        yield "cache_hits_total", "counter", "Cache lookups that found an entry", labels, cache_stats["hits"]
+        yield "cache_misses_total", "counter", "Cache lookups that found nothing", labels, cache_stats["misses"]
+        yield "cache_entries", "gauge", "Entries currently cached", labels, cache_stats["entries"]
+
+
+def pool_samples():
+    pool_stats = get_pool().stats()
+    yield "db_pool_size", "gauge", "Open pooled connections", {}, pool_stats["size"]
+    yield "db_pool_in_use", "gauge", "Pooled connections checked out", {}, pool_stats["in_use"]
+    yield "db_pool_waiting", "gauge", "Requests waiting for a connection", {}, pool_stats["waiting"]
+    yield "db_pool_timeouts_total", "counter", "Requests that gave up waiting for a connection", {}, pool_stats["timeouts"]
+    yield "db_pool_wait_seconds_total", "counter", "Time spent waiting for a pooled connection", {}, pool_stats["total_wait_seconds"]
+
+
+def single_flight_samples():
+    flight_stats = question_flights.stats()
+    yield "questions_in_flight", "gauge", "Distinct questions being answered right now", {}, flight_stats["in_flight"]
+    yield "coalesced_requests_total", "counter", "Requests that waited for an identical in-flight question", {}, flight_stats["coalesced"]
+    yield "coalesce_timeouts_total", "counter", "Shared pipeline runs given up after COALESCE_TIMEOUT", {}, flight_stats["timeouts"]
+
+
+metrics.add_collector(cache_samples)
+metrics.add_collector(single_flight_samples)
+metrics.add_collector(pool_samples)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Starts loading the embedded engine, the aggregate cube and the template SQL values (when enabled) in the background
+    get_local_engine()
+    get_aggregate_cube()
+    get_template_sql()
+    # Also in the background, so the app answers health checks while it runs
+    if STARTUP_WARM_UP:
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    yield
+
+
+# Responses are serialized once, with orjson, instead of jsonable_encoder + json
+app = FastAPI(default_response_class=FastJSONResponse, lifespan=lifespan)
 
 
 # Add CORS middleware to allow requests from your frontend
@@ -21,7 +112,55 @@ async def root():
 
 @app.get("/query")
 async def handle_query(text: str = Query(..., description="Your natural language query")):
-    return result(text)
+    return FastJSONResponse(await acoalesced_result(text))
+
+class BatchQuery(BaseModel):
+    questions: list[str]
+
+@app.post("/query/batch")
+async def handle_query_batch(batch: BatchQuery):
+    """Answer a list of questions, sharing LLM and database work between them"""
+    if len(batch.questions) > BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_QUESTIONS} questions per batch")
+    return FastJSONResponse({"results": await abatch_result(batch.questions)})
+
+@app.get("/query/page")
+async def handle_query_page(token: str = Query(..., description="next_page_token from a previous response")):
+    """Further rows of an earlier result; re-runs only the SQL, not the LLM stages"""
+    return FastJSONResponse((await aexecute_sql_page(token)).to_dict())
+
+@app.get("/query/stream")
+async def handle_query_stream(text: str = Query(..., description="Your natural language query")):
+    """Same pipeline as /query, streamed as newline-delimited JSON events"""
+    async def ndjson():
+        async for event in astream_result(text):
+            yield dumps(event) + b"\n"
+    return StreamingResponse(
+        ndjson(),
+        media_type="application/x-ndjson",
+        # Keep proxies from buffering the stream until it completes
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Per-stage latency histograms, LLM token counts, result sources and cache counters"""
+    return PlainTextResponse(metrics.render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/stats")
+async def stats():
+    return {
+        "db_pool": get_pool().stats(),
+        "sql_cache": question_cache.stats(),
+        "result_cache": result_cache.stats(),
+        "summary_cache": summary_cache.stats(),
+        "translation_cache": translation_cache.stats(),
+        "single_flight": question_flights.stats(),
+        "llm_rate_limits": limiter_stats(),
+        "local_engine": local_engine_stats(),
+        "aggregate_cube": aggregate_cube_stats(),
+        "template_sql": template_sql_stats(),
+    }
 
 if __name__ == "__main__":
     import uvicorn
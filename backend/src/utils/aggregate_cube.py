@@ -0,0 +1,676 @@
+import os
+import threading
+import time
+from decimal import Decimal, ROUND_HALF_UP
+from itertools import combinations
+from dotenv import load_dotenv
+from src.utils.db_pool import get_pool
+from src.utils.dataset_version import get_version_watcher, read_dataset_delta, read_dataset_version
+from src.utils.local_engine import get_local_engine
+from src.utils.sql_text import tokenize_sql
+import logging
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+AGGREGATE_CUBE = os.getenv("AGGREGATE_CUBE", "false").lower() in ("1", "true", "yes")
+# Largest number of dimensions (grouped plus filtered) a precomputed cuboid covers
+AGGREGATE_CUBE_MAX_DIMENSIONS = int(os.getenv("AGGREGATE_CUBE_MAX_DIMENSIONS", "2"))
+
+CUBE_TABLE = "motorcycle_sales"
+
+# Low-cardinality columns questions group and filter by; the year columns
+# also answer range filters (before/after/between years)
+dimensions = (
+    "state", "brand", "model", "fuel_type", "owner_type", "seller_type",
+    "insurance_status", "city_tier", "year_of_manufacture", "registration_year",
+)
+numeric_dimensions = {"year_of_manufacture", "registration_year"}
+
+# Measure name -> (SQL expression, integer valued)
+measures = {
+    "price_inr": ("price_inr", True),
+    "resale_price_inr": ("resale_price_inr", False),
+    "mileage_kmpl": ("mileage_kmpl", False),
+    "avg_daily_distance_km": ("avg_daily_distance_km", False),
+    "engine_capacity_cc": ("engine_capacity_cc", True),
+    "resale_percentage": ("resale_price_inr * 100.0 / price_inr", False),
+}
+measure_names = list(measures)
+
+# Python versions of the derived measures, for folding appended rows into the cells
+derived_measures = {
+    "resale_percentage": lambda row: row["resale_price_inr"] * 100.0 / row["price_inr"],
+}
+
+# A measure expression in generated SQL is recognized by its token sequence
+_measure_by_tokens = {
+    tuple(text.lower() for _, text in tokenize_sql(expression)): name
+    for name, (expression, _) in measures.items()
+}
+
+_aggregates = {"count", "sum", "avg", "min", "max"}
+_comparisons = {"=", "<>", "!=", "<", "<=", ">", ">="}
+
+
+class _Unsupported(Exception):
+    """The statement is outside what the cube can answer"""
+
+
+class _Parser:
+    """Cursor over tokenize_sql() tokens"""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self, ahead=0):
+        index = self.pos + ahead
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def word(self, *words):
+        kind, text = self.peek()
+        if kind == "word" and text.lower() in words:
+            self.pos += 1
+            return text.lower()
+        return None
+
+    def op(self, *ops):
+        kind, text = self.peek()
+        if kind == "operator" and text in ops:
+            self.pos += 1
+            return text
+        return None
+
+    def expect_word(self, *words):
+        found = self.word(*words)
+        if found is None:
+            raise _Unsupported(f"expected {'/'.join(words)}")
+        return found
+
+    def expect_op(self, *ops):
+        found = self.op(*ops)
+        if found is None:
+            raise _Unsupported(f"expected {' '.join(ops)}")
+        return found
+
+    def identifier(self):
+        kind, text = self.peek()
+        if kind == "word":
+            self.pos += 1
+            return text.lower()
+        if kind == "quoted_ident":
+            self.pos += 1
+            return text[1:-1].replace('""', '"')
+        raise _Unsupported("expected an identifier")
+
+    def integer(self):
+        kind, text = self.peek()
+        if kind != "number" or not text.isdigit():
+            raise _Unsupported("expected an integer")
+        self.pos += 1
+        return int(text)
+
+    def texts(self, start):
+        return tuple(text.lower() for _, text in self.tokens[start:self.pos])
+
+    def at_end(self):
+        return self.pos >= len(self.tokens)
+
+
+def _aggregate(p):
+    """AGG(measure) or COUNT(*) -> (function, measure or None)"""
+    function = p.word(*_aggregates)
+    if function is None:
+        raise _Unsupported("expected an aggregate")
+    p.expect_op("(")
+    if function == "count" and p.op("*"):
+        p.expect_op(")")
+        return function, None
+    start, depth = p.pos, 0
+    while True:
+        kind, text = p.peek()
+        if kind is None:
+            raise _Unsupported("unbalanced parentheses")
+        if kind == "operator" and text == "(":
+            depth += 1
+        elif kind == "operator" and text == ")":
+            if depth == 0:
+                break
+            depth -= 1
+        p.pos += 1
+    measure = _measure_by_tokens.get(p.texts(start))
+    p.expect_op(")")
+    if measure is None:
+        raise _Unsupported("not a cube measure")
+    return function, measure
+
+
+def _select_item(p, alias=True):
+    start = p.pos
+    if p.word("round"):
+        p.expect_op("(")
+        function, measure = _aggregate(p)
+        cast = p.op("::") is not None and p.expect_word("numeric")
+        digits = 0
+        if p.op(","):
+            digits = p.integer()
+        p.expect_op(")")
+        # round(double precision, int) doesn't exist in PostgreSQL; leave those to it
+        if not (cast or function == "count" or (function in ("sum", "avg") and measures[measure][1])):
+            raise _Unsupported("round() of a double")
+        item = {"kind": "aggregate", "function": function, "measure": measure, "round": digits, "name": "round"}
+    elif p.peek()[0] == "word" and p.peek()[1].lower() in _aggregates and p.peek(1) == ("operator", "("):
+        function, measure = _aggregate(p)
+        item = {"kind": "aggregate", "function": function, "measure": measure, "round": None, "name": function}
+    else:
+        column = p.identifier()
+        if column not in dimensions:
+            raise _Unsupported(f"{column} is not a cube dimension")
+        item = {"kind": "dimension", "column": column, "name": column}
+    item["tokens"] = p.texts(start)
+    if not alias:
+        return item
+    if p.word("as"):
+        item["name"] = p.identifier()
+    elif p.peek()[0] in ("word", "quoted_ident") and p.peek()[1].lower() != "from":
+        item["name"] = p.identifier()
+    return item
+
+
+def _literal(p, column):
+    kind, text = p.peek()
+    if kind == "string" and text[0] == "'":
+        p.pos += 1
+        value = text[1:-1].replace("''", "'")
+        if column in numeric_dimensions:
+            if not value.strip().isdigit():
+                raise _Unsupported("non-integer year")
+            return int(value)
+        return value
+    if kind == "number" and column in numeric_dimensions:
+        return p.integer()
+    raise _Unsupported("unsupported literal")
+
+
+def _predicate(p):
+    column = p.identifier()
+    if column not in dimensions:
+        raise _Unsupported(f"{column} is not a cube dimension")
+    ordered = column in numeric_dimensions
+    if p.word("between"):
+        if not ordered:
+            raise _Unsupported("range over text")
+        low = _literal(p, column)
+        p.expect_word("and")
+        high = _literal(p, column)
+        return column, lambda value: low <= value <= high
+    negate = p.word("not") is not None
+    if p.word("in"):
+        p.expect_op("(")
+        values = {_literal(p, column)}
+        while p.op(","):
+            values.add(_literal(p, column))
+        p.expect_op(")")
+        if negate:
+            return column, lambda value: value not in values
+        return column, lambda value: value in values
+    if negate:
+        raise _Unsupported("NOT without IN")
+    operator = p.expect_op(*_comparisons)
+    if operator not in ("=", "<>", "!=") and not ordered:
+        # Text ordering depends on the database collation
+        raise _Unsupported("range over text")
+    literal = _literal(p, column)
+    if operator == "=":
+        return column, lambda value: value == literal
+    if operator in ("<>", "!="):
+        return column, lambda value: value != literal
+    if operator == "<":
+        return column, lambda value: value < literal
+    if operator == "<=":
+        return column, lambda value: value <= literal
+    if operator == ">":
+        return column, lambda value: value > literal
+    return column, lambda value: value >= literal
+
+
+def _order_key(p, items):
+    """ORDER BY term -> index of the output column it sorts on"""
+    kind, text = p.peek()
+    if kind == "number":
+        position = p.integer()
+        if not 1 <= position <= len(items):
+            raise _Unsupported("ORDER BY position out of range")
+        return position - 1
+    start = p.pos
+    if kind in ("word", "quoted_ident") and p.peek(1) != ("operator", "("):
+        name = p.identifier()
+        for index, item in enumerate(items):
+            if item["name"] == name:
+                return index
+        for index, item in enumerate(items):
+            if item["kind"] == "dimension" and item["column"] == name:
+                return index
+        raise _Unsupported("ORDER BY a column that is not selected")
+    p.pos = start
+    matched = _select_item(p, alias=False)
+    for index, item in enumerate(items):
+        if item["tokens"] == matched["tokens"]:
+            return index
+    raise _Unsupported("ORDER BY an expression that is not selected")
+
+
+def parse_cube_query(sql):
+    """
+    Parse a generated query into the parts the cube can answer, or return None.
+
+    Accepted shape: SELECT <dimensions and AGG(measure)> FROM motorcycle_sales
+    [WHERE <dimension predicates joined by AND>] [GROUP BY <dimensions>]
+    [ORDER BY <aggregates and year columns>] [LIMIT n]
+    """
+    tokens = tokenize_sql(sql)
+    while tokens and tokens[-1] == ("operator", ";"):
+        tokens.pop()
+    p = _Parser(tokens)
+    try:
+        p.expect_word("select")
+        items = [_select_item(p)]
+        while p.op(","):
+            items.append(_select_item(p))
+        p.expect_word("from")
+        if p.identifier() != CUBE_TABLE:
+            raise _Unsupported("another table")
+
+        filters = []
+        if p.word("where"):
+            filters.append(_predicate(p))
+            while p.word("and"):
+                filters.append(_predicate(p))
+
+        group = []
+        if p.word("group"):
+            p.expect_word("by")
+            while True:
+                if p.peek()[0] == "number":
+                    position = p.integer()
+                    if not 1 <= position <= len(items) or items[position - 1]["kind"] != "dimension":
+                        raise _Unsupported("GROUP BY position")
+                    column = items[position - 1]["column"]
+                else:
+                    column = p.identifier()
+                if column not in dimensions:
+                    raise _Unsupported(f"GROUP BY {column}")
+                if column not in group:
+                    group.append(column)
+                if not p.op(","):
+                    break
+
+        order = []
+        if p.word("order"):
+            p.expect_word("by")
+            while True:
+                index = _order_key(p, items)
+                if items[index]["kind"] == "dimension" and items[index]["column"] not in numeric_dimensions:
+                    # Like text ranges: PostgreSQL orders text by its collation, not by code point
+                    raise _Unsupported("ORDER BY text")
+                descending = p.word("asc", "desc") == "desc"
+                if p.word("nulls"):
+                    raise _Unsupported("NULLS FIRST/LAST")
+                order.append((index, descending))
+                if not p.op(","):
+                    break
+
+        limit = None
+        if p.word("limit"):
+            limit = p.integer()
+        if not p.at_end():
+            raise _Unsupported(f"unexpected {p.peek()[1]}")
+    except _Unsupported:
+        return None
+
+    # Every selected dimension must be grouped, as PostgreSQL requires
+    if any(item["kind"] == "dimension" and item["column"] not in group for item in items):
+        return None
+    return {"items": items, "filters": filters, "group": group, "order": order, "limit": limit}
+
+
+def _empty_cell():
+    cell = [0]
+    for _ in measure_names:
+        cell.extend((0, 0, None, None))
+    return cell
+
+
+def _merge(total, cell):
+    total[0] += cell[0]
+    for base in range(1, len(cell), 4):
+        if cell[base] == 0:
+            continue
+        total[base] += cell[base]
+        total[base + 1] += cell[base + 1]
+        total[base + 2] = cell[base + 2] if total[base + 2] is None else min(total[base + 2], cell[base + 2])
+        total[base + 3] = cell[base + 3] if total[base + 3] is None else max(total[base + 3], cell[base + 3])
+
+
+def _row_cell(row):
+    """A cell holding a single table row (given as a dict)"""
+    cell = [1]
+    for name in measure_names:
+        try:
+            value = derived_measures[name](row) if name in derived_measures else row[name]
+        except (TypeError, ZeroDivisionError):
+            value = None
+        cell.extend((0, 0, None, None) if value is None else (1, value, value, value))
+    return cell
+
+
+def _aggregate_value(item, cell):
+    if item["measure"] is None:
+        value = cell[0]
+    else:
+        base = 1 + 4 * measure_names.index(item["measure"])
+        count = cell[base]
+        function = item["function"]
+        if function == "count":
+            value = count
+        elif count == 0:
+            value = None
+        elif function == "sum":
+            value = cell[base + 1]
+        elif function == "avg":
+            value = cell[base + 1] / count
+        elif function == "min":
+            value = cell[base + 2]
+        else:
+            value = cell[base + 3]
+    if value is not None and item["round"] is not None:
+        # PostgreSQL rounds numeric half away from zero
+        value = Decimal(repr(value)).quantize(Decimal(1).scaleb(-item["round"]), rounding=ROUND_HALF_UP)
+    return value
+
+
+def _numeric(value):
+    # PostgreSQL returns SUM(bigint) as numeric
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return value
+
+
+def cube_sql(max_dimensions=AGGREGATE_CUBE_MAX_DIMENSIONS):
+    """One GROUPING SETS query computing every cuboid of up to max_dimensions dimensions"""
+    sets = [combo for size in range(max_dimensions + 1) for combo in combinations(dimensions, size)]
+    grouping_sets = ", ".join(f"({', '.join(combo)})" for combo in sets)
+    aggregates = ["COUNT(*)"] + [
+        f"COUNT({expression}), SUM({expression}), MIN({expression}), MAX({expression})"
+        for expression, _ in measures.values()
+    ]
+    return (
+        f"SELECT GROUPING({', '.join(dimensions)}), {', '.join(dimensions)}, {', '.join(aggregates)} "
+        f"FROM {CUBE_TABLE} GROUP BY GROUPING SETS ({grouping_sets});"
+    )
+
+
+class AggregateCube:
+    """
+    Count/sum/min/max of every measure for each combination of up to
+    `max_dimensions` dimension values, built in one GROUPING SETS query when
+    the data loads.
+
+    answer() serves generated SQL whose grouped and filtered dimensions fit in
+    one cuboid by merging its cells, so the table is never scanned. Like the
+    embedded engine, the cube is tagged with the data version it was built
+    from and only used while that version is current.
+    """
+
+    def __init__(self, max_dimensions=AGGREGATE_CUBE_MAX_DIMENSIONS):
+        self.max_dimensions = max_dimensions
+        self._cuboids = None
+        self._version = None
+        self._static = False
+        self._lock = threading.Lock()
+        self._loading = False
+        self.cells = 0
+        self.build_seconds = 0.0
+        self.builds = 0
+        self.deltas = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _fetch_rows(self, engine):
+        """Rows of cube_sql() and the data version they reflect"""
+        sql = cube_sql(self.max_dimensions)
+        if engine is not None:
+            result = engine.execute(sql, 10 ** 7)
+            if result is not None:
+                return result[1], engine.version, engine.source != "postgres"
+        with get_pool().connection() as conn:
+            cursor = conn.cursor()
+            try:
+                # One REPEATABLE READ snapshot for the version and the aggregates
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ;")
+                version = read_dataset_version(conn)
+                cursor.execute(sql)
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+                conn.rollback()
+        return rows, version, False
+
+    def _begin_change(self):
+        with self._lock:
+            if self._loading:
+                return False
+            self._loading = True
+            return True
+
+    def _end_change(self):
+        with self._lock:
+            self._loading = False
+
+    def build(self, engine=None):
+        """(Re)build the cube, from the embedded engine's snapshot when one is given"""
+        if not self._begin_change():
+            return
+        try:
+            started = time.perf_counter()
+            rows, version, static = self._fetch_rows(engine)
+            count = len(dimensions)
+            cuboids = {}
+            for row in rows:
+                mask = row[0]
+                present = tuple(i for i in range(count) if not mask & (1 << (count - 1 - i)))
+                key = tuple(dimensions[i] for i in present)
+                values = tuple(_numeric(row[1 + i]) for i in present)
+                cuboids.setdefault(key, {})[values] = [_numeric(value) for value in row[1 + count:]]
+            seconds = time.perf_counter() - started
+            with self._lock:
+                self._cuboids, self._version, self._static = cuboids, version, static
+                self.cells, self.build_seconds = len(rows), seconds
+                self.builds += 1
+            logger.info(f"Aggregate cube built: {len(rows)} cells in {len(cuboids)} cuboids (data version {version}) in {seconds * 1000:.0f} ms")
+        except Exception as e:
+            logger.error(f"Aggregate cube build failed, queries use the table: {str(e)}")
+        finally:
+            self._end_change()
+
+    def build_in_background(self, engine=None):
+        threading.Thread(target=self.build, args=(engine,), name="aggregate-cube-build", daemon=True).start()
+
+    def apply_delta(self, delta):
+        """
+        Fold appended rows (a read_dataset_delta() result) into the cells.
+
+        Cells are copied on write and swapped in together with the new version,
+        so answer() never sees a half-applied delta. Returns False if the cube
+        isn't at the delta's base version.
+        """
+        if not self._begin_change():
+            return False
+        try:
+            if self._cuboids is None or self._version != delta["from_version"]:
+                return False
+            started = time.perf_counter()
+            cuboids = {key: dict(cells) for key, cells in self._cuboids.items()}
+            copied = set()
+            columns = delta["columns"]
+            for values in delta["rows"]:
+                row = dict(zip(columns, values))
+                contribution = _row_cell(row)
+                for key, cells in cuboids.items():
+                    cell_values = tuple(row[column] for column in key)
+                    cell = cells.get(cell_values)
+                    if cell is None:
+                        cells[cell_values] = list(contribution)
+                        copied.add((key, cell_values))
+                        continue
+                    if (key, cell_values) not in copied:
+                        cell = cells[cell_values] = list(cell)
+                        copied.add((key, cell_values))
+                    _merge(cell, contribution)
+            with self._lock:
+                self._cuboids, self._version = cuboids, delta["to_version"]
+                self.cells = sum(len(cells) for cells in cuboids.values())
+                self.deltas += 1
+            logger.info(f"Aggregate cube folded in {len(delta['rows'])} appended rows (data version {delta['to_version']}) in {(time.perf_counter() - started) * 1000:.0f} ms")
+            return True
+        except Exception as e:
+            logger.error(f"Aggregate cube append failed: {str(e)}")
+            return False
+        finally:
+            self._end_change()
+
+    def on_engine_change(self, engine, delta):
+        """Local engine listener: fold in appended rows, otherwise rebuild from the new snapshot"""
+        if delta is None or not self.apply_delta(delta):
+            self.build(engine)
+
+    def on_version_change(self, old_version, new_version):
+        """Version watcher listener (no local engine): fold in appended rows, otherwise rebuild"""
+        threading.Thread(target=self._catch_up, args=(old_version, new_version), name="aggregate-cube-build", daemon=True).start()
+
+    def _catch_up(self, old_version, new_version):
+        delta = None
+        if self._version == old_version:
+            try:
+                delta = read_dataset_delta(old_version, new_version)
+            except Exception as e:
+                logger.warning(f"Could not read appended rows, rebuilding: {str(e)}")
+        if delta is None or not self.apply_delta(delta):
+            self.build()
+
+    def ready_for(self, data_version):
+        """True when the cube reflects data_version"""
+        if self._cuboids is None:
+            return False
+        if self._static:
+            # Built from a CSV snapshot: current exactly while the snapshot is (see LocalEngine.ready_for)
+            return self._version == data_version
+        if data_version is not None and self._version is not None and self._version < data_version:
+            # Missed a change; catch up for the next query
+            engine = get_local_engine()
+            if engine is None:
+                self.build_in_background()
+            elif engine.version == data_version:
+                self.build_in_background(engine)
+        return data_version is not None and self._version == data_version
+
+    def answer(self, sql):
+        """Answer a query from the cube: (columns, rows), or None if it doesn't fit"""
+        cuboids = self._cuboids
+        spec = parse_cube_query(sql) if cuboids is not None else None
+        if spec is None:
+            self.misses += 1
+            return None
+        used = set(spec["group"]) | {column for column, _ in spec["filters"]}
+        key = tuple(column for column in dimensions if column in used)
+        if len(key) > self.max_dimensions or key not in cuboids:
+            self.misses += 1
+            return None
+
+        position = {column: index for index, column in enumerate(key)}
+        filters = [(position[column], test) for column, test in spec["filters"]]
+        group = [position[column] for column in spec["group"]]
+        groups = {}
+        exact = len(group) == len(key)
+        for values, cell in cuboids[key].items():
+            if all(test(values[index]) for index, test in filters):
+                group_values = tuple(values[index] for index in group)
+                if exact:
+                    # One cell per group: nothing to merge
+                    groups[group_values] = cell
+                    continue
+                total = groups.get(group_values)
+                if total is None:
+                    total = groups[group_values] = _empty_cell()
+                _merge(total, cell)
+        if not spec["group"] and not groups:
+            # An ungrouped aggregate always returns one row
+            groups[()] = _empty_cell()
+
+        items = spec["items"]
+        rows = []
+        for group_values, cell in groups.items():
+            by_column = dict(zip(spec["group"], group_values))
+            rows.append(tuple(
+                by_column[item["column"]] if item["kind"] == "dimension" else _aggregate_value(item, cell)
+                for item in items
+            ))
+        # Stable sorts, last key first; NULLs sort last ascending and first descending
+        for index, descending in reversed(spec["order"]):
+            rows.sort(key=lambda row: (row[index] is None, row[index] if row[index] is not None else 0), reverse=descending)
+        if spec["limit"] is not None:
+            rows = rows[:spec["limit"]]
+        self.hits += 1
+        return [item["name"] for item in items], rows
+
+    def stats(self):
+        return {
+            "enabled": True,
+            "ready": self._cuboids is not None,
+            "data_version": self._version,
+            "cells": self.cells,
+            "build_ms": round(self.build_seconds * 1000, 1),
+            "builds": self.builds,
+            "deltas": self.deltas,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+_cube = None
+_cube_lock = threading.Lock()
+
+
+def get_aggregate_cube():
+    """Return the process-wide aggregate cube, or None when AGGREGATE_CUBE is off"""
+    global _cube
+    if not AGGREGATE_CUBE:
+        return None
+    if _cube is None:
+        with _cube_lock:
+            if _cube is None:
+                cube = AggregateCube()
+                engine = get_local_engine()
+                if engine is not None:
+                    # Rebuilt from each new snapshot, without touching PostgreSQL
+                    engine.add_listener(cube.on_engine_change)
+                    if engine.loaded:
+                        cube.build_in_background(engine)
+                else:
+                    get_version_watcher().add_listener(cube.on_version_change)
+                    cube.build_in_background()
+                _cube = cube
+    return _cube
+
+
+def aggregate_cube_stats():
+    cube = get_aggregate_cube()
+    return cube.stats() if cube is not None else {"enabled": False}
@@ -0,0 +1,116 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache with optional TTL and byte budget.
+
+    `sizeof` is called on every stored value when `max_bytes` is set so the
+    cache can evict least-recently-used entries until it fits. `on_evict` is
+    called with the key of every entry dropped for any reason other than an
+    explicit clear().
+    """
+
+    def __init__(self, max_entries=1024, ttl=None, max_bytes=None, sizeof=None, on_evict=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.on_evict = on_evict
+
+        self._lock = threading.Lock()
+        self._data = OrderedDict()  # key -> (value, stored_at, size)
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _drop(self, key):
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+        if self.on_evict is not None:
+            self.on_evict(key)
+
+    def _expired(self, stored_at, now):
+        return self.ttl is not None and now - stored_at > self.ttl
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            if self._expired(entry[1], time.monotonic()):
+                self._drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def peek(self, key, default=None):
+        """Like get() but without touching recency or hit/miss counters"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or self._expired(entry[1], time.monotonic()):
+                return default
+            return entry[0]
+
+    def set(self, key, value):
+        size = self.sizeof(value) if self.sizeof is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            # Never worth flushing the whole cache for one oversized value
+            return False
+        with self._lock:
+            if key in self._data:
+                self._bytes -= self._data.pop(key)[2]
+            self._data[key] = (value, time.monotonic(), size)
+            self._bytes += size
+            while len(self._data) > self.max_entries or (
+                self.max_bytes is not None and self._bytes > self.max_bytes
+            ):
+                self._drop(next(iter(self._data)))
+                self.evictions += 1
+        return True
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            value = self._data[key][0]
+            self._drop(key)
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def keys(self):
+        with self._lock:
+            return list(self._data.keys())
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.peek(key) is not None
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
@@ -0,0 +1,209 @@
+import os
+import select
+import threading
+import time
+import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
+from dotenv import load_dotenv
+from src.utils.db_pool import DATABASE_URL, DB_CONNECT_TIMEOUT, get_pool, parse_database_url
+import logging
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# The loader (backend/data/postgresql.py) inserts a row here and NOTIFYs this
+# channel in the same transaction whenever motorcycle_sales is reloaded
+DATASET_VERSION_TABLE = "dataset_versions"
+DATASET_VERSION_CHANNEL = "dataset_version"
+DATASET_VERSION_POLL_INTERVAL = float(os.getenv("DATASET_VERSION_POLL_INTERVAL", "30"))  # safety-net re-read, seconds
+
+# Rows added by each append-mode load, tagged with the version that added them
+DATASET_DELTA_TABLE = "motorcycle_sales_delta"
+
+VERSION_QUERY = f"SELECT COALESCE(MAX(version), 0) FROM {DATASET_VERSION_TABLE};"
+
+
+def read_dataset_version(conn):
+    """Read the current data version; 0 if the loader has never stamped one"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(VERSION_QUERY)
+        return int(cursor.fetchone()[0])
+    except psycopg2.errors.UndefinedTable:
+        conn.rollback()
+        return 0
+    finally:
+        cursor.close()
+
+
+def read_dataset_delta(old_version, new_version):
+    """
+    Rows appended between two data versions, as
+    {"from_version", "to_version", "columns", "rows"}.
+
+    Returns None unless every version after old_version up to new_version was
+    an append whose rows are still in the delta log (the loader prunes old
+    ones), in which case in-memory copies can be patched rather than reloaded.
+    """
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        try:
+            # One REPEATABLE READ snapshot for the version log and the delta
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ;")
+            cursor.execute(
+                f"SELECT COUNT(*), COUNT(*) FILTER (WHERE mode = 'append') FROM {DATASET_VERSION_TABLE} "
+                "WHERE version > %s AND version <= %s;",
+                (old_version, new_version)
+            )
+            versions, appends = cursor.fetchone()
+            if versions == 0 or appends != versions:
+                return None
+            cursor.execute(
+                f"SELECT * FROM {DATASET_DELTA_TABLE} WHERE version > %s AND version <= %s;",
+                (old_version, new_version)
+            )
+            fetched = cursor.fetchall()
+            # Every append adds rows, so a version without any has been pruned
+            if len({row[0] for row in fetched}) != versions:
+                return None
+            # Drop the leading version column; the rest match motorcycle_sales
+            columns = [desc.name for desc in cursor.description][1:]
+            rows = [row[1:] for row in fetched]
+            return {"from_version": old_version, "to_version": new_version, "columns": columns, "rows": rows}
+        except psycopg2.errors.UndefinedTable:
+            return None
+        finally:
+            cursor.close()
+            conn.rollback()
+
+
+class DatasetVersionWatcher:
+    """
+    Keeps the current data version in memory without a query per request.
+
+    A background thread LISTENs on the loader's notification channel and
+    re-reads the version table every `poll_interval` seconds as a safety net.
+    While the listener is disconnected, current() falls back to querying the
+    version table directly so callers never act on a stale version.
+    """
+
+    def __init__(self, db_params, poll_interval=DATASET_VERSION_POLL_INTERVAL):
+        self.db_params = db_params
+        self.poll_interval = poll_interval
+        self._version = None
+        self._listening = False
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """Register callback(old_version, new_version), called from the watcher thread"""
+        self._listeners.append(callback)
+
+    def _set_version(self, version):
+        with self._lock:
+            old = self._version
+            if old is not None and version <= old:
+                return
+            self._version = version
+        if old is not None:
+            logger.info(f"Dataset version changed: {old} -> {version}")
+            for callback in self._listeners:
+                try:
+                    callback(old, version)
+                except Exception as e:
+                    logger.error(f"Dataset version listener failed: {str(e)}", exc_info=True)
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._listen_loop, name="dataset-version-listener", daemon=True)
+                    self._thread.start()
+
+    def current(self):
+        """Return the current data version"""
+        self._ensure_started()
+        if self._listening and self._version is not None:
+            return self._version
+        with get_pool().connection() as conn:
+            version = read_dataset_version(conn)
+            conn.rollback()
+        self._set_version(version)
+        return version
+
+    def _listen_loop(self):
+        backoff = 1.0
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(
+                    host=self.db_params["host"],
+                    port=self.db_params["port"],
+                    dbname=self.db_params["dbname"],
+                    user=self.db_params["user"],
+                    password=self.db_params["password"],
+                    connect_timeout=DB_CONNECT_TIMEOUT
+                )
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                cursor = conn.cursor()
+                cursor.execute(f"LISTEN {DATASET_VERSION_CHANNEL};")
+                # Read after LISTEN so no reload can slip between the two
+                self._set_version(read_dataset_version(conn))
+                self._listening = True
+                backoff = 1.0
+                logger.info(f"Listening for dataset reloads on channel '{DATASET_VERSION_CHANNEL}'")
+
+                while not self._stop.is_set():
+                    ready, _, _ = select.select([conn], [], [], self.poll_interval)
+                    if not ready:
+                        self._set_version(read_dataset_version(conn))
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        try:
+                            self._set_version(int(notify.payload))
+                        except ValueError:
+                            self._set_version(read_dataset_version(conn))
+            except Exception as e:
+                logger.warning(f"Dataset version listener disconnected: {str(e)}; retrying in {backoff:.0f}s")
+            finally:
+                self._listening = False
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, 60.0)
+
+    def stop(self):
+        self._stop.set()
+
+
+_watcher = None
+_watcher_lock = threading.Lock()
+
+
+def get_version_watcher():
+    """Return the process-wide dataset version watcher"""
+    global _watcher
+    if _watcher is None:
+        with _watcher_lock:
+            if _watcher is None:
+                _watcher = DatasetVersionWatcher(parse_database_url(DATABASE_URL))
+    return _watcher
+
+
+def current_dataset_version():
+    return get_version_watcher().current()
@@ -0,0 +1,289 @@
+import os
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from urllib.parse import urlparse
+import psycopg2
+import psycopg2.extensions
+from dotenv import load_dotenv
+import logging
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+# Pool sizing and housekeeping
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))  # seconds to wait for a free connection
+DB_POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", "300"))  # close connections idle longer than this
+DB_POOL_HEALTH_CHECK_AFTER = float(os.getenv("DB_POOL_HEALTH_CHECK_AFTER", "30"))  # ping connections idle longer than this
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "10"))
+DB_STATEMENT_TIMEOUT = os.getenv("DB_STATEMENT_TIMEOUT", "30s")
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection becomes available within the pool timeout"""
+
+
+def parse_database_url(url):
+    """Parse PostgreSQL database URL into connection parameters"""
+    if not url:
+        raise ValueError("DATABASE_URL environment variable is not set")
+    
+    result = urlparse(url)
+    return {
+        "host": result.hostname,
+        "port": result.port,
+        "dbname": result.path[1:],  
+        "user": result.username,
+        "password": result.password
+    }
+
+
+class ConnectionPool:
+    """
+    Thread-safe PostgreSQL connection pool.
+
+    Session settings (statement_timeout) are applied once when a connection is
+    opened. Connections that sat idle longer than `health_check_after` are
+    pinged before being handed out, and idle connections above `min_size` are
+    closed after `max_idle` seconds by a background reaper.
+    """
+
+    def __init__(self, db_params, min_size=DB_POOL_MIN_SIZE, max_size=DB_POOL_MAX_SIZE,
+                 timeout=DB_POOL_TIMEOUT, max_idle=DB_POOL_MAX_IDLE,
+                 health_check_after=DB_POOL_HEALTH_CHECK_AFTER,
+                 statement_timeout=DB_STATEMENT_TIMEOUT):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError(f"Invalid pool size: min={min_size}, max={max_size}")
+        self.db_params = db_params
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.health_check_after = health_check_after
+        self.statement_timeout = statement_timeout
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # (connection, returned_at), most recently used on the right
+        self._size = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._closed = False
+
+        self._acquisitions = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._timeouts = 0
+        self._created = 0
+        self._discarded = 0
+        self._health_check_failures = 0
+
+        self._reaper_stop = threading.Event()
+        self._reaper = threading.Thread(target=self._reap_loop, name="db-pool-reaper", daemon=True)
+        self._reaper.start()
+
+    def _connect(self):
+        logger.info(f"Opening database connection to {self.db_params['host']}:{self.db_params['port']}/{self.db_params['dbname']}")
+        conn = psycopg2.connect(
+            host=self.db_params["host"],
+            port=self.db_params["port"],
+            dbname=self.db_params["dbname"],
+            user=self.db_params["user"],
+            password=self.db_params["password"],
+            connect_timeout=DB_CONNECT_TIMEOUT
+        )
+        try:
+            conn.set_session(autocommit=False)
+            cursor = conn.cursor()
+            cursor.execute("SET statement_timeout = %s;", (self.statement_timeout,))
+            cursor.close()
+            conn.commit()
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    def _is_healthy(self, conn):
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1;")
+            cursor.fetchone()
+            cursor.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error as e:
+            logger.warning(f"Discarding unhealthy pooled connection: {str(e)}")
+            return False
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def getconn(self):
+        """Check a connection out of the pool, opening a new one if there is room"""
+        start = time.monotonic()
+        conn = None
+        with self._cond:
+            if self._closed:
+                raise PoolTimeoutError("Connection pool is closed")
+            self._waiting += 1
+            try:
+                while True:
+                    if self._idle:
+                        conn, returned_at = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        returned_at = None
+                        break
+                    remaining = self.timeout - (time.monotonic() - start)
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeoutError(
+                            f"No database connection available after {self.timeout}s "
+                            f"({self._in_use} in use, max {self.max_size})"
+                        )
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+
+            wait = time.monotonic() - start
+            self._acquisitions += 1
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+            self._in_use += 1
+
+        try:
+            if conn is not None and (
+                conn.closed
+                or (time.monotonic() - returned_at > self.health_check_after and not self._is_healthy(conn))
+            ):
+                self._close_quietly(conn)
+                conn = None
+                with self._cond:
+                    self._health_check_failures += 1
+            if conn is None:
+                conn = self._connect()
+                with self._cond:
+                    self._created += 1
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def putconn(self, conn, discard=False):
+        """Return a connection to the pool; broken or discarded connections are closed"""
+        if not discard and not conn.closed:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+        discard = discard or bool(conn.closed)
+
+        with self._cond:
+            self._in_use -= 1
+            if discard or self._closed:
+                self._size -= 1
+                self._discarded += 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+        if discard or self._closed:
+            self._close_quietly(conn)
+
+    @contextmanager
+    def connection(self):
+        """Context manager yielding a pooled connection"""
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            # putconn rolls back unfinished transactions and drops broken connections
+            self.putconn(conn)
+
+    def reap_idle(self):
+        """Close idle connections above min_size that exceeded max_idle"""
+        expired = []
+        now = time.monotonic()
+        with self._cond:
+            # Oldest connections sit on the left of the deque
+            while self._idle and self._size > self.min_size and now - self._idle[0][1] > self.max_idle:
+                expired.append(self._idle.popleft()[0])
+                self._size -= 1
+                self._discarded += 1
+        for conn in expired:
+            self._close_quietly(conn)
+        if expired:
+            logger.info(f"Reaped {len(expired)} idle database connection(s)")
+        return len(expired)
+
+    def _reap_loop(self):
+        interval = max(1.0, min(self.max_idle / 2, 60.0))
+        while not self._reaper_stop.wait(interval):
+            try:
+                self.reap_idle()
+            except Exception as e:
+                logger.error(f"Idle connection reaper failed: {str(e)}")
+
+    def close(self):
+        """Close all idle connections and refuse further checkouts"""
+        self._reaper_stop.set()
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._size -= len(idle)
+            self._idle.clear()
+            self._cond.notify_all()
+        for conn in idle:
+            self._close_quietly(conn)
+
+    def stats(self):
+        """Snapshot of pool usage, for sizing the pool under load"""
+        with self._cond:
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self._size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+                "acquisitions": self._acquisitions,
+                "total_wait_seconds": round(self._total_wait, 6),
+                "avg_wait_ms": round(self._total_wait / self._acquisitions * 1000, 3) if self._acquisitions else 0.0,
+                "max_wait_ms": round(self._max_wait * 1000, 3),
+                "timeouts": self._timeouts,
+                "connections_created": self._created,
+                "connections_discarded": self._discarded,
+                "health_check_failures": self._health_check_failures,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(parse_database_url(DATABASE_URL))
+    return _pool
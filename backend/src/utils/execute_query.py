@@ -1,9 +1,18 @@
 import os
-import json
+import re
+import uuid
+import asyncio
 import psycopg2
-import psycopg2.extras
 from dotenv import load_dotenv
-from urllib.parse import urlparse
+from src.utils.db_pool import get_pool
+from src.utils.dataset_version import current_dataset_version
+from src.utils.local_engine import get_local_engine
+from src.utils.aggregate_cube import get_aggregate_cube
+from src.utils.result_cache import result_cache, result_cache_key
+from src.utils.page_token import InvalidPageToken, encode_page_token, decode_page_token
+from src.utils.query_result import QueryResult
+from src.utils.serialization import dumps
+from src.utils import metrics
 import logging
 
 # Configure logging
@@ -16,105 +25,286 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
-# Get database connection string from environment
-DATABASE_URL = os.getenv("DATABASE_URL")
 
-def parse_database_url(url):
-    """Parse PostgreSQL database URL into connection parameters"""
-    if not url:
-        raise ValueError("DATABASE_URL environment variable is not set")
-    
-    result = urlparse(url)
+# Rows fetched per round trip from the server-side cursor
+DB_FETCH_CHUNK_ROWS = int(os.getenv("DB_FETCH_CHUNK_ROWS", "2000"))
+
+# Bounded execution: rows returned per page, and the most rows any query may page through
+RESULT_PAGE_SIZE = int(os.getenv("RESULT_PAGE_SIZE", "500"))
+RESULT_MAX_ROWS = int(os.getenv("RESULT_MAX_ROWS", "10000"))
+
+# Only these statements can run behind DECLARE ... CURSOR
+_cursor_statement = re.compile(r'^\s*\(*\s*(SELECT|WITH|VALUES|TABLE)\b', re.IGNORECASE)
+
+
+def describe_result(total_count, columns, offset=0, shown=None, truncated=False):
+    # Generate simple explanation
+    if total_count == 0:
+        return "The query returned no results."
+    explanation = f"The query returned {total_count}{'+' if truncated else ''} row" + ("s" if total_count > 1 else "")
+    if shown == 0 and offset > 0:
+        explanation += f" (no rows past row {offset})"
+    elif shown is not None and (offset > 0 or shown < total_count):
+        explanation += f" (showing rows {offset + 1}-{offset + shown})"
+    if not columns:
+        return explanation + "."
+    return explanation + f". Columns returned: {', '.join(columns)}."
+
+
+def _move_cursor(conn, cursor_name, count):
+    """MOVE a server-side cursor forward without transferring rows; returns rows skipped"""
+    mover = conn.cursor()
+    try:
+        mover.execute(f'MOVE FORWARD {int(count)} IN "{cursor_name}";')
+        return mover.rowcount
+    finally:
+        mover.close()
+
+
+def _finish_page(cache_key, columns, data, explanation, total_count, next_offset, data_version):
+    """Cache a successfully fetched page (when cache_key is set) and build the final event"""
+    if cache_key is not None:
+        result_cache.set(cache_key, {
+            "columns": columns,
+            "rows": data,
+            "explanation": explanation,
+            "total_count": total_count,
+            "next_offset": next_offset,
+            "size": len(dumps(data)),
+        })
     return {
-        "host": result.hostname,
-        "port": result.port,
-        "dbname": result.path[1:],  
-        "user": result.username,
-        "password": result.password
+        "columns": columns,
+        "explanation": explanation,
+        "error": False,
+        "total_count": total_count,
+        "next_offset": next_offset,
+        "data_version": data_version,
     }
 
-def execute_sql_query(query):
-    """Execute a SQL query and return the results as JSON"""
-    response = {"sql": query, "data": None, "explanation": None}
-    conn = None
+
+def _page_from_rows(answer, cache_key, offset, page_size, chunk_size, data_version):
+    """iter_sql_query() events for one page of an in-process (columns, rows) answer"""
+    columns, rows = answer
+    truncated = len(rows) > RESULT_MAX_ROWS
+    total_count = min(len(rows), RESULT_MAX_ROWS)
+    data = rows[offset:min(offset + page_size, total_count)]
+    next_offset = offset + len(data) if data and offset + len(data) < total_count else None
+    explanation = describe_result(total_count, columns, offset, len(data), truncated)
+    logger.info(f"Query returned {total_count} rows ({len(data)} on this page) with columns: {', '.join(columns)}")
+    for start in range(0, len(data), chunk_size):
+        yield {"columns": columns, "rows": data[start:start + chunk_size]}
+    yield _finish_page(cache_key, columns, data, explanation, total_count, next_offset, data_version)
+
+
+def iter_sql_query(query, offset=0, page_size=RESULT_PAGE_SIZE, chunk_size=DB_FETCH_CHUNK_ROWS):
+    """
+    Execute a SQL query and yield one page of its result incrementally.
+
+    Yields {"columns": [...], "rows": [tuple, ...]} for every chunk fetched
+    from the server, followed by exactly one final event:
+
+        {"columns": [...], "explanation": str, "error": bool, "total_count": int,
+         "next_offset": int | None, "data_version": int | None}
+
+    Row-returning statements run on a named (server-side) cursor: rows before
+    `offset` are skipped and rows after the page are counted with MOVE on the
+    server, so memory stays proportional to `page_size`, not the result size.
+    No query can page past RESULT_MAX_ROWS. Queries run in a READ ONLY
+    transaction.
+    """
+    offset = max(0, offset)
+    page_size = max(1, min(page_size, RESULT_MAX_ROWS))
+    chunk_size = min(chunk_size, page_size)
+    cache_key = None
+    data_version = None
     
+    # Results are cached per data version, so a reload makes old entries unreachable
     try:
-        # Parse the database URL
-        db_params = parse_database_url(DATABASE_URL)
-        
-        logger.info(f"Connecting to database at {db_params['host']}:{db_params['port']}/{db_params['dbname']}")
-        
-        # Connect to the database with timeout parameters
-        conn = psycopg2.connect(
-            host=db_params["host"],
-            port=db_params["port"],
-            dbname=db_params["dbname"],
-            user=db_params["user"],
-            password=db_params["password"],
-            connect_timeout=10  # Add a connection timeout
-        )
-        
-        # Set a statement timeout to prevent long-running queries
-        conn.set_session(autocommit=False)
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-        cursor.execute("SET statement_timeout = '30s';")  # 30 second timeout for statements
-        
-        logger.info(f"Executing query: {query}")
-        
-        # Execute the query
-        cursor.execute(query)
-        
-        # Fetch results
-        rows = cursor.fetchall()
-        if cursor.description:  # Check if there are columns in the result
-            columns = [desc.name for desc in cursor.description]
-            # Convert to list of dictionaries
-            data = [dict(row) for row in rows]
-            response["data"] = data
+        data_version = current_dataset_version()
+        cache_key = result_cache_key(query, data_version, (offset, page_size))
+    except Exception as e:
+        logger.warning(f"Result cache bypassed, could not read dataset version: {str(e)}")
+    if cache_key is not None:
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            logger.info("Result cache hit")
+            metrics.record_source("result_cache")
+            for start in range(0, len(cached["rows"]), chunk_size):
+                yield {"columns": cached["columns"], "rows": cached["rows"][start:start + chunk_size]}
+            yield {
+                "columns": cached["columns"],
+                "explanation": cached["explanation"],
+                "error": False,
+                "total_count": cached["total_count"],
+                "next_offset": cached["next_offset"],
+                "data_version": data_version,
+            }
+            return
+    
+    # Aggregates the cube covers, then read-only queries on the embedded
+    # snapshot, are answered in process while they match the data version
+    cube = get_aggregate_cube()
+    if cube is not None and cube.ready_for(data_version):
+        answer = cube.answer(query)
+        if answer is not None:
+            logger.info("Answered from the aggregate cube")
+            metrics.record_source("cube")
+            yield from _page_from_rows(answer, cache_key, offset, page_size, chunk_size, data_version)
+            return
+    engine = get_local_engine()
+    if engine is not None and engine.ready_for(data_version):
+        answer = engine.execute(query, RESULT_MAX_ROWS + 1)
+        if answer is not None:
+            logger.info("Answered by the local engine")
+            metrics.record_source("local_engine")
+            yield from _page_from_rows(answer, cache_key, offset, page_size, chunk_size, data_version)
+            return
+
+    data = []
+    columns = []
+    next_offset = None
+    try:
+        # Connections come from the process-wide pool with statement_timeout already set
+        with get_pool().connection() as conn:
+            # The database enforces what check_read_only() screens for
+            guard = conn.cursor()
+            guard.execute("SET TRANSACTION READ ONLY;")
+            guard.close()
+            named = _cursor_statement.match(query) is not None
+            if named:
+                cursor = conn.cursor(name=f"result_{uuid.uuid4().hex}")
+            else:
+                cursor = conn.cursor()
+            
+            logger.info(f"Executing query: {query}")
+            metrics.record_source("postgres")
+            
+            # Execute the query
+            cursor.execute(query)
             
-            # Generate simple explanation
-            row_count = len(data)
-            if row_count == 0:
-                explanation = "The query returned no results."
+            # Fetch results
+            if named:
+                skipped = _move_cursor(conn, cursor.name, min(offset, RESULT_MAX_ROWS)) if offset else 0
+                wanted = max(0, min(page_size, RESULT_MAX_ROWS - offset)) if skipped == offset else 0
+                while len(data) < wanted:
+                    # Rows stay plain tuples; records are built once at the HTTP boundary
+                    rows = cursor.fetchmany(min(chunk_size, wanted - len(data)))
+                    if not rows:
+                        break
+                    if not columns:
+                        columns = [desc.name for desc in cursor.description]
+                    data.extend(rows)
+                    yield {"columns": columns, "rows": rows}
+                
+                # Count what's left on the server, up to one row past the cap
+                consumed = skipped + len(data)
+                remaining = _move_cursor(conn, cursor.name, RESULT_MAX_ROWS - consumed + 1) if len(data) == wanted else 0
+                truncated = consumed + remaining > RESULT_MAX_ROWS
+                total_count = min(consumed + remaining, RESULT_MAX_ROWS)
+                if data and offset + len(data) < total_count:
+                    next_offset = offset + len(data)
+                
+                # Column names are only known once something was FETCHed
+                columns = columns or [desc.name for desc in cursor.description or []]
+                explanation = describe_result(total_count, columns, offset, len(data), truncated)
+                logger.info(f"Query returned {total_count} rows ({len(data)} on this page) with columns: {', '.join(columns)}")
+                cacheable = True
+            elif cursor.description:
+                columns = [desc.name for desc in cursor.description]
+                data = cursor.fetchmany(page_size)
+                if data:
+                    yield {"columns": columns, "rows": data}
+                total_count = cursor.rowcount
+                explanation = describe_result(total_count, columns, 0, len(data))
+                cacheable = False
             else:
-                explanation = (
-                    f"The query returned {row_count} row" + ("s" if row_count > 1 else "") + 
-                    f". Columns returned: {', '.join(columns)}."
-                )
-            response["explanation"] = explanation
-            logger.info(f"Query returned {row_count} rows with columns: {', '.join(columns)}")
-        else:
-            # For queries that don't return data (like INSERT, UPDATE)
-            response["data"] = []
-            affected_rows = cursor.rowcount
-            response["explanation"] = f"Query executed successfully. {affected_rows} rows affected."
-            logger.info(f"Query executed successfully. {affected_rows} rows affected.")
-        
-        # Clean up
-        conn.commit()
-        cursor.close()
+                # For queries that don't return data (like INSERT, UPDATE)
+                affected_rows = cursor.rowcount
+                total_count = 0
+                explanation = f"Query executed successfully. {affected_rows} rows affected."
+                logger.info(explanation)
+                cacheable = False
+            
+            # Clean up
+            cursor.close()
+            conn.commit()
         
     except psycopg2.OperationalError as e:
         error_msg = f"Database connection error: {str(e)}"
         logger.error(error_msg)
-        response["explanation"] = error_msg
-        response["data"] = []
+        yield {"columns": [], "explanation": error_msg, "error": True, "total_count": 0, "next_offset": None, "data_version": data_version}
+        return
         
     except psycopg2.Error as e:
         error_msg = f"Database error: {str(e)}"
         logger.error(error_msg)
-        response["explanation"] = error_msg
-        response["data"] = []
+        yield {"columns": [], "explanation": error_msg, "error": True, "total_count": 0, "next_offset": None, "data_version": data_version}
+        return
         
     except Exception as e:
         error_msg = f"Error executing query: {str(e)}"
         logger.error(error_msg)
-        response["explanation"] = error_msg
-        response["data"] = []
-        
+        yield {"columns": [], "explanation": error_msg, "error": True, "total_count": 0, "next_offset": None, "data_version": data_version}
+        return
+    
+    yield _finish_page(cache_key if cacheable else None, columns, data, explanation, total_count, next_offset, data_version)
+
+
+def page_token_for(query, event, page_size):
+    """Signed token for the page after the one described by a final iter_sql_query event"""
+    if event.get("next_offset") is None:
+        return None
+    return encode_page_token(query, event["next_offset"], page_size, event.get("data_version"))
+
+
+def execute_sql_query(query, offset=0, page_size=RESULT_PAGE_SIZE):
+    """Execute a SQL query on a pooled connection and return one page of results"""
+    result = QueryResult(sql=query)
+    for event in iter_sql_query(query, offset, page_size):
+        if "rows" in event:
+            result.rows.extend(event["rows"])
+        else:
+            result.columns = event["columns"]
+            result.explanation = event["explanation"]
+            result.error = event["error"]
+            result.total_count = event["total_count"]
+            result.next_page_token = page_token_for(query, event, page_size)
+            if event["error"]:
+                result.rows = []
+    return result
+
+
+def execute_sql_page(page_token):
+    """Fetch the page a token from an earlier response points at"""
+    try:
+        page = decode_page_token(page_token)
+        if page.get("version") is not None and page["version"] != current_dataset_version():
+            raise InvalidPageToken("The data was reloaded since this page was requested; please run the question again.")
+    except Exception as e:
+        logger.warning(f"Rejected page token: {str(e)}")
+        return QueryResult(sql=None, explanation=f"Error: {str(e)}", error=True)
+    return execute_sql_query(page["sql"], page["offset"], page["page_size"])
+
+
+async def aexecute_sql_query(query, offset=0, page_size=RESULT_PAGE_SIZE):
+    """Run execute_sql_query in a worker thread so the blocking driver doesn't stall the event loop"""
+    return await asyncio.to_thread(execute_sql_query, query, offset, page_size)
+
+
+async def aexecute_sql_page(page_token):
+    return await asyncio.to_thread(execute_sql_page, page_token)
+
+
+async def astream_sql_query(query, offset=0, page_size=RESULT_PAGE_SIZE, chunk_size=DB_FETCH_CHUNK_ROWS):
+    """Async view of iter_sql_query(); each chunk is fetched in a worker thread"""
+    events = iter_sql_query(query, offset, page_size, chunk_size)
+    done = object()
+    try:
+        while True:
+            event = await asyncio.to_thread(next, events, done)
+            if event is done:
+                break
+            yield event
     finally:
-        if conn is not None:
-            conn.close()
-            logger.info("Database connection closed")
-            
-    return json.dumps(response, default=str)
\ No newline at end of file
+        # Releases the pooled connection if the consumer went away mid-stream
+        await asyncio.to_thread(events.close)
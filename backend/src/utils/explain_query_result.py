@@ -1,9 +1,16 @@
 import os
 import json
+import asyncio
 import re
+import hashlib
 from dotenv import load_dotenv
-from langchain_groq import ChatGroq
-from langchain.prompts import ChatPromptTemplate
+from src.utils.cache import LRUCache
+from src.utils.query_result import QueryResult
+from src.utils.serialization import dumps
+from src.utils.result_compaction import SUMMARY_TOKEN_BUDGET, compact_result
+from src.utils.llm_client import LLMClient
+from src.utils import metrics
+import time
 import logging
 
 # Configure logging
@@ -21,16 +28,42 @@ if not groq_api_key:
     logger.error("GROQ_API_KEY environment variable is not set")
     raise ValueError("GROQ_API_KEY environment variable is not set")
 
-# Initialize the LLM
-try:
-    llm = ChatGroq(
-        groq_api_key=groq_api_key,
-        model_name="llama-3.3-70b-versatile"
-    )
-    logger.info("LLM initialized successfully")
-except Exception as e:
-    logger.error(f"Failed to initialize LLM: {str(e)}")
-    raise
+SUMMARY_MODEL_NAME = "llama-3.3-70b-versatile"
+# Smaller, faster model summaries fall back to while the summary model is rate limited
+SUMMARY_FALLBACK_MODEL = os.getenv("SUMMARY_FALLBACK_MODEL", "llama-3.1-8b-instant")
+
+# Summary cache bounds
+SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", "1024"))
+SUMMARY_CACHE_MAX_BYTES = int(os.getenv("SUMMARY_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+SUMMARY_CACHE_TTL = float(os.getenv("SUMMARY_CACHE_TTL", "3600"))  # seconds
+
+# Results summarized per LLM call by the batch endpoint; they share the
+# SUMMARY_TOKEN_BUDGET, so a batched prompt is no larger than a single one
+SUMMARY_BATCH_SIZE = int(os.getenv("SUMMARY_BATCH_SIZE", "5"))
+
+# The LLM client (see llm_client.LLMClient) is created on first use (or by
+# warm_up()), so importing this module doesn't pay for langchain_groq; tests
+# and benches may assign llm directly
+llm = None
+
+
+def get_llm():
+    """The summary model's client, created on first use"""
+    global llm
+    if llm is None:
+        try:
+            llm = LLMClient(SUMMARY_MODEL_NAME, fallback_model=SUMMARY_FALLBACK_MODEL)
+            logger.info("LLM initialized successfully")
+        except Exception as e:
+            logger.error(f"Failed to initialize LLM: {str(e)}")
+            raise
+    return llm
+
+
+def warm_up():
+    """Build the summary client at startup instead of in the first request"""
+    get_llm()
+
 
 # Column mapping for data interpretation
 column_mapping = {
@@ -51,10 +84,11 @@ column_mapping = {
     "City Tier": "city_tier"
 }
 
-# Prompt template for data summarization
-data_summary_prompt = ChatPromptTemplate.from_template(
-    """
-You are an expert data analyst for a motorcycle sales database in India. Use the following column mapping to interpret results:
+# Prompt for data summarization. The instructions and column mapping never
+# change, so they are rendered once into a system message that leads every
+# request (identical prefixes let the provider cache the prompt); only the
+# result goes into the human message
+DATA_SUMMARY_SYSTEM_PROMPT = """You are an expert data analyst for a motorcycle sales database in India. Use the following column mapping to interpret results:
 {column_map}
 
 Given the result data from a SQL query and a brief explanation, produce a clean, plain-text summary that:
@@ -62,75 +96,236 @@ Given the result data from a SQL query and a brief explanation, produce a clean,
 - References the relevant column meanings
 - If there's an error message in the explanation, interpret what it means and provide troubleshooting advice
 - If the query returned no results, explain what that likely means in business terms
+- If the result data is a statistical digest (row_count, column_stats, sample_rows) rather than every row, base the summary on the statistics and treat the sample as illustrative
+
+Respond with only the summary text (no markdown fences).""".format(
+    column_map="\n".join(f"- {col} maps to '{key}'" for col, key in column_mapping.items())
+)
 
-Result Data (JSON):
+DATA_SUMMARY_TEMPLATE = """Result Data (JSON):
 {data}
 
 Brief Explanation:
 {explanation}
 
 SQL Query:
-{sql}
+{sql}"""
 
-Respond with only the summary text (no markdown fences).
-    """
+summary_system_message = ("system", DATA_SUMMARY_SYSTEM_PROMPT)
+
+BATCH_SUMMARY_INSTRUCTIONS = """Summarize each of the {count} query results below separately, following the instructions above for each one.
+Respond with only a JSON object mapping each result number to its summary text, like {{"1": "...", "2": "..."}}."""
+
+# Part of every summary cache key: editing the prompt, the column mapping or
+# the model invalidates previously cached summaries
+PROMPT_VERSION = hashlib.sha256(
+    json.dumps([DATA_SUMMARY_SYSTEM_PROMPT, DATA_SUMMARY_TEMPLATE, SUMMARY_MODEL_NAME]).encode("utf-8")
+).hexdigest()[:16]
+# Batched summaries get other instructions and a share of the token budget, so
+# they are cached apart: a later single summary of the same result never reuses one
+BATCH_PROMPT_VERSION = hashlib.sha256(
+    json.dumps([PROMPT_VERSION, BATCH_SUMMARY_INSTRUCTIONS, SUMMARY_TOKEN_BUDGET, SUMMARY_BATCH_SIZE]).encode("utf-8")
+).hexdigest()[:16]
+
+summary_cache = LRUCache(
+    max_entries=SUMMARY_CACHE_MAX_ENTRIES,
+    ttl=SUMMARY_CACHE_TTL,
+    max_bytes=SUMMARY_CACHE_MAX_BYTES,
+    sizeof=len,
 )
 
-def explain_query_response(json_input: str) -> str:
+
+def summary_cache_key(result: QueryResult, prompt_version=PROMPT_VERSION) -> str:
+    payload = dumps([result.sql or "", result.columns, result.rows, result.explanation, prompt_version])
+    return hashlib.sha256(payload).hexdigest()
+
+
+def build_summary_messages(result: QueryResult):
+    logger.info(f"Input data for explanation has {len(result.rows)} rows")
+    logger.info(f"Explanation: {result.explanation}")
+    
+    # Columnar JSON when it fits the token budget, otherwise statistics plus a sample
+    data = compact_result(result)
+    
+    # Static system message first, then this result
+    return [
+        summary_system_message,
+        ("human", DATA_SUMMARY_TEMPLATE.format(
+            data=data,
+            explanation=result.explanation,
+            sql=result.sql or ""
+        ))
+    ]
+
+
+def build_summary_output(result: QueryResult, llm_response: str) -> dict:
+    logger.info(f"LLM response received: {llm_response[:100]}...")  # Log first 100 chars
+    
+    # Clean up markdown (just in case)
+    llm_response = re.sub(r"^```[\s\S]*?\n", "", llm_response)
+    llm_response = re.sub(r"\n```$", "", llm_response)
+    
+    output = {
+        "data": result.records(),
+        "summary": llm_response,
+        "error": result.error or "error" in result.explanation.lower() or len(result.rows) == 0,
+        "total_count": result.total_count,
+        "next_page_token": result.next_page_token
+    }
+    logger.info("Query explanation completed successfully")
+    return output
+
+
+def build_summary_error(result: QueryResult, e: Exception) -> dict:
+    err_msg = str(e)
+    logger.error(f"Error in explain_query_response: {err_msg}", exc_info=True)
+    
+    # Handle token size error (413) from Groq
+    if "Request too large for model" in err_msg or "413" in err_msg:
+        logger.warning("Token limit exceeded; returning fallback summary")
+        return {
+            "data": result.records(),
+            "summary": None,
+            "error": True,
+            "total_count": result.total_count,
+            "next_page_token": result.next_page_token
+        }
+    
+    # General error fallback
+    return {
+        "data": [],
+        "summary": f"An error occurred while generating the explanation: {err_msg}",
+        "error": True
+    }
+
+
+async def aexplain_query_response(result: QueryResult) -> dict:
+    """Summary of a query result, from the cache or the LLM"""
     try:
         logger.info("Starting query explanation process")
-        parsed = json.loads(json_input)
-        data_obj = parsed.get("data", [])
-        explanation = parsed.get("explanation", "")
-        sql = parsed.get("sql", "")
-        
-        logger.info(f"Input data for explanation has {len(data_obj)} rows")
-        logger.info(f"Explanation: {explanation}")
-        
-        # Create a formatted column mapping string
-        map_lines = [f"- {col} maps to '{key}'" for col, key in column_mapping.items()]
-        column_map_str = "\n".join(map_lines)
-        
-        # Format the prompt with our data
-        formatted = data_summary_prompt.format_messages(
-            column_map=column_map_str,
-            data=json.dumps(data_obj, indent=4),
-            explanation=explanation,
-            sql=sql
-        )
+        cache_key = summary_cache_key(result)
+        llm_response = summary_cache.get(cache_key)
+        metrics.note("summary_cache", "miss" if llm_response is None else "hit")
+        if llm_response is not None:
+            logger.info("Summary cache hit")
+            return build_summary_output(result, llm_response)
+        formatted = build_summary_messages(result)
         
         logger.info("Calling LLM for explanation generation")
-        llm_response = llm.invoke(formatted).content.strip()
-        logger.info(f"LLM response received: {llm_response[:100]}...")  # Log first 100 chars
-        
-        # Clean up markdown (just in case)
-        llm_response = re.sub(r"^```[\s\S]*?\n", "", llm_response)
-        llm_response = re.sub(r"\n```$", "", llm_response)
-        
-        output = {
-            "data": data_obj,
-            "summary": llm_response,
-            "error": "error" in explanation.lower() or len(data_obj) == 0
-        }
-        logger.info("Query explanation completed successfully")
-        return json.dumps(output, indent=4)
+        client = get_llm()
+        started = time.perf_counter()
+        response = await client.ainvoke(formatted)
+        metrics.record_llm_call("summary", client, time.perf_counter() - started, response)
+        llm_response = response.content.strip()
+        summary_cache.set(cache_key, llm_response)
+        return build_summary_output(result, llm_response)
         
     except Exception as e:
-        err_msg = str(e)
-        logger.error(f"Error in explain_query_response: {err_msg}", exc_info=True)
-        
-        # Handle token size error (413) from Groq
-        if "Request too large for model" in err_msg or "413" in err_msg:
-            logger.warning("Token limit exceeded; returning fallback summary")
-            return json.dumps({
-                "data": parsed.get("data", []),
-                "summary": None,
-                "error": True
-            }, indent=4)
-        
-        # General error fallback
-        return json.dumps({
-            "data": [],
-            "summary": f"An error occurred while generating the explanation: {err_msg}",
-            "error": True
-        }, indent=4)
+        return build_summary_error(result, e)
+
+
+async def astream_query_explanation(result: QueryResult):
+    """
+    Yield the summary text as the LLM streams it. A cached summary is yielded
+    in one piece; the complete streamed text is cached once the stream ends.
+    """
+    cache_key = summary_cache_key(result)
+    cached = summary_cache.get(cache_key)
+    metrics.note("summary_cache", "miss" if cached is None else "hit")
+    if cached is not None:
+        logger.info("Summary cache hit")
+        yield cached
+        return
+    
+    formatted = build_summary_messages(result)
+    logger.info("Streaming LLM explanation")
+    parts = []
+    client = get_llm()
+    started = time.perf_counter()
+    usage_chunk = None
+    async for chunk in client.astream(formatted):
+        if getattr(chunk, "usage_metadata", None):
+            # Token usage arrives on the last chunk, when the provider reports it
+            usage_chunk = chunk
+        if chunk.content:
+            parts.append(chunk.content)
+            yield chunk.content
+    metrics.record_llm_call("summary", client, time.perf_counter() - started, usage_chunk)
+    summary_cache.set(cache_key, "".join(parts).strip())
+
+
+def build_batch_summary_messages(results):
+    """One prompt asking for a summary of each result, numbered from 1"""
+    # Never less than a small sample per result, however large the batch
+    token_budget = max(SUMMARY_TOKEN_BUDGET // len(results), 200)
+    parts = [BATCH_SUMMARY_INSTRUCTIONS.format(count=len(results))]
+    for number, result in enumerate(results, 1):
+        parts.append(f"### Result {number}\n" + DATA_SUMMARY_TEMPLATE.format(
+            data=compact_result(result, token_budget),
+            explanation=result.explanation,
+            sql=result.sql or ""
+        ))
+    return [summary_system_message, ("human", "\n\n".join(parts))]
+
+
+def parse_batch_summaries(llm_response, count):
+    """{result number: summary} from a batched response; numbers it skipped are missing"""
+    match = re.search(r"\{[\s\S]*\}", llm_response)
+    if match is None:
+        return {}
+    try:
+        parsed = json.loads(match.group(0))
+    except ValueError:
+        return {}
+    summaries = {}
+    for key, summary in parsed.items() if isinstance(parsed, dict) else ():
+        if str(key).strip().isdigit() and 1 <= int(key) <= count and isinstance(summary, str) and summary.strip():
+            summaries[int(key)] = summary.strip()
+    return summaries
+
+
+async def abatch_explain_query_responses(results, concurrency=4):
+    """
+    Summaries for many results, SUMMARY_BATCH_SIZE per LLM call.
+
+    Returns aexplain_query_response()-shaped dicts in the order of `results`.
+    Cached summaries, single or batched, are reused; results a batched answer
+    leaves out (or garbles) fall back to their own aexplain_query_response() call.
+    """
+    outputs = [None] * len(results)
+    pending = []
+    for index, result in enumerate(results):
+        cache_key = summary_cache_key(result, BATCH_PROMPT_VERSION)
+        cached = summary_cache.get(summary_cache_key(result)) or summary_cache.get(cache_key)
+        if cached is not None:
+            outputs[index] = build_summary_output(result, cached)
+        else:
+            pending.append((index, cache_key))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def summarize(batch):
+        async with semaphore:
+            if len(batch) == 1:
+                index, _ = batch[0]
+                outputs[index] = await aexplain_query_response(results[index])
+                return
+            summaries = {}
+            try:
+                client = get_llm()
+                started = time.perf_counter()
+                response = await client.ainvoke(build_batch_summary_messages([results[index] for index, _ in batch]))
+                metrics.record_llm_call("summary_batch", client, time.perf_counter() - started, response)
+                summaries = parse_batch_summaries(response.content, len(batch))
+            except Exception as e:
+                logger.warning(f"Batched summary failed, summarizing one by one: {str(e)}")
+            for number, (index, cache_key) in enumerate(batch, 1):
+                summary = summaries.get(number)
+                if summary is None:
+                    outputs[index] = await aexplain_query_response(results[index])
+                    continue
+                summary_cache.set(cache_key, summary)
+                outputs[index] = build_summary_output(results[index], summary)
+
+    batches = [pending[start:start + SUMMARY_BATCH_SIZE] for start in range(0, len(pending), max(1, SUMMARY_BATCH_SIZE))]
+    await asyncio.gather(*(summarize(batch) for batch in batches))
+    return outputs
@@ -1,22 +1,111 @@
 import os
-import json
+import asyncio
 from dotenv import load_dotenv
-from langchain_groq import ChatGroq
-from langchain.prompts import ChatPromptTemplate
+from src.utils.sql_cache import question_cache
+from src.utils.sql_validation import SQLValidationError, guard_sql, aguard_sql, prepare_sql
+from src.utils.template_sql import TEMPLATE_SQL, get_template_sql
+from src.utils.llm_client import LLMClient
+from src.utils import metrics
+import time
 import re
+import logging
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
 
 
 load_dotenv()
-groq_api_key = os.getenv("GROQ_API_KEY")
 
 
-llm = ChatGroq(
-    groq_api_key=groq_api_key,
-    model_name="deepseek-r1-distill-llama-70b",
-    temperature=0.0  # Set temperature to 0 for more deterministic outputs
+SQL_MODEL_NAME = "deepseek-r1-distill-llama-70b"
+# Model SQL generation falls back to while the SQL model is rate limited (empty: wait instead)
+SQL_FALLBACK_MODEL = os.getenv("SQL_FALLBACK_MODEL", "")
+
+# Chat clients (see llm_client.LLMClient) are created on first use (or by warm_up()),
+# so importing this module doesn't pay for langchain_groq; tests and benches may
+# assign llm directly
+llm = None
+fast_llm = None
+candidate_llms = None
+
+# "reasoning": always the reasoning model (SQL_MODEL_NAME), whose <think> block
+# is generated (and paid for) only to be thrown away. "fast" (opt-in): a
+# non-reasoning model writes the SQL, stopped after SQL_FAST_MAX_TOKENS, and
+# the reasoning model is only asked when that SQL fails validation
+SQL_GENERATION_MODE = os.getenv("SQL_GENERATION_MODE", "reasoning").lower()
+SQL_FAST_MODEL = os.getenv("SQL_FAST_MODEL", "llama-3.3-70b-versatile")
+SQL_FAST_MAX_TOKENS = int(os.getenv("SQL_FAST_MAX_TOKENS", "512"))
+
+# Speculative generation: with more than one candidate, this many generations
+# run concurrently and the first that passes validation wins
+SQL_CANDIDATES = int(os.getenv("SQL_CANDIDATES", "1"))
+# Comma-separated model:temperature pairs, used in order for the candidates
+SQL_CANDIDATE_MODELS = os.getenv(
+    "SQL_CANDIDATE_MODELS",
+    f"{SQL_MODEL_NAME}:0.0,llama-3.3-70b-versatile:0.0,{SQL_MODEL_NAME}:0.4"
 )
 
 
+def get_llm():
+    """The SQL model's client, created on first use"""
+    global llm
+    if llm is None:
+        llm = LLMClient(
+            SQL_MODEL_NAME,
+            fallback_model=SQL_FALLBACK_MODEL,
+            temperature=0.0  # Set temperature to 0 for more deterministic outputs
+        )
+    return llm
+
+
+def get_fast_llm():
+    """The fast SQL model's client, created on first use"""
+    global fast_llm
+    if fast_llm is None:
+        fast_llm = LLMClient(
+            SQL_FAST_MODEL,
+            temperature=0.0,
+            max_tokens=SQL_FAST_MAX_TOKENS,
+            # A closing code fence ends the statement; a ";" can't, it may sit in a string literal
+            stop=["\n```"]
+        )
+    return fast_llm
+
+
+def build_candidate_llms(specs, count):
+    """Clients for the first `count` model:temperature specs"""
+    clients = []
+    for spec in [spec.strip() for spec in specs.split(",") if spec.strip()][:count]:
+        model_name, _, temperature = spec.rpartition(":")
+        if not model_name:
+            model_name, temperature = temperature, "0"
+        if model_name == SQL_MODEL_NAME and float(temperature) == 0.0:
+            clients.append(get_llm())
+            continue
+        clients.append(LLMClient(model_name, temperature=float(temperature)))
+    return clients
+
+
+def get_candidate_llms():
+    """Clients for speculative generation (empty unless SQL_CANDIDATES > 1)"""
+    global candidate_llms
+    if candidate_llms is None:
+        candidate_llms = build_candidate_llms(SQL_CANDIDATE_MODELS, SQL_CANDIDATES) if SQL_CANDIDATES > 1 else []
+    return candidate_llms
+
+
+def warm_up():
+    """Create the clients ahead of the first request"""
+    get_llm()
+    if SQL_GENERATION_MODE == "fast":
+        get_fast_llm()
+    get_candidate_llms()
+
+
 # Sample data types and constraints for better schema understanding
 column_details = {
     "state": "TEXT - Indian state names",
@@ -61,100 +150,117 @@ SQL: SELECT CASE WHEN year_of_manufacture < 2020 THEN 'Before 2020' ELSE '2020 a
 """
 
 
-# Completely revamped prompt with extremely strict instructions
-prompt = ChatPromptTemplate.from_template(
-    """
-    You will generate ONLY a PostgreSQL SQL query based on the natural language question below.
-    
-    Table name: Motorcycle_sales
-    Columns: {column_details}
-    
-    EXTREMELY IMPORTANT INSTRUCTIONS:
-    1. Your ENTIRE response must be ONLY the SQL query - nothing else
-    2. Do NOT include any explanations before or after the query
-    3. Do NOT use <think> tags, internal monologue, or explain your reasoning AT ALL
-    4. Do NOT include markdown code blocks (```sql```)
-    5. Start your response with SELECT, WITH, or other SQL keyword
-    6. End your query with a semicolon
-    7. Include necessary WHERE, GROUP BY, HAVING, ORDER BY clauses as needed
-    8. Your response should be PURE SQL ONLY with no commentary
-    
-    Examples of correct responses:
-    {example_queries}
-    
-    Converting this question to SQL ONLY:
-    {input}
-    """
+# Completely revamped prompt with extremely strict instructions. Everything but
+# the question is static, so it is rendered once into a system message that
+# leads every request (identical prefixes let the provider cache the prompt)
+SQL_SYSTEM_PROMPT = """You will generate ONLY a PostgreSQL SQL query based on the natural language question from the user.
+
+Table name: Motorcycle_sales
+Columns:
+{column_details}
+
+EXTREMELY IMPORTANT INSTRUCTIONS:
+1. Your ENTIRE response must be ONLY the SQL query - nothing else
+2. Do NOT include any explanations before or after the query
+3. Do NOT use <think> tags, internal monologue, or explain your reasoning AT ALL
+4. Do NOT include markdown code blocks (```sql```)
+5. Start your response with SELECT, WITH, or other SQL keyword
+6. End your query with a semicolon
+7. Include necessary WHERE, GROUP BY, HAVING, ORDER BY clauses as needed
+8. Your response should be PURE SQL ONLY with no commentary
+
+Examples of correct responses:
+{example_queries}""".format(
+    column_details="\n".join(f"- {col}: {desc}" for col, desc in column_details.items()),
+    example_queries=example_queries.strip()
 )
 
+sql_system_message = ("system", SQL_SYSTEM_PROMPT)
+
+
+# Where a statement can start: SELECT, or WITH followed by a CTE definition
+# (so "with" in prose doesn't open one)
+_statement_start = re.compile(
+    r'\b(?:SELECT|WITH\s+(?:RECURSIVE\s+)?(?:\w+|"[^"]*")\s*(?:\([^)]*\)\s*)?AS\s*(?:NOT\s+)?(?:MATERIALIZED\s+)?\()',
+    re.IGNORECASE
+)
+# What can end a statement, skipping over literals and comments that may contain ";"
+_statement_body = re.compile(r"(?P<string>'(?:[^']|'')*')|(?P<quoted>\"(?:[^\"]|\"\")*\")|(?P<comment>--[^\n]*)|(?P<end>;)|(?P<fence>```)")
+# Text that may precede a statement on its line ("SQL: SELECT ...", "```sql")
+_line_prefix = re.compile(r'\s*(?:(?:final\s+)?(?:sql|query|answer)\s*:)?[\s`*>]*(?:sql)?\s*$', re.IGNORECASE)
+_think_tag = re.compile(r'</?think>', re.IGNORECASE)
+
+
+def _scan_for_sql(text, pos):
+    """One left-to-right pass over text[pos:] collecting candidate statements"""
+    complete = []
+    partial = []
+    while True:
+        match = _statement_start.search(text, pos)
+        if match is None:
+            break
+        start = match.start()
+        on_own_line = _line_prefix.match(text, text.rfind("\n", 0, start) + 1, start) is not None
+        pos = match.end()
+        while True:
+            token = _statement_body.search(text, pos)
+            if token is None:
+                # Ran off the end without a terminator; a later start may still
+                # be the real (unterminated) statement
+                partial.append((on_own_line, text[start:].strip()))
+                pos = match.end()
+                break
+            pos = token.end()
+            if token.lastgroup == "end":
+                complete.append((on_own_line, text[start:pos]))
+                break
+            if token.lastgroup == "fence":
+                # A fenced statement without a semicolon is still a whole statement
+                complete.append((on_own_line, text[start:token.start()].rstrip() + ";"))
+                break
+
+    # The last statement on its own line, else the last complete one, else
+    # the same for unterminated ones
+    for candidates in ([sql for own_line, sql in complete if own_line], [sql for _, sql in complete]):
+        if candidates:
+            return candidates[-1].strip()
+    for candidates in ([sql for own_line, sql in partial if own_line], [sql for _, sql in partial]):
+        if candidates:
+            return candidates[0] + ";"
+    return None
+
 
 def extract_sql_query(response_text):
     """
     Extract only the SQL query from the LLM response.
-    This function is significantly improved to handle cases where the LLM provides
-    thinking or explanations along with the SQL query.
+
+    Reasoning before the last </think> is skipped without being scanned, and
+    the rest is read once, left to right: statements start at SELECT (or a
+    WITH ... AS ( CTE) and end at the first semicolon outside a literal or
+    comment, or at a closing code fence. Prose around them is never touched.
+    The last statement that starts its own line wins, as the model puts its
+    final answer last.
     """
-    # First, try to remove any think tags and their content
-    clean_text = re.sub(r'<think>[\s\S]*?</think>', '', response_text, re.DOTALL)
-    
-    # Also look for incomplete think tags or other reasoning blocks
-    clean_text = re.sub(r'Alternatively,.*?\.', '', clean_text, re.DOTALL)
-    clean_text = re.sub(r'Yes, because.*?\.', '', clean_text, re.DOTALL)
-    clean_text = re.sub(r'So, the query should be.*?\.', '', clean_text, re.DOTALL)
-    
-    # Remove code block formatting
-    clean_text = re.sub(r'```sql|```', '', clean_text, re.IGNORECASE)
-    
-    # Find SQL query pattern - most SQL queries start with SELECT, WITH, etc.
-    # and typically end with a semicolon
-    sql_pattern = r'((?:SELECT|WITH|CREATE|INSERT|UPDATE|DELETE|ALTER)[\s\S]*?;)'
-    matches = re.findall(sql_pattern, clean_text, re.IGNORECASE)
-    
-    if matches:
-        # Return the last complete SQL statement
-        return matches[-1].strip()
-    
-    # If no complete SQL found, look for partial SQL
-    partial_sql_pattern = r'((?:SELECT|WITH)[\s\S]*)'
-    partial_matches = re.findall(partial_sql_pattern, clean_text, re.IGNORECASE)
-    
-    if partial_matches:
-        sql = partial_matches[-1].strip()
-        # Add semicolon if missing
-        if not sql.endswith(';'):
-            sql += ';'
-        return sql
-    
-    # Last resort: if the text contains SELECT or similar keywords, 
-    # try to extract everything from there to the end
-    for keyword in ['SELECT', 'WITH', 'CREATE', 'INSERT', 'UPDATE', 'DELETE', 'ALTER']:
-        if keyword in clean_text:
-            parts = clean_text.split(keyword, 1)
-            if len(parts) > 1:
-                sql = keyword + parts[1].strip()
-                if not sql.endswith(';'):
-                    sql += ';'
-                return sql
-    
+    end_of_thinking = response_text.rfind("</think>")
+    if end_of_thinking != -1:
+        sql_query = _scan_for_sql(response_text, end_of_thinking + len("</think>"))
+        if sql_query:
+            return sql_query
+    # No reasoning block, or the answer was only inside it
+    sql_query = _scan_for_sql(response_text, 0)
+    if sql_query:
+        return sql_query
+
     # If all else fails, just return the cleaned text
-    return clean_text.strip()
+    return _think_tag.sub("", response_text).strip()
 
 
-def generate_sql(user_input):
-    # Prepare column details string
-    column_detail_str = "\n".join([f"- {col}: {desc}" for col, desc in column_details.items()])
-    
-    # Format the prompt with all the details
-    formatted_prompt = prompt.format_messages(
-        column_details=column_detail_str,
-        example_queries=example_queries,
-        input=user_input
-    )
-    
-    # Call the LLM
-    response = llm.invoke(formatted_prompt)
-    raw_response = response.content.strip()
-    
+def format_sql_prompt(user_input):
+    # Only the question changes between requests
+    return [sql_system_message, ("human", f"Converting this question to SQL ONLY:\n{user_input}")]
+
+
+def finalize_sql_response(raw_response):
     # Debug prints should be commented out in production
     # print("Raw LLM Response:", raw_response)
     
@@ -168,51 +274,167 @@ def generate_sql(user_input):
     return sql_query
 
 
+async def agenerate_sql(user_input):
+    """SQL from the reasoning model, awaiting the LLM instead of blocking"""
+    formatted_prompt = format_sql_prompt(user_input)
+    client = get_llm()
+    started = time.perf_counter()
+    response = await client.ainvoke(formatted_prompt)
+    metrics.record_llm_call("sql", client, time.perf_counter() - started, response)
+    return finalize_sql_response(response.content.strip())
+
+
+def _fast_sql_from(response):
+    """SQL from the fast model's response, or None when max_tokens cut it off"""
+    if (getattr(response, "response_metadata", None) or {}).get("finish_reason") == "length":
+        logger.info("Fast SQL hit SQL_FAST_MAX_TOKENS")
+        return None
+    return post_process_sql_query(finalize_sql_response(response.content.strip()))
+
+
+async def agenerate_sql_fast(user_input):
+    client = get_fast_llm()
+    started = time.perf_counter()
+    response = await client.ainvoke(format_sql_prompt(user_input))
+    metrics.record_llm_call("sql_fast", client, time.perf_counter() - started, response)
+    return _fast_sql_from(response)
+
+
+def _accepted(mode, sql_query):
+    metrics.sql_generations.inc(mode=mode, outcome="accepted")
+    metrics.note("sql_mode", mode)
+    return sql_query
+
+
+def _rejected(mode, e):
+    metrics.sql_generations.inc(mode=mode, outcome="rejected")
+    logger.info(f"{mode.capitalize()} SQL failed validation: {str(e)}")
+
+
+def template_sql(user_input):
+    """
+    SQL for questions the template parser recognizes (see template_sql.py),
+    written in microseconds without a model; None sends the question on to
+    the cache and the LLM.
+    """
+    parser = get_template_sql() if TEMPLATE_SQL else None
+    if parser is None or not parser.ready:
+        return None
+    sql_query = parser.generate(user_input)
+    if sql_query is None:
+        return None
+    try:
+        sql_query = prepare_sql(sql_query)
+    except SQLValidationError as e:
+        _rejected("template", e)
+        return None
+    return _accepted("template", sql_query)
+
+
+async def agenerate_validated_sql(user_input):
+    """
+    Fresh SQL that passed aguard_sql(): from the fast model in fast mode,
+    from the reasoning model otherwise or when the fast SQL is rejected.
+    """
+    if SQL_GENERATION_MODE == "fast":
+        try:
+            sql_query = await agenerate_sql_fast(user_input)
+            if sql_query is None:
+                raise SQLValidationError("Fast SQL was cut off by the token limit")
+            with metrics.stage("sql_validation"):
+                sql_query, _ = await aguard_sql(sql_query)
+            return _accepted("fast", sql_query)
+        except SQLValidationError as e:
+            _rejected("fast", e)
+    sql_query = post_process_sql_query(await agenerate_sql(user_input))
+    try:
+        with metrics.stage("sql_validation"):
+            sql_query, _ = await aguard_sql(sql_query)
+    except SQLValidationError as e:
+        _rejected("reasoning", e)
+        raise
+    return _accepted("reasoning", sql_query)
+
+
+async def _generate_candidate(candidate_llm, formatted_prompt):
+    started = time.perf_counter()
+    response = await candidate_llm.ainvoke(formatted_prompt)
+    metrics.record_llm_call("sql_candidate", candidate_llm, time.perf_counter() - started, response)
+    sql_query, _ = await aguard_sql(post_process_sql_query(finalize_sql_response(response.content.strip())))
+    return sql_query
+
+
+async def agenerate_sql_speculative(user_input, llms=None):
+    """
+    Run one generation per candidate model concurrently and return the first
+    post-processed SQL that passes aguard_sql() (syntax, read-only, LIMIT, EXPLAIN).
+
+    The remaining generations are cancelled as soon as a winner is found.
+    Raises ValueError when no candidate produces valid SQL.
+    """
+    llms = llms or get_candidate_llms()
+    formatted_prompt = format_sql_prompt(user_input)
+    tasks = [asyncio.create_task(_generate_candidate(candidate_llm, formatted_prompt)) for candidate_llm in llms]
+    errors = []
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            try:
+                sql_query = await next_done
+            except SQLValidationError as e:
+                errors.append(str(e))
+                logger.info(f"Discarded invalid SQL candidate: {str(e)}")
+                continue
+            except Exception as e:
+                errors.append(str(e))
+                logger.warning(f"SQL candidate failed: {str(e)}")
+                continue
+            logger.info(f"Accepted SQL candidate after {len(errors)} rejected")
+            return sql_query
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    raise ValueError(f"No valid SQL from {len(tasks)} candidates: {'; '.join(errors)}")
+
+
 def post_process_sql_query(sql_query):
     """
-    Additional post-processing to clean up any remaining non-SQL content
+    Final clean-up of an extracted statement: stray think tags and whitespace.
+    extract_sql_query() already returns a single statement without prose.
     """
-    # Remove any obvious non-SQL content
-    non_sql_patterns = [
-        r'I should.*?\.', 
-        r'Finally,.*?\.', 
-        r'This query.*?\.', 
-        r'Let me.*?\.', 
-        r'Now.*?\.', 
-        r'Here\'s.*?:',
-        r'Alternatively,.*?\.',
-        r'Yes, because.*?\.',
-        r'So, the query should be.*?\.',
-        r'.*\n</think>\n',  # Handle incomplete think tags
-        r'</?think>'  # Remove any remaining think tags without content
-    ]
-    
-    clean_query = sql_query
-    for pattern in non_sql_patterns:
-        clean_query = re.sub(pattern, '', clean_query, flags=re.IGNORECASE | re.DOTALL)
-    
-    # If we have a semicolon in the middle, keep only up to the first semicolon
-    if ';' in clean_query:
-        parts = clean_query.split(';')
-        clean_query = parts[0] + ';'
-    
-    # Final cleanup of any whitespace issues
-    clean_query = clean_query.strip()
-    
-    return clean_query
+    return _think_tag.sub("", sql_query).strip()
 
 
-def generate_query(user_input):
-    sql_query = generate_sql(user_input)
-    
-    # Additional post-processing
-    sql_query = post_process_sql_query(sql_query)
-    
-    # Return the result
-    response_json = {
-        "detail": "Query generated successfully",
-        "sql_query": sql_query
-    }
-    return json.dumps(response_json, indent=4)
+def is_cacheable_sql(sql_query):
+    # Only remember answers that at least look like a read query
+    return re.match(r'\s*(SELECT|WITH)\b', sql_query, re.IGNORECASE) is not None
+
 
+async def agenerate_query(user_input):
+    """
+    Return validated SQL for a question, from the cache when possible.
 
+    Fresh SQL goes through aguard_sql() before it is cached or returned, so
+    cache hits are already validated; rejected SQL raises a ValueError.
+    Template SQL is cheaper to write again than to look up, so it is never cached.
+    """
+    sql_query = template_sql(user_input)
+    if sql_query is not None:
+        return sql_query
+    # The semantic tier embeds the question, which is CPU work best kept off the event loop
+    if question_cache.semantic_enabled:
+        sql_query = await asyncio.to_thread(question_cache.get, user_input)
+    else:
+        sql_query = question_cache.get(user_input)
+    metrics.note("sql_cache", "miss" if sql_query is None else "hit")
+    if sql_query is None:
+        if len(get_candidate_llms()) > 1:
+            sql_query = await agenerate_sql_speculative(user_input)
+        else:
+            sql_query = await agenerate_validated_sql(user_input)
+        if is_cacheable_sql(sql_query):
+            if question_cache.semantic_enabled:
+                await asyncio.to_thread(question_cache.put, user_input, sql_query)
+            else:
+                question_cache.put(user_input, sql_query)
+    return sql_query
@@ -1,18 +1,135 @@
-from deep_translator import GoogleTranslator
-from langdetect import detect
-import pycountry
+import os
+import re
+import asyncio
+from functools import lru_cache
 from pydantic import BaseModel
+from dotenv import load_dotenv
+from src.utils.cache import LRUCache
+import logging
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+TRANSLATION_CACHE_MAX_ENTRIES = int(os.getenv("TRANSLATION_CACHE_MAX_ENTRIES", "2048"))
+TRANSLATION_CACHE_TTL = float(os.getenv("TRANSLATION_CACHE_TTL", "86400"))  # seconds
+
+# Share of words that must be common English/domain words for ASCII input to skip detection
+ENGLISH_FAST_PATH_RATIO = 0.4
 
 class processed_text(BaseModel):
     translated: str
     language: str
-    
+
+
+# Function words plus the vocabulary of questions about this dataset
+english_words = {
+    "a", "an", "the", "of", "in", "on", "for", "to", "by", "with", "and", "or", "not", "from",
+    "is", "are", "was", "were", "be", "do", "does", "did", "have", "has", "can", "show", "list",
+    "what", "which", "who", "how", "many", "much", "where", "when", "me", "all", "each", "per",
+    "give", "find", "get", "tell", "compare", "between", "than", "more", "less", "most", "least",
+    "top", "highest", "lowest", "average", "avg", "mean", "total", "sum", "count", "number",
+    "maximum", "minimum", "max", "min", "price", "prices", "resale", "value", "mileage", "engine",
+    "capacity", "cc", "year", "years", "fuel", "type", "owner", "owners", "seller", "sellers",
+    "insurance", "status", "state", "states", "city", "tier", "brand", "brands", "model", "models",
+    "motorcycle", "motorcycles", "bike", "bikes", "sales", "sold", "distance", "daily", "km",
+    "registered", "registration", "manufactured", "manufacture", "after", "before", "above",
+    "below", "under", "over", "greater", "lower", "higher", "cheapest", "expensive", "group",
+    "grouped", "order", "ordered", "sorted", "sort", "percentage", "percent", "first", "second",
+    "third", "active", "expired", "electric", "petrol", "hybrid", "dealer", "individual",
+}
+
+_word_pattern = re.compile(r"[a-z]+")
+
+translation_cache = LRUCache(max_entries=TRANSLATION_CACHE_MAX_ENTRIES, ttl=TRANSLATION_CACHE_TTL)
+
+
+def is_obviously_english(text):
+    """Cheap check for plain-ASCII input made up largely of English words"""
+    if not text.isascii():
+        return False
+    words = _word_pattern.findall(text.lower())
+    if not words:
+        return False
+    return sum(word in english_words for word in words) / len(words) >= ENGLISH_FAST_PATH_RATIO
+
+
+# deep_translator, langdetect and pycountry are imported on first use, so
+# startup (and English questions, which take the fast path) never pay for them
+def detect(text):
+    from langdetect import detect as langdetect_detect
+
+    return langdetect_detect(text)
+
+
+@lru_cache(maxsize=256)
+def language_for_code(code):
+    import pycountry
+
+    # langdetect reports some languages with a region ("zh-cn")
+    return pycountry.languages.get(alpha_2=code.split("-")[0])
+
 
 def detect_language(text):
-    language=pycountry.languages.get(alpha_2=detect(text))
+    if is_obviously_english(text):
+        return language_for_code("en")
+    language=language_for_code(detect(text))
     return language    
-    
+
+
+def _translate(text, source, target):
+    key = (text, source, target)
+    translated = translation_cache.get(key)
+    if translated is None:
+        from deep_translator import GoogleTranslator
+
+        translated = GoogleTranslator(source=source, target=target).translate(text)
+        translation_cache.set(key, translated)
+    return translated
+
+
 def translate_language(text,language):
-    translated = GoogleTranslator(source=detect(text), target=language).translate(text)
-    language=pycountry.languages.get(alpha_2=detect(text))
-    return processed_text(translated=translated,language=language.name)
\ No newline at end of file
+    source = detect(text)
+    translated = _translate(text, source, language)
+    language=language_for_code(source)
+    return processed_text(translated=translated,language=language.name)
+
+
+def to_english(text):
+    """
+    Return the input as English, detecting its language at most once.
+
+    Obviously-English input skips detection entirely; everything else is
+    detected once and translated through a bounded (text, language) cache.
+    """
+    if is_obviously_english(text):
+        return processed_text(translated=text, language="English")
+    source = detect(text)
+    if source == "en":
+        return processed_text(translated=text, language="English")
+    language = language_for_code(source)
+    return processed_text(
+        translated=_translate(text, source, "english"),
+        language=language.name if language is not None else source
+    )
+
+
+async def ato_english(text):
+    """Async to_english(); the English fast path never leaves the event loop"""
+    if is_obviously_english(text):
+        return processed_text(translated=text, language="English")
+    return await asyncio.to_thread(to_english, text)
+
+
+def warm_up():
+    """Load langdetect's language profiles, which its first detect() call otherwise does"""
+    try:
+        detect("warm up")
+    except Exception as e:
+        logger.warning(f"Language detection warm-up failed: {str(e)}")
@@ -0,0 +1,392 @@
+import os
+import time
+import random
+import asyncio
+import threading
+import logging
+from dotenv import load_dotenv
+from src.utils.result_compaction import estimate_tokens
+from src.utils import metrics
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+groq_api_key = os.getenv("GROQ_API_KEY")
+# Another Groq-compatible endpoint, e.g. bench/stub_llm_server.py for load tests
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL") or None
+
+# Groq limits requests and tokens per minute per model and organization; set
+# these to your plan's limits. They apply to every model, LLM_RATE_LIMITS sets
+# them per model as "model=rpm/tpm,..." (unset or 0: unlimited)
+LLM_RPM = int(os.getenv("LLM_RPM", "0"))
+LLM_TPM = int(os.getenv("LLM_TPM", "0"))
+LLM_RATE_LIMITS = os.getenv("LLM_RATE_LIMITS", "")
+# Completion tokens reserved before a call, corrected once the response reports its usage
+LLM_COMPLETION_TOKEN_ESTIMATE = int(os.getenv("LLM_COMPLETION_TOKEN_ESTIMATE", "400"))
+
+# Retries of calls answered with 429, a 5xx or a connection error, with full-jitter
+# exponential backoff (a 429's retry-after pauses the model for everyone instead)
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))  # seconds
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "20"))  # seconds
+# Send a second, identical request when the first hasn't answered after this
+# many seconds and the model has capacity to spare (0 disables hedging)
+LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", "0"))
+# Calls go to the fallback model when the primary's limits would hold them longer than this
+LLM_FALLBACK_AFTER = float(os.getenv("LLM_FALLBACK_AFTER", "2"))
+# Calls fail with LLMCapacityError rather than wait longer than this for capacity
+LLM_MAX_WAIT = float(os.getenv("LLM_MAX_WAIT", "30"))
+
+
+class LLMCapacityError(RuntimeError):
+    """The model's rate limits would hold a call longer than LLM_MAX_WAIT"""
+
+
+class TokenBucket:
+    """
+    Capacity refilled continuously at `capacity` per `period` seconds.
+
+    reserve() always takes what it asks for and returns how long the caller
+    must wait for it, so callers are served in the order they reserved.
+    """
+
+    def __init__(self, capacity, period=60.0):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.level = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        self._refill(now)
+        # A single call larger than the bucket can never fit; let it through when the bucket is full
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def reserve(self, amount, now):
+        wait = self.wait_time(amount, now)
+        self.level -= min(amount, self.capacity)
+        return wait
+
+    def adjust(self, amount):
+        """Return (negative: take) capacity once the real cost of a call is known"""
+        self.level = min(self.capacity, self.level + amount)
+
+
+class ModelLimiter:
+    """Requests- and tokens-per-minute buckets of one model, plus a pause after a 429"""
+
+    def __init__(self, model, rpm, tpm):
+        self.model = model
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _buckets(self, tokens):
+        return [(bucket, amount) for bucket, amount in ((self.requests, 1), (self.tokens, tokens)) if bucket is not None]
+
+    def wait_time(self, tokens):
+        """Seconds a call of `tokens` would wait right now, without reserving anything"""
+        now = time.monotonic()
+        with self._lock:
+            return max([self.paused_until - now, 0.0] + [bucket.wait_time(amount, now) for bucket, amount in self._buckets(tokens)])
+
+    def reserve(self, tokens, max_wait=None):
+        """
+        Take capacity for a call of `tokens` and return how long to wait before
+        sending it; None, taking nothing, when that would be over `max_wait`
+        """
+        now = time.monotonic()
+        with self._lock:
+            buckets = self._buckets(tokens)
+            wait = max([self.paused_until - now, 0.0] + [bucket.wait_time(amount, now) for bucket, amount in buckets])
+            if max_wait is not None and wait > max_wait:
+                return None
+            for bucket, amount in buckets:
+                bucket.reserve(amount, now)
+            return wait
+
+    def try_reserve(self, tokens):
+        """Take capacity only if it is available without waiting"""
+        now = time.monotonic()
+        with self._lock:
+            if self.paused_until > now or any(bucket.wait_time(amount, now) > 0 for bucket, amount in self._buckets(tokens)):
+                return False
+            for bucket, amount in self._buckets(tokens):
+                bucket.reserve(amount, now)
+            return True
+
+    def settle(self, reserved, used):
+        if self.tokens is not None and used:
+            with self._lock:
+                self.tokens.adjust(reserved - used)
+
+    def release(self, reserved):
+        """Give back the tokens reserved for a call that failed or was cancelled"""
+        if self.tokens is not None:
+            with self._lock:
+                self.tokens.adjust(reserved)
+
+    def pause(self, seconds):
+        """Hold every call to this model for `seconds` (the provider's retry-after)"""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+def parse_rate_limits(spec):
+    """{model: (rpm, tpm)} from "model=rpm/tpm,..." """
+    limits = {}
+    for item in [item.strip() for item in spec.split(",") if item.strip()]:
+        model, _, values = item.partition("=")
+        rpm, _, tpm = values.partition("/")
+        limits[model.strip()] = (int(rpm or LLM_RPM), int(tpm or LLM_TPM))
+    return limits
+
+
+_rate_limits = parse_rate_limits(LLM_RATE_LIMITS)
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(model):
+    """The limiter shared by every client of `model` in this process"""
+    with _limiters_lock:
+        limiter = _limiters.get(model)
+        if limiter is None:
+            rpm, tpm = _rate_limits.get(model, (LLM_RPM, LLM_TPM))
+            limiter = _limiters[model] = ModelLimiter(model, rpm, tpm)
+        return limiter
+
+
+def limiter_stats():
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    stats = {}
+    for limiter in limiters:
+        # wait_time() refills the buckets up to now
+        limiter.wait_time(0)
+        stats[limiter.model] = {
+            "requests_available": round(limiter.requests.level, 1) if limiter.requests else None,
+            "tokens_available": round(limiter.tokens.level) if limiter.tokens else None,
+            "paused_for": round(max(0.0, limiter.paused_until - time.monotonic()), 2),
+        }
+    return stats
+
+
+def estimate_prompt_tokens(messages):
+    text = "".join(message[1] if isinstance(message, tuple) else str(message.content) for message in messages)
+    return estimate_tokens(text)
+
+
+def _status_code(error):
+    return getattr(error, "status_code", None)
+
+
+def is_retryable(error):
+    """429s, 5xx responses, timeouts and connection failures are worth another try"""
+    status = _status_code(error)
+    if status is not None:
+        return status == 429 or status >= 500
+    # groq.APITimeoutError is an APIConnectionError
+    return isinstance(error, (ConnectionError, TimeoutError)) or type(error).__name__ == "APIConnectionError"
+
+
+def retry_after(error):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt):
+    """Full jitter: anywhere up to the exponential step, so retries don't arrive together"""
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+
+
+class LLMClient:
+    """
+    A chat model behind the shared per-model rate limits, with retries on
+    provider errors, optional hedging of slow calls and a fallback model.
+
+    Calls wait for the model's requests/tokens-per-minute capacity before
+    they are sent, or go to `fallback_model` when the primary would hold
+    them longer than LLM_FALLBACK_AFTER (a 429 pauses the primary for its
+    retry-after, which usually makes that the case). A call that would wait
+    longer than LLM_MAX_WAIT raises LLMCapacityError instead. Offers invoke(),
+    ainvoke() and astream() like the LangChain models it wraps, so call
+    sites and metrics treat it as one.
+    """
+
+    def __init__(self, model_name, fallback_model=None, **options):
+        self.model_name = model_name
+        self.fallback_model = fallback_model or None
+        self.options = options
+        self._models = {}
+        self._lock = threading.Lock()
+        # The primary is created up front so warm-up pays for the langchain_groq import
+        self.chat_model(model_name)
+
+    def chat_model(self, model):
+        with self._lock:
+            chat_model = self._models.get(model)
+            if chat_model is None:
+                from langchain_groq import ChatGroq
+
+                chat_model = self._models[model] = ChatGroq(
+                    groq_api_key=groq_api_key,
+                    model_name=model,
+                    base_url=GROQ_BASE_URL,
+                    # Retries happen here, where they respect the shared limits
+                    max_retries=0,
+                    **self.options
+                )
+            return chat_model
+
+    def _pick_model(self, tokens):
+        if self.fallback_model is None or limiter_for(self.model_name).wait_time(tokens) <= LLM_FALLBACK_AFTER:
+            return self.model_name
+        if limiter_for(self.fallback_model).wait_time(tokens) >= limiter_for(self.model_name).wait_time(tokens):
+            return self.model_name
+        metrics.llm_fallbacks.inc(model=self.fallback_model)
+        logger.info(f"{self.model_name} is saturated, using {self.fallback_model}")
+        return self.fallback_model
+
+    def _reserve(self, messages):
+        tokens = estimate_prompt_tokens(messages) + LLM_COMPLETION_TOKEN_ESTIMATE
+        model = self._pick_model(tokens)
+        limiter = limiter_for(model)
+        wait = limiter.reserve(tokens, LLM_MAX_WAIT)
+        if wait is None:
+            logger.warning(f"{model} would hold a call longer than LLM_MAX_WAIT ({LLM_MAX_WAIT:g}s)")
+            raise LLMCapacityError(f"{model} is at its rate limit for longer than {LLM_MAX_WAIT:g}s, try again later")
+        return model, limiter, tokens, wait
+
+    def _after_error(self, error, model, limiter, attempt):
+        """Seconds to sleep before retrying `error`, or re-raise it"""
+        if attempt >= LLM_MAX_RETRIES or not is_retryable(error):
+            raise error
+        status = _status_code(error)
+        metrics.llm_retries.inc(model=model, reason=str(status) if status else type(error).__name__)
+        wait = retry_after(error) if status == 429 else None
+        if wait is not None:
+            # Everyone waits for the provider's window, not just this call
+            limiter.pause(wait)
+            logger.warning(f"{model} rate limited for {wait:.1f}s (attempt {attempt + 1})")
+            return 0.0
+        delay = backoff_delay(attempt)
+        logger.warning(f"{model} call failed ({str(error)}), retrying in {delay:.2f}s (attempt {attempt + 1})")
+        return delay
+
+    @staticmethod
+    def _settle(limiter, tokens, response):
+        prompt_tokens, completion_tokens = metrics.token_usage(response) if response is not None else (0, 0)
+        limiter.settle(tokens, prompt_tokens + completion_tokens)
+
+    def invoke(self, messages, **kwargs):
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            model, limiter, tokens, wait = self._reserve(messages)
+            metrics.llm_limiter_wait_seconds.observe(wait, model=model)
+            try:
+                if wait:
+                    time.sleep(wait)
+                response = self.chat_model(model).invoke(messages, **kwargs)
+            except BaseException as e:
+                limiter.release(tokens)
+                if not isinstance(e, Exception):
+                    raise
+                time.sleep(self._after_error(e, model, limiter, attempt))
+                continue
+            self._settle(limiter, tokens, response)
+            return response
+
+    async def _hedged(self, model, limiter, tokens, messages, kwargs):
+        chat_model = self.chat_model(model)
+        if not LLM_HEDGE_AFTER:
+            return await chat_model.ainvoke(messages, **kwargs)
+        first = asyncio.create_task(chat_model.ainvoke(messages, **kwargs))
+        tasks = [first]
+        pending = {first}
+        hedged = False
+        try:
+            done, _ = await asyncio.wait(pending, timeout=LLM_HEDGE_AFTER)
+            # Hedge only with spare capacity, so hedging never causes a 429
+            hedged = not done and limiter.try_reserve(tokens)
+            if hedged:
+                tasks.append(asyncio.create_task(chat_model.ainvoke(messages, **kwargs)))
+                pending.add(tasks[-1])
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if hedged:
+                            metrics.llm_hedges.inc(model=model, winner="first" if task is first else "hedge")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+            # Collects the losers' cancellations and errors, so none goes unretrieved
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if hedged:
+                # The caller settles one reservation with the winner's usage; this returns the other
+                limiter.release(tokens)
+
+    async def ainvoke(self, messages, **kwargs):
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            model, limiter, tokens, wait = self._reserve(messages)
+            metrics.llm_limiter_wait_seconds.observe(wait, model=model)
+            try:
+                if wait:
+                    await asyncio.sleep(wait)
+                response = await self._hedged(model, limiter, tokens, messages, kwargs)
+            except BaseException as e:
+                # Cancelled calls (a speculative loser, a client gone) give their tokens back too
+                limiter.release(tokens)
+                if not isinstance(e, Exception):
+                    raise
+                await asyncio.sleep(self._after_error(e, model, limiter, attempt))
+                continue
+            self._settle(limiter, tokens, response)
+            return response
+
+    async def astream(self, messages, **kwargs):
+        """Stream chunks; a failure is retried only until the first chunk has been yielded"""
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            model, limiter, tokens, wait = self._reserve(messages)
+            metrics.llm_limiter_wait_seconds.observe(wait, model=model)
+            started = False
+            usage_chunk = None
+            try:
+                if wait:
+                    await asyncio.sleep(wait)
+                async for chunk in self.chat_model(model).astream(messages, **kwargs):
+                    started = True
+                    if getattr(chunk, "usage_metadata", None):
+                        usage_chunk = chunk
+                    yield chunk
+            except BaseException as e:
+                if started:
+                    # Tokens were spent: settle with the reported usage, else keep the estimate
+                    self._settle(limiter, tokens, usage_chunk)
+                    raise
+                limiter.release(tokens)
+                if not isinstance(e, Exception):
+                    raise
+                await asyncio.sleep(self._after_error(e, model, limiter, attempt))
+                continue
+            self._settle(limiter, tokens, usage_chunk)
+            return
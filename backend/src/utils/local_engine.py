@@ -0,0 +1,429 @@
+import os
+import re
+import tempfile
+import threading
+import time
+from dotenv import load_dotenv
+from src.utils.db_pool import get_pool
+from src.utils.dataset_version import current_dataset_version, get_version_watcher, read_dataset_delta, read_dataset_version
+from src.utils.sql_text import tokenize_sql
+import logging
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# Optional embedded copy of motorcycle_sales (needs the duckdb package)
+LOCAL_ENGINE = os.getenv("LOCAL_ENGINE", "false").lower() in ("1", "true", "yes")
+# "postgres" snapshots the live table; anything else is a path to the source CSV
+LOCAL_ENGINE_SOURCE = os.getenv("LOCAL_ENGINE_SOURCE", "postgres")
+LOCAL_ENGINE_THREADS = int(os.getenv("LOCAL_ENGINE_THREADS", "4"))
+
+LOCAL_TABLE = "motorcycle_sales"
+# Rows per INSERT when applying appended rows
+DELTA_INSERT_ROWS = 500
+
+# CSV header -> table column, as in backend/data/postgresql.py
+csv_columns = {
+    "State": "state",
+    "Avg Daily Distance (km)": "avg_daily_distance_km",
+    "Brand": "brand",
+    "Model": "model",
+    "Price (INR)": "price_inr",
+    "Year of Manufacture": "year_of_manufacture",
+    "Engine Capacity (cc)": "engine_capacity_cc",
+    "Fuel Type": "fuel_type",
+    "Mileage (km/l)": "mileage_kmpl",
+    "Owner Type": "owner_type",
+    "Registration Year": "registration_year",
+    "Insurance Status": "insurance_status",
+    "Seller Type": "seller_type",
+    "Resale Price (INR)": "resale_price_inr",
+    "City Tier": "city_tier"
+}
+
+# Same types as the PostgreSQL table
+column_types = {
+    "state": "TEXT",
+    "avg_daily_distance_km": "DOUBLE",
+    "brand": "TEXT",
+    "model": "TEXT",
+    "price_inr": "BIGINT",
+    "year_of_manufacture": "BIGINT",
+    "engine_capacity_cc": "BIGINT",
+    "fuel_type": "TEXT",
+    "mileage_kmpl": "DOUBLE",
+    "owner_type": "TEXT",
+    "registration_year": "BIGINT",
+    "insurance_status": "TEXT",
+    "seller_type": "TEXT",
+    "resale_price_inr": "DOUBLE",
+    "city_tier": "TEXT"
+}
+
+# Settings that make DuckDB evaluate PostgreSQL-flavoured SQL the way PostgreSQL does
+# (GLOBAL, so the per-query cursors inherit them)
+_postgres_settings = (
+    "SET GLOBAL integer_division = true",
+    "SET GLOBAL default_null_order = 'nulls_last_on_asc_first_on_desc'",
+)
+
+# Anything that could write, load code or change settings goes to PostgreSQL instead
+_blocked_words = {
+    "insert", "update", "delete", "merge", "create", "drop", "alter", "truncate", "copy",
+    "attach", "detach", "install", "load", "pragma", "set", "reset", "call", "export",
+    "import", "checkpoint", "vacuum", "grant", "revoke", "lock",
+}
+_statement_start = re.compile(r'^\s*\(*\s*(SELECT|WITH)\b', re.IGNORECASE)
+_function_column = re.compile(r'^(\w+)\(')
+
+text_columns = {name for name, kind in column_types.items() if kind == "TEXT"}
+# Words that end an ORDER BY clause
+_order_end_words = {"limit", "offset", "fetch", "union", "intersect", "except", "for", "rows", "range", "groups"}
+
+
+def postgres_column_name(name):
+    """Name PostgreSQL would give an unaliased column: "avg(price_inr)" -> "avg" """
+    match = _function_column.match(name)
+    if match is None:
+        return name
+    function = match.group(1).lower()
+    return "count" if function == "count_star" else function
+
+
+def is_local_query(query):
+    """True for a single read-only SELECT/WITH statement the embedded engine may run"""
+    if not _statement_start.match(query):
+        return False
+    tokens = tokenize_sql(query)
+    while tokens and tokens[-1] == ("operator", ";"):
+        tokens.pop()
+    for kind, text in tokens:
+        if kind == "operator" and text == ";":
+            return False
+        if kind == "word" and text.lower() in _blocked_words:
+            return False
+    return True
+
+
+def _order_terms(tokens):
+    """The terms of every ORDER BY clause (including window ones), each as a token list"""
+    terms = []
+    for index in range(len(tokens) - 1):
+        if tokens[index][0] != "word" or tokens[index][1].lower() != "order" or tokens[index + 1][1].lower() != "by":
+            continue
+        term, depth = [], 0
+        for kind, text in tokens[index + 2:]:
+            if kind == "operator" and text == "(":
+                depth += 1
+            elif kind == "operator" and text == ")":
+                depth -= 1
+                if depth < 0:
+                    break
+            elif depth == 0 and ((kind == "operator" and text in (",", ";")) or (kind == "word" and text.lower() in _order_end_words)):
+                terms.append(term)
+                term = []
+                if text != ",":
+                    break
+                continue
+            term.append((kind, text))
+        if term:
+            terms.append(term)
+    return terms
+
+
+def orders_by_text(query, description):
+    """
+    True when the query sorts on a text value. DuckDB compares text by code
+    point and PostgreSQL by its collation, so those orders (and any LIMIT
+    after them) can differ; `description` resolves output aliases and positions.
+    """
+    output_types = [(desc[0].lower(), str(desc[1]).upper()) for desc in description or []]
+    for term in _order_terms(tokenize_sql(query)):
+        words = [text[1:-1] if kind == "quoted_ident" else text.lower() for kind, text in term if kind in ("word", "quoted_ident")]
+        if any(word in text_columns for word in words):
+            return True
+        if len(term) == 1 and term[0][0] == "number" and term[0][1].isdigit():
+            position = int(term[0][1]) - 1
+            if 0 <= position < len(output_types) and output_types[position][1] == "VARCHAR":
+                return True
+        for word in words:
+            if any(name == word and kind == "VARCHAR" for name, kind in output_types):
+                return True
+    return False
+
+
+class LocalEngine:
+    """
+    In-memory DuckDB copy of motorcycle_sales for answering read-only SQL
+    without a network round trip.
+
+    The snapshot is tagged with the data version it was loaded at; queries are
+    only routed here while that matches the current version, and a reload
+    notification rebuilds the snapshot in the background. A CSV snapshot is
+    tagged with the version current when it was read and can only catch up by
+    appended rows; after any other change it stops answering. Anything DuckDB
+    rejects (unknown tables, unsupported syntax), and queries ordered by text,
+    are left to PostgreSQL.
+    """
+
+    def __init__(self, source=LOCAL_ENGINE_SOURCE, threads=LOCAL_ENGINE_THREADS):
+        self.source = source
+        self.threads = threads
+        self._db = None
+        self._version = None
+        self._lock = threading.Lock()
+        self._loading = False
+        self.rows = 0
+        self.load_seconds = 0.0
+        self.loads = 0
+        self.deltas = 0
+        self.queries = 0
+        self.fallbacks = 0
+        self._listeners = []
+
+    @property
+    def version(self):
+        """Data version of the current snapshot (None for a CSV snapshot read without a database)"""
+        return self._version
+
+    @property
+    def loaded(self):
+        return self._db is not None
+
+    def add_listener(self, callback):
+        """
+        Register callback(engine, delta), called from the load thread after every
+        successful change: delta is None after a full (re)load, or the
+        read_dataset_delta() rows that were just appended.
+        """
+        self._listeners.append(callback)
+
+    def _snapshot_csv(self, path):
+        """COPY the PostgreSQL table into a CSV file; returns the data version it reflects"""
+        with get_pool().connection() as conn:
+            cursor = conn.cursor()
+            try:
+                # One REPEATABLE READ snapshot for the version and the rows
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ;")
+                version = read_dataset_version(conn)
+                with open(path, "w", encoding="utf-8", newline="") as f:
+                    cursor.copy_expert(f"COPY {LOCAL_TABLE} TO STDOUT WITH (FORMAT csv, HEADER true)", f)
+            finally:
+                cursor.close()
+                conn.rollback()
+        return version
+
+    def _build(self):
+        import duckdb
+
+        started = time.perf_counter()
+        db = duckdb.connect(":memory:", config={"threads": self.threads})
+        columns = ", ".join(f"{name} {kind}" for name, kind in column_types.items())
+        db.execute(f"CREATE TABLE {LOCAL_TABLE} ({columns});")
+        if self.source == "postgres":
+            fd, path = tempfile.mkstemp(suffix=".csv")
+            os.close(fd)
+            try:
+                version = self._snapshot_csv(path)
+                db.execute(f"INSERT INTO {LOCAL_TABLE} SELECT * FROM read_csv(?, header = true, columns = {column_types!r});", [path])
+            finally:
+                os.remove(path)
+        else:
+            try:
+                # The CSV is assumed to be what the database held when it was read
+                version = current_dataset_version()
+            except Exception as e:
+                logger.warning(f"Local engine could not read the data version, serving the CSV untagged: {str(e)}")
+                version = None
+            select = ", ".join(f'"{header}"::{column_types[name]} AS {name}' for header, name in csv_columns.items())
+            db.execute(f"INSERT INTO {LOCAL_TABLE} SELECT {select} FROM read_csv(?, header = true, all_varchar = true);", [self.source])
+        rows = db.execute(f"SELECT COUNT(*) FROM {LOCAL_TABLE};").fetchone()[0]
+
+        for setting in _postgres_settings:
+            db.execute(setting)
+        # Generated SQL must not reach the file system or change these settings
+        db.execute("SET enable_external_access = false;")
+        db.execute("SET lock_configuration = true;")
+        return db, version, rows, time.perf_counter() - started
+
+    def _begin_change(self):
+        with self._lock:
+            if self._loading:
+                return False
+            self._loading = True
+            return True
+
+    def _end_change(self):
+        with self._lock:
+            self._loading = False
+
+    def _notify(self, delta):
+        for callback in self._listeners:
+            try:
+                callback(self, delta)
+            except Exception as e:
+                logger.error(f"Local engine listener failed: {str(e)}", exc_info=True)
+
+    def load(self):
+        """(Re)build the snapshot; queries keep using the old one until it is ready"""
+        if not self._begin_change():
+            return
+        try:
+            db, version, rows, seconds = self._build()
+            with self._lock:
+                self._db, self._version = db, version
+                self.rows, self.load_seconds = rows, seconds
+                self.loads += 1
+            logger.info(f"Local engine loaded {rows} rows (data version {version}) in {seconds * 1000:.0f} ms")
+        except Exception as e:
+            logger.error(f"Local engine load failed, queries use PostgreSQL: {str(e)}")
+            return
+        finally:
+            self._end_change()
+        self._notify(None)
+
+    def apply_delta(self, delta):
+        """Insert appended rows into the snapshot; False if it isn't at the delta's base version"""
+        if not self._begin_change():
+            return False
+        try:
+            if self._db is None or self._version != delta["from_version"]:
+                return False
+            started = time.perf_counter()
+            columns, rows = delta["columns"], delta["rows"]
+            row_placeholder = "(" + ", ".join("?" for _ in columns) + ")"
+            cursor = self._db.cursor()
+            try:
+                # One transaction, so concurrent queries see all of the rows or none
+                cursor.execute("BEGIN TRANSACTION;")
+                for start in range(0, len(rows), DELTA_INSERT_ROWS):
+                    batch = rows[start:start + DELTA_INSERT_ROWS]
+                    cursor.execute(
+                        f"INSERT INTO {LOCAL_TABLE} ({', '.join(columns)}) VALUES {', '.join(row_placeholder for _ in batch)};",
+                        [value for row in batch for value in row]
+                    )
+                cursor.execute("COMMIT;")
+            except Exception:
+                cursor.execute("ROLLBACK;")
+                raise
+            finally:
+                cursor.close()
+            with self._lock:
+                self._version = delta["to_version"]
+                self.rows += len(rows)
+                self.deltas += 1
+            logger.info(f"Local engine appended {len(rows)} rows (data version {delta['to_version']}) in {(time.perf_counter() - started) * 1000:.0f} ms")
+        except Exception as e:
+            logger.error(f"Local engine append failed: {str(e)}")
+            return False
+        finally:
+            self._end_change()
+        self._notify(delta)
+        return True
+
+    def on_version_change(self, old_version, new_version):
+        """Version watcher listener: apply appended rows in place, otherwise reload"""
+        threading.Thread(target=self._catch_up, args=(old_version, new_version), name="local-engine-load", daemon=True).start()
+
+    def _catch_up(self, old_version, new_version):
+        delta = None
+        if self._version == old_version:
+            try:
+                delta = read_dataset_delta(old_version, new_version)
+            except Exception as e:
+                logger.warning(f"Could not read appended rows, reloading: {str(e)}")
+        if delta is None or not self.apply_delta(delta):
+            if self.source != "postgres":
+                # Reloading the CSV would not bring the change in
+                logger.warning(f"Local engine CSV snapshot is behind data version {new_version}, queries use PostgreSQL")
+                return
+            self.load()
+
+    def reload_in_background(self):
+        threading.Thread(target=self.load, name="local-engine-load", daemon=True).start()
+
+    def ready_for(self, data_version):
+        """True when the snapshot reflects data_version"""
+        if self._db is None:
+            return False
+        if self.source != "postgres":
+            # Untagged CSV snapshots only serve while there is no database version to compare with
+            return self._version == data_version
+        if data_version is not None and self._version is not None and self._version < data_version:
+            # Missed a reload notification; catch up for the next query
+            self.reload_in_background()
+        return data_version is not None and self._version == data_version
+
+    def execute(self, query, limit):
+        """
+        Run a read-only query; returns (columns, rows) with at most `limit` rows,
+        or None if it should go to PostgreSQL instead.
+        """
+        db = self._db
+        if db is None or not is_local_query(query):
+            return None
+        try:
+            # A cursor per call: DuckDB connections are not shared across threads
+            cursor = db.cursor()
+            try:
+                cursor.execute(query)
+                if orders_by_text(query, cursor.description):
+                    self.fallbacks += 1
+                    logger.info("Local engine orders text differently from PostgreSQL, using PostgreSQL")
+                    return None
+                columns = [postgres_column_name(desc[0]) for desc in cursor.description or []]
+                rows = cursor.fetchmany(limit) if columns else []
+            finally:
+                cursor.close()
+        except Exception as e:
+            self.fallbacks += 1
+            logger.info(f"Local engine could not run query, using PostgreSQL: {str(e).splitlines()[0]}")
+            return None
+        self.queries += 1
+        return columns, rows
+
+    def stats(self):
+        return {
+            "enabled": True,
+            "source": self.source,
+            "ready": self._db is not None,
+            "data_version": self._version,
+            "rows": self.rows,
+            "load_ms": round(self.load_seconds * 1000, 1),
+            "loads": self.loads,
+            "deltas": self.deltas,
+            "queries": self.queries,
+            "fallbacks": self.fallbacks,
+        }
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_local_engine():
+    """Return the process-wide embedded engine, or None when LOCAL_ENGINE is off"""
+    global _engine
+    if not LOCAL_ENGINE:
+        return None
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = LocalEngine()
+                # CSV snapshots follow appended rows too
+                get_version_watcher().add_listener(engine.on_version_change)
+                engine.reload_in_background()
+                _engine = engine
+    return _engine
+
+
+def local_engine_stats():
+    engine = get_local_engine()
+    return engine.stats() if engine is not None else {"enabled": False}
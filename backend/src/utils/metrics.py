@@ -0,0 +1,288 @@
+import json
+import asyncio
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+import logging
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = "insightgenei"
+
+# Seconds; LLM stages take seconds, cache and cube answers well under a millisecond
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+ROW_BUCKETS = (0, 1, 10, 100, 500, 1000, 5000, 10000)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with a fixed set of label names"""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = f"{METRIC_PREFIX}_{name}"
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        """Sum over the samples matching the given labels"""
+        wanted = {self.labels.index(name): str(value) for name, value in labels.items()}
+        with self._lock:
+            return sum(v for key, v in self._values.items() if all(key[i] == value for i, value in wanted.items()))
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, _label_text(self.labels, key), value) for key, value in sorted(self._values.items())]
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus exposition layout"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = f"{METRIC_PREFIX}_{name}"
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._lock = threading.Lock()
+        self._values = {}  # label values -> [bucket counts, sum, count]
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][index] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        lines = []
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append((f"{self.name}_bucket", _label_text(self.labels, key, [("le", _number(bound))]), cumulative))
+                lines.append((f"{self.name}_sum", _label_text(self.labels, key), total))
+                lines.append((f"{self.name}_count", _label_text(self.labels, key), count))
+        return lines
+
+
+request_seconds = Histogram("request_seconds", "End-to-end pipeline latency", ("kind", "outcome"))
+stage_seconds = Histogram("stage_seconds", "Latency of each pipeline stage", ("stage",))
+llm_call_seconds = Histogram("llm_call_seconds", "Latency of LLM calls", ("purpose", "model"))
+llm_tokens = Counter("llm_tokens_total", "Tokens reported by the LLM provider", ("purpose", "model", "type"))
+query_rows = Histogram("query_rows", "Rows returned on the first page of a result", (), ROW_BUCKETS)
+query_source = Counter("query_source_total", "Where SQL results came from", ("source",))
+llm_limiter_wait_seconds = Histogram("llm_limiter_wait_seconds", "Time LLM calls waited for rate limit capacity", ("model",))
+llm_retries = Counter("llm_retries_total", "LLM calls retried after a provider error", ("model", "reason"))
+llm_hedges = Counter("llm_hedges_total", "Second requests sent for slow LLM calls, by which one answered", ("model", "winner"))
+llm_fallbacks = Counter("llm_fallbacks_total", "LLM calls sent to the fallback model", ("model",))
+sql_generations = Counter("sql_generations_total", "Generated SQL by generation mode and validation outcome", ("mode", "outcome"))
+
+_metrics = [
+    request_seconds, stage_seconds, llm_call_seconds, llm_tokens, query_rows, query_source,
+    llm_limiter_wait_seconds, llm_retries, llm_hedges, llm_fallbacks, sql_generations,
+]
+# Callables returning (name, kind, help, {label: value}, value) samples read at scrape time
+_collectors = []
+
+
+def add_collector(collector):
+    """Register a callable whose samples are read on every scrape (for stats kept elsewhere)"""
+    _collectors.append(collector)
+
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in _metrics:
+        lines.append(f"# HELP {metric.name} {metric.help_text}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(f"{name}{labels} {_number(value)}" for name, labels, value in metric.samples())
+    # Samples of one metric have to be contiguous, whatever order collectors yield them in
+    families = {}
+    for collector in _collectors:
+        try:
+            samples = list(collector())
+        except Exception as e:
+            logger.warning(f"Metrics collector failed: {str(e)}")
+            continue
+        for name, kind, help_text, labels, value in samples:
+            family = families.setdefault(f"{METRIC_PREFIX}_{name}", (kind, help_text, []))
+            family[2].append(f"{METRIC_PREFIX}_{name}{_label_text(labels.keys(), labels.values())} {_number(value)}")
+    for name, (kind, help_text, sample_lines) in families.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(sample_lines)
+    return "\n".join(lines) + "\n"
+
+
+class RequestTrace:
+    """Stage timings, token counts, rows and cache outcomes of one request"""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.started = time.perf_counter()
+        self.outcome = "ok"
+        self.spans = {}
+        self.tokens = {"prompt": 0, "completion": 0}
+        self.rows = None
+        self.notes = {}
+        self._lock = threading.Lock()
+
+    def add_span(self, stage, seconds):
+        with self._lock:
+            self.spans[stage] = self.spans.get(stage, 0.0) + seconds
+
+    def add_tokens(self, prompt_tokens, completion_tokens):
+        with self._lock:
+            self.tokens["prompt"] += prompt_tokens
+            self.tokens["completion"] += completion_tokens
+
+    def note(self, key, value):
+        with self._lock:
+            self.notes[key] = value
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "kind": self.kind,
+                "outcome": self.outcome,
+                "total_ms": round((time.perf_counter() - self.started) * 1000, 1),
+                "spans_ms": {stage: round(seconds * 1000, 1) for stage, seconds in self.spans.items()},
+                "tokens": dict(self.tokens),
+                "rows": self.rows,
+                **self.notes,
+            }
+
+
+# Worker threads started with asyncio.to_thread() see the same trace
+_current_trace = contextvars.ContextVar("request_trace", default=None)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def request_trace(kind):
+    """
+    Trace one pipeline run: stages, LLM calls and notes recorded while it is
+    open land on the yielded RequestTrace, which is logged as one structured
+    line and observed in request_seconds when it closes.
+    """
+    trace = RequestTrace(kind)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    except (GeneratorExit, asyncio.CancelledError):
+        trace.outcome = "cancelled"
+        raise
+    except BaseException:
+        trace.outcome = "error"
+        raise
+    finally:
+        try:
+            _current_trace.reset(token)
+        except ValueError:
+            # A streaming response closed from another context (client went away)
+            pass
+        request_seconds.observe(time.perf_counter() - trace.started, kind=kind, outcome=trace.outcome)
+        logger.info(f"Request trace: {json.dumps(trace.to_dict())}")
+
+
+@contextmanager
+def stage(name):
+    """Time a pipeline stage into stage_seconds and the current trace"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        stage_seconds.observe(seconds, stage=name)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_span(name, seconds)
+
+
+def note(key, value):
+    """Attach a fact (a cache hit, where the result came from) to the current trace"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.note(key, value)
+
+
+def token_usage(response):
+    """(prompt, completion) tokens of a LangChain chat response or final stream chunk"""
+    usage = getattr(response, "usage_metadata", None)
+    if usage:
+        return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    usage = (getattr(response, "response_metadata", None) or {}).get("token_usage") or {}
+    return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+
+
+def record_llm_call(purpose, client, seconds, response=None):
+    """Observe an LLM call's latency and, when the response reports it, its token usage"""
+    # The response names the model that answered, which differs from the client's after a fallback
+    model = (
+        (getattr(response, "response_metadata", None) or {}).get("model_name")
+        or getattr(client, "model_name", None)
+        or type(client).__name__
+    )
+    llm_call_seconds.observe(seconds, purpose=purpose, model=model)
+    prompt_tokens, completion_tokens = token_usage(response) if response is not None else (0, 0)
+    if prompt_tokens:
+        llm_tokens.inc(prompt_tokens, purpose=purpose, model=model, type="prompt")
+    if completion_tokens:
+        llm_tokens.inc(completion_tokens, purpose=purpose, model=model, type="completion")
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_tokens(prompt_tokens, completion_tokens)
+
+
+def record_source(source):
+    """Count where a result came from (result_cache, cube, local_engine, postgres)"""
+    query_source.inc(source=source)
+    note("source", source)
+
+
+def record_rows(count):
+    query_rows.observe(count)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.rows = count
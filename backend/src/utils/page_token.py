@@ -0,0 +1,52 @@
+import os
+import hmac
+import json
+import base64
+import hashlib
+import secrets
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Tokens carry SQL that will be executed again, so they are signed. Without a
+# configured secret, tokens are only valid within the process that issued them.
+PAGE_TOKEN_SECRET = (os.getenv("PAGE_TOKEN_SECRET") or secrets.token_hex(32)).encode("utf-8")
+
+
+class InvalidPageToken(ValueError):
+    """Raised for page tokens that are malformed or were not issued by this server"""
+
+
+def _sign(payload):
+    return hmac.new(PAGE_TOKEN_SECRET, payload, hashlib.sha256).digest()[:16]
+
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def encode_page_token(sql, offset, page_size, data_version):
+    """Opaque, signed token pointing at the page of `sql` starting at `offset`"""
+    payload = json.dumps(
+        {"sql": sql, "offset": offset, "page_size": page_size, "version": data_version},
+        separators=(",", ":"),
+    ).encode("utf-8")
+    return f"{_b64encode(payload)}.{_b64encode(_sign(payload))}"
+
+
+def decode_page_token(token):
+    """Return the {"sql", "offset", "page_size", "version"} a token points at"""
+    try:
+        payload_b64, signature_b64 = token.split(".", 1)
+        payload = _b64decode(payload_b64)
+        signature = _b64decode(signature_b64)
+    except (ValueError, TypeError) as e:
+        raise InvalidPageToken("Malformed page token") from e
+    if not hmac.compare_digest(signature, _sign(payload)):
+        raise InvalidPageToken("Page token signature does not match")
+    return json.loads(payload)
@@ -0,0 +1,33 @@
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+
+@dataclass
+class QueryResult:
+    """
+    Result of executing one page of a SQL query.
+
+    Rows are kept as tuples in `columns` order; they are only turned into
+    {column: value} records at the HTTP boundary (records()).
+    """
+
+    sql: Optional[str]
+    columns: List[str] = field(default_factory=list)
+    rows: List[tuple] = field(default_factory=list)
+    explanation: str = ""
+    error: bool = False
+    total_count: int = 0
+    next_page_token: Optional[str] = None
+
+    def records(self):
+        columns = self.columns
+        return [dict(zip(columns, row)) for row in self.rows]
+
+    def to_dict(self):
+        return {
+            "sql": self.sql,
+            "data": self.records(),
+            "explanation": self.explanation,
+            "total_count": self.total_count,
+            "next_page_token": self.next_page_token,
+        }
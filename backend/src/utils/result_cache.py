@@ -0,0 +1,26 @@
+import os
+from dotenv import load_dotenv
+from src.utils.cache import LRUCache
+from src.utils.sql_text import canonicalize_sql
+
+# Load environment variables
+load_dotenv()
+
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "512"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "3600"))  # seconds
+
+
+def result_cache_key(sql, data_version, page=None):
+    """Cache key for a query result: the data version, the canonical SQL text and the page"""
+    return (data_version, canonicalize_sql(sql), page)
+
+
+# Values are {"data": [...], "explanation": str, "total_count": int,
+# "next_offset": int | None, "size": serialized bytes}
+result_cache = LRUCache(
+    max_entries=RESULT_CACHE_MAX_ENTRIES,
+    ttl=RESULT_CACHE_TTL,
+    max_bytes=RESULT_CACHE_MAX_BYTES,
+    sizeof=lambda entry: entry["size"],
+)
@@ -0,0 +1,110 @@
+import os
+import math
+from collections import Counter
+from decimal import Decimal
+from dotenv import load_dotenv
+from src.utils.query_result import QueryResult
+from src.utils.serialization import dumps
+
+# Load environment variables
+load_dotenv()
+
+# Tokens the result data may take up in the summary prompt
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "2500"))
+SUMMARY_TOP_K = int(os.getenv("SUMMARY_TOP_K", "5"))
+
+# Compact JSON with many numbers tokenizes at roughly 3 characters per token
+CHARS_PER_TOKEN = 3
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float, Decimal)) and not isinstance(value, bool)
+
+
+def _round(value):
+    return value if isinstance(value, int) else round(float(value), 2)
+
+
+def column_stats(columns, rows, top_k=SUMMARY_TOP_K):
+    """Per-column digest: min/max/mean for numeric columns, top-k values for the rest"""
+    stats = {}
+    for index, column in enumerate(columns):
+        values = [row[index] for row in rows if row[index] is not None]
+        nulls = len(rows) - len(values)
+        if values and all(_is_number(v) for v in values):
+            column_digest = {
+                "min": _round(min(values)),
+                "max": _round(max(values)),
+                "mean": round(sum(float(v) for v in values) / len(values), 2),
+            }
+        else:
+            counts = Counter(str(v) for v in values)
+            column_digest = {
+                "distinct": len(counts),
+                "top": [[value, count] for value, count in counts.most_common(top_k)],
+            }
+        if nulls:
+            column_digest["nulls"] = nulls
+        stats[column] = column_digest
+    return stats
+
+
+def sample_rows(rows, size):
+    """
+    Representative sample that keeps the original order: the first rows (which
+    matter most for ORDER BY / LIMIT queries) plus evenly spaced rows after them.
+    """
+    if size >= len(rows):
+        return list(rows)
+    if size <= 0:
+        return []
+    head = rows[:max(1, size // 2)]
+    rest = size - len(head)
+    tail_start = len(head)
+    step = (len(rows) - tail_start) / rest if rest else 0
+    tail = [rows[tail_start + int(i * step)] for i in range(rest)]
+    return head + tail
+
+
+def compact_result(result: QueryResult, token_budget=SUMMARY_TOKEN_BUDGET):
+    """
+    Render a query result for the summary prompt within `token_budget`.
+
+    Small results are sent verbatim as columnar JSON. Larger ones are replaced
+    by a digest: row counts, per-column statistics and the largest
+    representative sample of rows that still fits the budget.
+    """
+    full = dumps({"columns": result.columns, "rows": result.rows}).decode("utf-8")
+    if estimate_tokens(full) <= token_budget:
+        return full
+
+    total_count = max(result.total_count, len(result.rows))
+    digest = {
+        "row_count": total_count,
+        "note": (
+            f"Statistical digest, not the full result: statistics cover the {len(result.rows)} rows "
+            f"fetched of {total_count}, sample_rows is a representative subset."
+        ),
+        "column_stats": column_stats(result.columns, result.rows),
+        "columns": result.columns,
+        "sample_rows": [],
+    }
+
+    # Largest sample that fits: halve until the digest is within budget
+    size = len(result.rows)
+    while True:
+        digest["sample_rows"] = sample_rows(result.rows, size)
+        rendered = dumps(digest).decode("utf-8")
+        if estimate_tokens(rendered) <= token_budget or size == 0:
+            break
+        size //= 2
+
+    if estimate_tokens(rendered) > token_budget:
+        # Very wide results: keep only the most frequent value per text column
+        digest["column_stats"] = column_stats(result.columns, result.rows, top_k=1)
+        rendered = dumps(digest).decode("utf-8")
+    return rendered
@@ -0,0 +1,37 @@
+import datetime
+import decimal
+import uuid
+import orjson
+from fastapi.responses import Response
+
+
+def _default(obj):
+    # Types psycopg2 hands back that orjson doesn't serialize natively
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, (bytes, memoryview)):
+        return bytes(obj).hex()
+    return str(obj)
+
+
+def dumps(obj):
+    """Serialize to compact JSON bytes with orjson"""
+    return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONResponse(Response):
+    """
+    JSON response rendered directly with orjson.
+
+    Returning this from an endpoint skips FastAPI's jsonable_encoder pass, so
+    the response body is produced in exactly one serialization step.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content):
+        return dumps(content)
@@ -0,0 +1,83 @@
+import asyncio
+import logging
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Share one in-flight computation between concurrent callers with the same key.
+
+    The first caller for a key starts the computation as its own task; callers
+    arriving while it runs wait for that task instead of starting another, and
+    all of them get its result or its exception. The computation is cancelled
+    once it outlives `timeout` seconds (callers get asyncio.TimeoutError) or
+    when every caller waiting for it has gone away. Nothing is kept after it
+    finishes: caching results is left to the caches.
+    """
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+        self._flights = {}  # key -> _Flight
+        self.started = 0
+        self.coalesced = 0
+        self.timeouts = 0
+        self.cancelled = 0
+
+    async def _run(self, factory, timeout):
+        if not timeout:
+            return await factory()
+        try:
+            return await asyncio.wait_for(factory(), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+
+    def _finished(self, key, flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    async def do(self, key, factory, timeout=None):
+        """
+        Await factory() (a coroutine function) for `key`, or join the run
+        already in flight for it. `timeout` overrides the default for a run
+        this call starts.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            task = asyncio.create_task(self._run(factory, self.timeout if timeout is None else timeout))
+            flight = self._flights[key] = _Flight(task)
+            task.add_done_callback(lambda _: self._finished(key, flight))
+            self.started += 1
+        else:
+            self.coalesced += 1
+        flight.waiters += 1
+        try:
+            # shield(): one caller going away must not cancel the others' run
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                logger.info(f"Cancelling in-flight computation nobody waits for: {key}")
+                self.cancelled += 1
+                flight.task.cancel()
+
+    def stats(self):
+        return {
+            "in_flight": len(self._flights),
+            "started": self.started,
+            "coalesced": self.coalesced,
+            "timeouts": self.timeouts,
+            "cancelled": self.cancelled,
+        }
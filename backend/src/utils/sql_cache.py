@@ -0,0 +1,221 @@
+import os
+import re
+import threading
+import unicodedata
+from functools import lru_cache
+from dotenv import load_dotenv
+from src.utils.cache import LRUCache
+import logging
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+SQL_CACHE_MAX_ENTRIES = int(os.getenv("SQL_CACHE_MAX_ENTRIES", "1024"))
+SQL_CACHE_TTL = float(os.getenv("SQL_CACHE_TTL", "86400"))  # seconds
+SQL_CACHE_SEMANTIC = os.getenv("SQL_CACHE_SEMANTIC", "false").lower() in ("1", "true", "yes")
+SQL_CACHE_EMBEDDING_MODEL = os.getenv("SQL_CACHE_EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+SQL_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("SQL_CACHE_SIMILARITY_THRESHOLD", "0.92"))
+
+# Shorthand users type that means the same thing as the long form
+abbreviations = {
+    "avg": "average",
+    "mean": "average",
+    "max": "maximum",
+    "highest": "maximum",
+    "min": "minimum",
+    "lowest": "minimum",
+    "num": "number",
+    "qty": "quantity",
+    "cnt": "count",
+    "yr": "year",
+    "yrs": "year",
+    "km": "kilometer",
+    "kms": "kilometer",
+    "kmpl": "mileage",
+    "rs": "inr",
+    "rupees": "inr",
+    "bike": "motorcycle",
+    "motorbike": "motorcycle",
+}
+
+# Filler words that never change the meaning of a question about the dataset
+stopwords = {
+    "a", "an", "the", "of", "in", "for", "me", "please", "show", "give", "tell",
+    "what", "whats", "is", "are", "was", "were", "do", "does", "can", "you",
+    "i", "want", "to", "know", "find", "get", "list", "display", "all", "there",
+    "which", "that", "with", "on", "from", "data", "database", "table",
+    "motorcycle",  # every row is a motorcycle, so it never narrows the question
+}
+
+# Comparison operators are kept as tokens: "engine > 150" must not match "engine < 150"
+_token_pattern = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?|[<>]=?|!=|=")
+_number_pattern = re.compile(r"\d+(?:\.\d+)?")
+
+
+def normalize_question(text):
+    """
+    Reduce a question to a canonical token string so trivially different
+    phrasings ("avg price of Honda in Maharashtra?" / "Average price Honda
+    Maharashtra") share one cache key. Word order is preserved because it
+    carries meaning ("price above 100 and mileage below 50").
+    """
+    text = unicodedata.normalize("NFKC", text).lower()
+    tokens = []
+    for token in _token_pattern.findall(text):
+        # Light plural folding: "motorcycles" -> "motorcycle", but keep "tvs", "less"
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss") and not token[0].isdigit():
+            token = token[:-1]
+        token = abbreviations.get(token, token)
+        if token in stopwords:
+            continue
+        tokens.append(token)
+    return " ".join(tokens)
+
+
+class QuestionSQLCache:
+    """
+    Cache of natural-language question -> generated SQL.
+
+    Lookups first try an exact match on the normalized question. When the
+    semantic tier is enabled, a miss falls back to the most similar cached
+    question by sentence embedding, accepted only above `threshold` and only
+    when both questions mention the same numbers and the same dataset values
+    (brands, states, models, ...; see `named_values`).
+    """
+
+    def __init__(self, max_entries=SQL_CACHE_MAX_ENTRIES, ttl=SQL_CACHE_TTL,
+                 semantic=SQL_CACHE_SEMANTIC, model_name=SQL_CACHE_EMBEDDING_MODEL,
+                 threshold=SQL_CACHE_SIMILARITY_THRESHOLD):
+        self.cache = LRUCache(max_entries=max_entries, ttl=ttl, on_evict=self._forget_vector)
+        self.semantic = semantic
+        self.model_name = model_name
+        self.threshold = threshold
+
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._vectors = {}  # normalized key -> unit embedding of the original question
+        self._matrix = None
+        self._matrix_keys = []
+        self._matrix_lock = threading.Lock()
+
+        # Callable returning the dataset values a question names, as a set, or
+        # None when it can't tell; set by template_sql once its value index exists.
+        # Without it no semantic neighbour is trusted
+        self.named_values = None
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+
+    @property
+    def semantic_enabled(self):
+        return self.semantic
+
+    def _forget_vector(self, key):
+        # Called by the LRU under its lock whenever an entry is evicted or expires,
+        # so nothing may take the LRU lock while holding _matrix_lock
+        with self._matrix_lock:
+            if self._vectors.pop(key, None) is not None:
+                self._matrix = None
+
+    def _load_model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    try:
+                        from sentence_transformers import SentenceTransformer
+                        self._model = SentenceTransformer(self.model_name)
+                        logger.info(f"Loaded embedding model {self.model_name} for the SQL cache")
+                    except Exception as e:
+                        logger.error(f"Disabling semantic SQL cache, embedding model failed to load: {str(e)}")
+                        self.semantic = False
+        return self._model
+
+    @lru_cache(maxsize=256)
+    def _embed(self, question):
+        return self._load_model().encode(question, normalize_embeddings=True)
+
+    def _nearest(self, question):
+        import numpy as np
+
+        vector = self._embed(question.strip().lower())
+        with self._matrix_lock:
+            if self._matrix is None:
+                self._matrix_keys = list(self._vectors.keys())
+                self._matrix = np.vstack([self._vectors[k] for k in self._matrix_keys]) if self._matrix_keys else None
+            if self._matrix is None:
+                return None, 0.0
+            scores = self._matrix @ vector
+            best = int(np.argmax(scores))
+            return self._matrix_keys[best], float(scores[best])
+
+    def get(self, question):
+        """Return the cached SQL for a question, or None on a miss"""
+        key = normalize_question(question)
+        sql = self.cache.get(key)
+        if sql is not None:
+            self.exact_hits += 1
+            return sql
+        if not self.semantic or not self._vectors or self._load_model() is None:
+            return None
+
+        candidate, score = self._nearest(question)
+        if candidate is None or score < self.threshold:
+            return None
+        if _number_pattern.findall(key) != _number_pattern.findall(candidate):
+            return None
+        # "Honda in Delhi" must not reuse the SQL for "Bajaj in Kerala"
+        values = self.named_values(key) if self.named_values is not None else None
+        if values is None or values != self.named_values(candidate):
+            return None
+        sql = self.cache.peek(candidate)
+        if sql is None:
+            return None
+        self.semantic_hits += 1
+        logger.info(f"Semantic SQL cache hit (similarity {score:.3f}): '{key}' ~ '{candidate}'")
+        return sql
+
+    def put(self, question, sql):
+        key = normalize_question(question)
+        if not key:
+            return
+        self.cache.set(key, sql)
+        if self.semantic and self._load_model() is not None:
+            vector = self._embed(question.strip().lower())
+            if key not in self.cache:
+                return
+            with self._matrix_lock:
+                self._vectors[key] = vector
+                self._matrix = None
+            # Evicted between the check and the store: its eviction callback found no vector
+            if key not in self.cache:
+                self._forget_vector(key)
+
+    def clear(self):
+        self.cache.clear()
+        with self._matrix_lock:
+            self._vectors.clear()
+            self._matrix = None
+
+    def stats(self):
+        stats = self.cache.stats()
+        # A semantic hit counts as an LRU miss on the exact key
+        stats["misses"] -= self.semantic_hits
+        lookups = stats["hits"] + stats["misses"] + self.semantic_hits
+        stats.update({
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "hit_rate": round((self.exact_hits + self.semantic_hits) / lookups, 4) if lookups else 0.0,
+            "semantic_enabled": self.semantic,
+            "similarity_threshold": self.threshold,
+        })
+        return stats
+
+
+question_cache = QuestionSQLCache()
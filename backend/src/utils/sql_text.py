@@ -0,0 +1,71 @@
+import re
+
+# One pass over the SQL text; order matters (comments and literals before words/operators)
+_token_pattern = re.compile(
+    r"""
+      (?P<space>\s+)
+    | (?P<line_comment>--[^\n]*)
+    | (?P<block_comment>/\*.*?\*/)
+    | (?P<string>[eE]?'(?:[^']|'')*')
+    | (?P<quoted_ident>"(?:[^"]|"")*")
+    | (?P<number>(?:\d+\.\d*|\.\d+|\d+)(?:[eE][+-]?\d+)?)
+    | (?P<param>\$\d+|%\(\w+\)s|%s)
+    | (?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+    | (?P<operator>::|<>|!=|>=|<=|\|\||[-+*/%^<>=~!@#&|.,;()\[\]])
+    | (?P<other>.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+
+def token_spans(sql):
+    """Like tokenize_sql(), with each token's (start, end) offsets in the text"""
+    spans = []
+    for match in _token_pattern.finditer(sql):
+        kind = match.lastgroup
+        if kind in ("space", "line_comment", "block_comment"):
+            continue
+        spans.append((kind, match.group(), match.start(), match.end()))
+    return spans
+
+
+def tokenize_sql(sql):
+    """
+    Split SQL into (kind, text) tokens, dropping whitespace and comments.
+
+    kind is one of: string, quoted_ident, number, param, word, operator, other.
+    """
+    return [(kind, text) for kind, text, _, _ in token_spans(sql)]
+
+
+def _canonical_number(text):
+    # Lexical clean-up only: the literal's value and type must not change
+    # (100 and 100.0 differ in PostgreSQL integer division, so both are kept as-is)
+    text = text.lower()
+    if text.isdigit():
+        return text.lstrip("0") or "0"
+    return text
+
+
+def canonicalize_sql(sql):
+    """
+    Canonical form of a SQL statement for use as a cache key.
+
+    Whitespace and comments are collapsed, keywords and unquoted identifiers
+    are lower-cased (PostgreSQL folds them anyway), integer literals lose
+    leading zeros and trailing semicolons are dropped. String literals and
+    quoted identifiers are kept byte-for-byte because they are case-sensitive.
+    """
+    parts = []
+    for kind, text in tokenize_sql(sql):
+        if kind == "word":
+            parts.append(text.lower())
+        elif kind == "number":
+            parts.append(_canonical_number(text))
+        elif kind == "string" and text[0] in "eE":
+            parts.append("E" + text[1:])
+        else:
+            parts.append(text)
+    while parts and parts[-1] == ";":
+        parts.pop()
+    return " ".join(parts)
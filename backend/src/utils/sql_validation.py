@@ -0,0 +1,191 @@
+import os
+import asyncio
+import re
+import psycopg2
+from dotenv import load_dotenv
+from src.utils.db_pool import get_pool
+from src.utils.execute_query import RESULT_MAX_ROWS
+from src.utils.sql_text import token_spans
+import logging
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# LIMIT added to (or clamped on) every generated query; one past RESULT_MAX_ROWS
+# so results that were cut off are still reported as such
+SQL_ENFORCED_LIMIT = int(os.getenv("SQL_ENFORCED_LIMIT", str(RESULT_MAX_ROWS + 1)))
+# Plans whose estimates exceed these are rejected before execution (0 disables)
+SQL_MAX_PLAN_COST = float(os.getenv("SQL_MAX_PLAN_COST", "1000000"))
+SQL_MAX_PLAN_ROWS = float(os.getenv("SQL_MAX_PLAN_ROWS", "1000000"))
+
+_read_statement = re.compile(r'^\s*\(*\s*(SELECT|WITH)\b', re.IGNORECASE)
+
+# Words that only appear in statements that write, lock or change session state
+# (including DML inside a CTE, SELECT ... INTO and SELECT ... FOR UPDATE)
+_write_words = {
+    "insert", "update", "delete", "merge", "truncate", "create", "drop", "alter", "grant",
+    "revoke", "copy", "call", "do", "lock", "vacuum", "analyze", "cluster", "reindex",
+    "set", "reset", "into", "listen", "notify", "prepare", "execute", "discard",
+}
+# Functions with side effects (or that can stall a connection) a SELECT could call
+_blocked_functions = {
+    "pg_sleep", "pg_sleep_for", "pg_sleep_until", "pg_terminate_backend", "pg_cancel_backend",
+    "pg_reload_conf", "pg_rotate_logfile", "set_config", "pg_read_file", "pg_read_binary_file",
+    "pg_ls_dir", "pg_stat_file", "lo_import", "lo_export", "lo_unlink", "dblink", "dblink_exec",
+    "nextval", "setval", "pg_advisory_lock", "pg_advisory_xact_lock", "pg_notify",
+    "txid_current", "pg_switch_wal", "pg_create_restore_point",
+}
+# Large-object functions (lo_create, lo_from_bytea, lo_put, ...) write to pg_largeobject
+_blocked_function_prefixes = ("lo_",)
+
+
+class SQLValidationError(ValueError):
+    """Generated SQL that should not be executed"""
+
+
+class QueryRejected(SQLValidationError):
+    """Valid SQL refused by policy: it writes, or its plan is too expensive"""
+
+
+def check_sql_syntax(sql):
+    """
+    Cheap structural check of generated SQL, without a database round trip.
+
+    Rejects empty output, anything that isn't a single SELECT/WITH statement,
+    unbalanced parentheses and characters no SQL token starts with (which is
+    how unterminated strings and leftover prose show up). Returns the
+    statement's token spans, without trailing semicolons.
+    """
+    if not sql or not _read_statement.match(sql):
+        first = sql.split(None, 1)[0].lower() if sql and sql.strip() else ""
+        if first in _write_words:
+            raise QueryRejected(f"only read-only queries are allowed ({first.upper()})")
+        raise SQLValidationError("not a SELECT statement")
+    spans = token_spans(sql)
+    while spans and spans[-1][:2] == ("operator", ";"):
+        spans.pop()
+    depth = 0
+    for kind, text, _, _ in spans:
+        if kind == "other":
+            raise SQLValidationError(f"unexpected character {text!r}")
+        if kind == "operator":
+            if text == ";":
+                raise SQLValidationError("more than one statement")
+            if text == "(":
+                depth += 1
+            elif text == ")":
+                depth -= 1
+                if depth < 0:
+                    break
+    if depth != 0:
+        raise SQLValidationError("unbalanced parentheses")
+    return spans
+
+
+def check_read_only(spans):
+    """
+    Reject statements that could write, lock or call side-effecting functions.
+
+    A fast pre-filter with readable errors: execution and EXPLAIN also run in
+    READ ONLY transactions, so the database refuses whatever gets past it.
+    """
+    for index, (kind, text, _, _) in enumerate(spans):
+        if kind != "word":
+            continue
+        previous = spans[index - 1] if index else None
+        if previous is not None and (previous[1] == "." or (previous[0] == "word" and previous[1].lower() == "as")):
+            # An alias or a qualified name ("AS set", "t.analyze"), not a keyword
+            continue
+        word = text.lower()
+        if word in _write_words:
+            raise QueryRejected(f"only read-only queries are allowed ({text.upper()})")
+        if (word in _blocked_functions or word.startswith(_blocked_function_prefixes)) \
+                and index + 1 < len(spans) and spans[index + 1][1] == "(":
+            raise QueryRejected(f"function {word}() is not allowed")
+
+
+def enforce_limit(sql, spans, limit=SQL_ENFORCED_LIMIT):
+    """Append a LIMIT to the statement, or lower a larger top-level one"""
+    depth = 0
+    for index, (kind, text, start, end) in enumerate(spans):
+        if kind == "operator" and text == "(":
+            depth += 1
+        elif kind == "operator" and text == ")":
+            depth -= 1
+        elif depth == 0 and kind == "word" and text.lower() in ("limit", "fetch"):
+            following = spans[index + 1] if index + 1 < len(spans) else None
+            if text.lower() == "limit" and following and following[0] == "number" and following[1].isdigit():
+                if int(following[1]) > limit:
+                    return f"{sql[:following[2]]}{limit}{sql[following[3]:]}"
+                return sql
+            if text.lower() == "limit" and following and following[1].lower() == "all":
+                return f"{sql[:following[2]]}{limit}{sql[following[3]:]}"
+            # FETCH FIRST ... / LIMIT <expression>: bounded by RESULT_MAX_ROWS at execution
+            return sql
+    # After the last real token, so a trailing comment can't swallow it
+    end = spans[-1][3] if spans else len(sql)
+    return f"{sql[:end]} LIMIT {limit};"
+
+
+def explain_sql(sql):
+    """Plan the query with EXPLAIN (no execution); returns the top plan node"""
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SET TRANSACTION READ ONLY;")
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+            return cursor.fetchone()[0][0]["Plan"]
+        except (psycopg2.ProgrammingError, psycopg2.DataError) as e:
+            # Unknown columns/tables, type errors and syntax errors; a lost
+            # connection (OperationalError) is not the query's fault and propagates
+            raise SQLValidationError(str(e).strip().splitlines()[0]) from e
+        finally:
+            cursor.close()
+            conn.rollback()
+
+
+def check_plan(plan, max_cost=SQL_MAX_PLAN_COST, max_rows=SQL_MAX_PLAN_ROWS):
+    """Reject plans whose estimated cost or row count exceed the thresholds"""
+    cost = plan.get("Total Cost", 0)
+    rows = plan.get("Plan Rows", 0)
+    if max_cost and cost > max_cost:
+        raise QueryRejected(f"query is too expensive (estimated cost {cost:.0f}, limit {max_cost:.0f})")
+    if max_rows and rows > max_rows:
+        raise QueryRejected(f"query would return too many rows (estimated {rows:.0f}, limit {max_rows:.0f})")
+
+
+def prepare_sql(sql):
+    """The database-free part of guard_sql(): returns the SQL with its LIMIT enforced"""
+    spans = check_sql_syntax(sql)
+    check_read_only(spans)
+    return enforce_limit(sql, spans)
+
+
+def guard_sql(sql):
+    """
+    Validate generated SQL before it runs; returns (sql to execute, plan).
+
+    Parses the statement, rejects anything that isn't read-only, enforces a
+    LIMIT and plans it with EXPLAIN against the live schema, rejecting plans
+    over SQL_MAX_PLAN_COST / SQL_MAX_PLAN_ROWS. Raises SQLValidationError
+    (invalid SQL) or QueryRejected (refused by policy), both ValueErrors.
+    """
+    sql = prepare_sql(sql)
+    plan = explain_sql(sql)
+    check_plan(plan)
+    return sql, plan
+
+
+async def aguard_sql(sql):
+    # Only EXPLAIN talks to the database; the rest stays on the event loop
+    sql = prepare_sql(sql)
+    plan = await asyncio.to_thread(explain_sql, sql)
+    check_plan(plan)
+    return sql, plan
@@ -0,0 +1,553 @@
+import os
+import re
+import threading
+import time
+from dotenv import load_dotenv
+from src.utils.db_pool import get_pool
+from src.utils.dataset_version import get_version_watcher, read_dataset_version
+from src.utils.local_engine import get_local_engine
+from src.utils.sql_cache import normalize_question, question_cache
+import logging
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+TEMPLATE_SQL = os.getenv("TEMPLATE_SQL", "false").lower() in ("1", "true", "yes")
+# Share of the question's words the parser must account for; below it the LLM writes the SQL
+TEMPLATE_SQL_MIN_CONFIDENCE = float(os.getenv("TEMPLATE_SQL_MIN_CONFIDENCE", "1.0"))
+
+TEMPLATE_TABLE = "Motorcycle_sales"
+
+# Columns whose distinct values are indexed, so questions can name them ("Honda", "Tamil Nadu")
+value_columns = (
+    "brand", "state", "model", "fuel_type", "owner_type", "seller_type", "insurance_status", "city_tier",
+)
+year_columns = ("year_of_manufacture", "registration_year")
+
+# Phrases (as normalize_question() leaves them) naming each column
+dimension_phrases = {
+    ("brand",): "brand",
+    ("manufacturer",): "brand",
+    ("make",): "brand",
+    ("state",): "state",
+    ("model",): "model",
+    ("fuel", "type"): "fuel_type",
+    ("fuel",): "fuel_type",
+    ("owner", "type"): "owner_type",
+    ("ownership",): "owner_type",
+    ("owner",): "owner_type",
+    ("seller", "type"): "seller_type",
+    ("seller",): "seller_type",
+    ("insurance", "status"): "insurance_status",
+    ("insurance",): "insurance_status",
+    ("city", "tier"): "city_tier",
+    ("tier",): "city_tier",
+    ("year", "manufacture"): "year_of_manufacture",
+    ("manufacture", "year"): "year_of_manufacture",
+    ("manufacturing", "year"): "year_of_manufacture",
+    ("registration", "year"): "registration_year",
+    ("year", "registration"): "registration_year",
+}
+
+metric_phrases = {
+    ("resale", "price"): "resale_price_inr",
+    ("resale", "value"): "resale_price_inr",
+    ("resale",): "resale_price_inr",
+    ("price",): "price_inr",
+    ("cost",): "price_inr",
+    ("mileage",): "mileage_kmpl",
+    ("fuel", "efficiency"): "mileage_kmpl",
+    ("engine", "capacity"): "engine_capacity_cc",
+    ("engine", "size"): "engine_capacity_cc",
+    ("displacement",): "engine_capacity_cc",
+    ("daily", "distance"): "avg_daily_distance_km",
+    ("distance",): "avg_daily_distance_km",
+}
+
+aggregate_words = {"average": "AVG", "total": "SUM", "sum": "SUM"}
+superlative_words = {"maximum": "DESC", "minimum": "ASC"}
+price_superlatives = {"expensive": "DESC", "costliest": "DESC", "cheapest": "ASC"}
+count_words = {"count", "number", "many", "sale"}
+group_markers = {"by", "per", "each", "every", "across"}
+comparators = {
+    "after": ">", "since": ">=", "before": "<", "until": "<=",
+    "above": ">", "over": ">", "greater": ">", "more": ">", "exceeding": ">",
+    "below": "<", "under": "<", "less": "<",
+    ">": ">", ">=": ">=", "<": "<", "<=": "<=", "=": "=",
+}
+year_contexts = {
+    "manufactured": "year_of_manufacture", "manufacture": "year_of_manufacture",
+    "manufacturing": "year_of_manufacture", "made": "year_of_manufacture", "built": "year_of_manufacture",
+    "registered": "registration_year", "registration": "registration_year",
+}
+units = {"cc", "inr", "rupee", "km", "kmpl"}
+# Words that carry no meaning here once the rest of the question is understood ("doe": "does" after plural folding)
+fillers = {
+    "how", "do", "doe", "did", "has", "have", "had", "be", "sold", "listed", "listing", "record", "entry",
+    "unit", "vehicle", "and", "overall", "their", "whole",
+}
+
+# Negation flips the meaning of whatever it touches, which templates don't model;
+# values that contain one ("Not Available") are matched before these are seen
+negations = {"no", "not", "non", "without", "except", "excluding", "exclude", "never", "nor", "neither"}
+
+_year = re.compile(r"^(19|20)\d\d$")
+_number = re.compile(r"^\d+(?:\.\d+)?$")
+_number_with_unit = re.compile(r"^(\d+(?:\.\d+)?)(cc)$")
+
+
+def values_sql():
+    """Distinct values of every indexed column, as (column_name, value) rows"""
+    return " UNION ALL ".join(
+        f"SELECT DISTINCT '{column}' AS column_name, CAST({column} AS TEXT) AS value FROM {TEMPLATE_TABLE}"
+        for column in value_columns
+    ) + ";"
+
+
+def _tokens(question):
+    tokens = []
+    for token in normalize_question(question).split():
+        match = _number_with_unit.match(token)
+        if match:
+            tokens.extend(match.groups())
+        elif token == "citie":
+            # "cities" after plural folding
+            tokens.append("city")
+        else:
+            tokens.append(token)
+    return tokens
+
+
+def _quote(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _match(tokens, index, phrases, longest):
+    for span in range(min(longest, len(tokens) - index), 0, -1):
+        found = phrases.get(tuple(tokens[index:index + span]))
+        if found is not None:
+            return found, span
+    return None, 0
+
+
+class TemplateSQL:
+    """
+    Deterministic SQL for questions that fit a handful of shapes: an
+    aggregate or count of one metric, optionally filtered by named values,
+    year and metric ranges, grouped by up to two columns, ranked ("top 5
+    models by resale price", "which brand has the highest average price").
+
+    Named values are recognized from the distinct values of value_columns,
+    loaded with the data and reloaded when its version changes. parse()
+    reports as confidence the share of the question's words it understood;
+    a word it doesn't know, or a question it can't read one way only, makes
+    it give up so the LLM answers instead.
+    """
+
+    def __init__(self):
+        self._entities = {}
+        self._longest_entity = 1
+        self._version = None
+        self._lock = threading.Lock()
+        self._loading = False
+        self.values = 0
+        self.load_seconds = 0.0
+        self.loads = 0
+        self.hits = 0
+        self.misses = 0
+        self._longest_dimension = max(len(phrase) for phrase in dimension_phrases)
+        self._longest_metric = max(len(phrase) for phrase in metric_phrases)
+
+    @property
+    def ready(self):
+        return bool(self._entities)
+
+    def set_values(self, rows, version=None):
+        """Index (column, value) rows; values are matched as normalize_question() tokens"""
+        entities = {}
+        for column, value in rows:
+            if value is None:
+                continue
+            key = tuple(_tokens(str(value)))
+            if key and entities.setdefault(key, (column, value)) != (column, value):
+                # The same words name values of two columns; leave them to the LLM
+                entities[key] = None
+        with self._lock:
+            self._entities = entities
+            self._longest_entity = max((len(key) for key in entities), default=1)
+            self._version = version
+            self.values = len(entities)
+
+    def load(self, engine=None):
+        """(Re)load the distinct values, from the embedded engine's snapshot when one is given"""
+        with self._lock:
+            if self._loading:
+                return
+            self._loading = True
+        try:
+            started = time.perf_counter()
+            result = engine.execute(values_sql(), 10 ** 6) if engine is not None else None
+            if result is not None:
+                rows, version = result[1], engine.version
+            else:
+                with get_pool().connection() as conn:
+                    cursor = conn.cursor()
+                    try:
+                        version = read_dataset_version(conn)
+                        cursor.execute(values_sql())
+                        rows = cursor.fetchall()
+                    finally:
+                        cursor.close()
+                        conn.rollback()
+            self.set_values(rows, version)
+            self.load_seconds = time.perf_counter() - started
+            self.loads += 1
+            logger.info(f"Template SQL indexed {self.values} values (data version {version}) in {self.load_seconds * 1000:.0f} ms")
+        except Exception as e:
+            logger.error(f"Template SQL value index failed to load, questions go to the LLM: {str(e)}")
+        finally:
+            with self._lock:
+                self._loading = False
+
+    def load_in_background(self, engine=None):
+        threading.Thread(target=self.load, args=(engine,), name="template-sql-load", daemon=True).start()
+
+    def on_engine_change(self, engine, delta):
+        """Local engine listener: appended rows may bring new values"""
+        self.load(engine)
+
+    def on_version_change(self, old_version, new_version):
+        """Version watcher listener (no local engine)"""
+        self.load_in_background()
+
+    def parse(self, question):
+        """The question's intent as a dict (with its confidence), or None if it fits no template"""
+        tokens = _tokens(question)
+        if not tokens or not self._entities:
+            return None
+        intent = {
+            "filters": {}, "ranges": [], "group": [], "bare": [], "metric": None, "rank_metric": None,
+            "aggregate": None, "superlative": None, "cheapest": False, "count": False, "limit": None, "direction": None,
+            "year_context": set(), "years": [], "range_metric": None, "or": False,
+        }
+        understood = 0
+        index = 0
+        while index < len(tokens):
+            token = tokens[index]
+            step = self._read(tokens, index, intent)
+            if step is None:
+                logger.debug(f"Template SQL does not know '{token}'")
+                step = 1
+            else:
+                understood += step
+            index += step
+        intent["confidence"] = understood / len(tokens)
+        return self._resolve(intent)
+
+    def _read(self, tokens, index, intent):
+        """Consume what starts at tokens[index] into intent; returns tokens used, or None"""
+        token = tokens[index]
+        entity, span = _match(tokens, index, self._entities, self._longest_entity)
+        if span:
+            if entity is None:
+                return None
+            column, value = entity
+            values = intent["filters"].setdefault(column, [])
+            if value not in values:
+                values.append(value)
+            # "first owner", "tier 1 city", "petrol fuel": the column's own name adds nothing
+            dimension, extra = _match(tokens, index + span, dimension_phrases, self._longest_dimension)
+            if dimension == column or (column == "city_tier" and tokens[index + span:index + span + 1] == ["city"]):
+                span += extra or 1
+            return span
+
+        if token in negations:
+            return None
+
+        if token in ("top", "bottom"):
+            intent["direction"] = "DESC" if token == "top" else "ASC"
+            if index + 1 < len(tokens) and tokens[index + 1].isdigit() and not _year.match(tokens[index + 1]):
+                intent["limit"] = int(tokens[index + 1])
+                return 2
+            intent["limit"] = 1
+            return 1
+
+        if token in group_markers:
+            dimension, span = _match(tokens, index + 1, dimension_phrases, self._longest_dimension)
+            if span:
+                intent["group"].append(dimension)
+                return 1 + span
+            metric, span = _match(tokens, index + 1, metric_phrases, self._longest_metric)
+            if span and token == "by":
+                intent["rank_metric"] = metric
+                return 1 + span
+            return 1
+
+        if token == "wise" and intent["bare"]:
+            intent["group"].append(intent["bare"].pop())
+            return 1
+
+        if token == "between" and index + 3 < len(tokens) and tokens[index + 2] == "and" \
+                and _number.match(tokens[index + 1]) and _number.match(tokens[index + 3]):
+            return 4 if self._add_range(intent, "BETWEEN", tokens[index + 1], tokens[index + 3]) else None
+
+        if token in comparators:
+            span = 2 if index + 1 < len(tokens) and tokens[index + 1] == "than" else 1
+            if index + span < len(tokens) and _number.match(tokens[index + span]):
+                return span + 1 if self._add_range(intent, comparators[token], tokens[index + span]) else None
+            return None
+
+        if token == "or":
+            # Fine between values of one column (an IN list); checked in _resolve()
+            intent["or"] = True
+            return 1
+
+        if _year.match(token):
+            intent["years"].append(("=", token))
+            return 1
+
+        if token in year_contexts:
+            intent["year_context"].add(year_contexts[token])
+            return 1
+
+        dimension, span = _match(tokens, index, dimension_phrases, self._longest_dimension)
+        if span:
+            following = tokens[index + span] if index + span < len(tokens) else None
+            if dimension in year_columns and following is not None and (following in comparators or _year.match(following)):
+                # "registration year after 2020": a filter, not a grouping
+                intent["year_context"].add(dimension)
+            else:
+                intent["bare"].append(dimension)
+            return span
+
+        metric, span = _match(tokens, index, metric_phrases, self._longest_metric)
+        if span:
+            following = tokens[index + span] if index + span < len(tokens) else None
+            if following in comparators or following == "between":
+                # A range on this metric: "engine capacity above 150 cc"
+                intent["range_metric"] = metric
+            elif intent["metric"] not in (None, metric):
+                return None
+            else:
+                intent["metric"] = metric
+            return span
+
+        if token in aggregate_words:
+            if intent["aggregate"] not in (None, aggregate_words[token]):
+                return None
+            intent["aggregate"] = aggregate_words[token]
+            return 1
+        if token in superlative_words:
+            intent["superlative"] = superlative_words[token]
+            return 1
+        if token in price_superlatives or (token in ("most", "least") and tokens[index + 1:index + 2] == ["expensive"]):
+            direction = price_superlatives.get(token) or ("DESC" if token == "most" else "ASC")
+            intent["superlative"] = direction
+            intent["cheapest"] = True
+            if intent["metric"] not in (None, "price_inr"):
+                return None
+            intent["metric"] = "price_inr"
+            return 1 if token in price_superlatives else 2
+        if token in ("most", "least"):
+            intent["count"] = True
+            intent["superlative"] = "DESC" if token == "most" else "ASC"
+            return 1
+        if token in count_words:
+            intent["count"] = True
+            return 1
+        if token in units or token in fillers:
+            return 1
+        return None
+
+    @staticmethod
+    def _add_range(intent, operator, *numbers):
+        """Record a range on the metric named just before it (or a year); False if there is none"""
+        if _year.match(numbers[0]):
+            intent["years"].append((operator,) + numbers)
+            return True
+        metric, intent["range_metric"] = intent["range_metric"], None
+        if metric is None:
+            # "price below 50000 and above 200000": the second range has no metric of its own
+            return False
+        intent["ranges"].append((metric, operator) + numbers)
+        return True
+
+    def _resolve(self, intent):
+        """Settle the parsed pieces into one reading, or None when there isn't exactly one"""
+        if intent["or"] and (intent["ranges"] or intent["years"] or len(intent["filters"]) > 1):
+            # Only "Honda or Bajaj" reads as a filter; anything else joined by "or" isn't an AND
+            return None
+        if intent["years"]:
+            if len(intent["year_context"]) != 1:
+                return None
+            column = next(iter(intent["year_context"]))
+            intent["ranges"] += [(column,) + condition for condition in intent["years"]]
+        elif intent["year_context"]:
+            return None
+
+        group = list(dict.fromkeys(intent["group"] + intent["bare"]))
+        # "average price of Honda and Bajaj": compare the named values
+        for column, values in intent["filters"].items():
+            if len(values) > 1 and column not in group and not group:
+                group.append(column)
+        if len(group) > 2:
+            return None
+
+        metric = intent["metric"]
+        if intent["rank_metric"] is not None:
+            if metric not in (None, intent["rank_metric"]):
+                return None
+            metric = intent["rank_metric"]
+        aggregate = intent["aggregate"]
+        superlative = intent["superlative"]
+        count = intent["count"] and metric is None
+        if intent["count"] and metric is not None and aggregate is None and superlative is None:
+            # "how many ... price" means nothing here
+            return None
+        if count:
+            # Also "total number of ..."
+            aggregate = "COUNT"
+        elif metric is None:
+            return None
+
+        limit = intent["limit"]
+        direction = intent["direction"]
+        if group:
+            if aggregate is None and superlative is not None and not intent["cheapest"] and intent["rank_metric"] is None:
+                if intent["bare"]:
+                    # "which state has the highest price": highest average, or the single priciest sale?
+                    return None
+                # "maximum price for each brand"
+                aggregate = "MAX" if superlative == "DESC" else "MIN"
+                superlative = None
+            if aggregate is None:
+                aggregate = "AVG"
+            if superlative is not None:
+                direction = direction or superlative
+                limit = limit or 1
+            shape = "grouped"
+        elif not count and (limit is not None or intent["cheapest"]):
+            # "top 5 Honda motorcycles by price", "the most expensive KTM": the motorcycles themselves
+            shape = "rows"
+            direction = direction or superlative or "DESC"
+            limit = limit or 1
+        else:
+            if aggregate is None:
+                if superlative is None:
+                    return None
+                aggregate = "MAX" if superlative == "DESC" else "MIN"
+            elif superlative is not None:
+                # "highest average price", "the most sales" of what?
+                return None
+            shape = "scalar"
+
+        return {
+            "shape": shape, "group": group, "metric": metric, "aggregate": aggregate,
+            "filters": intent["filters"], "ranges": intent["ranges"],
+            "direction": direction or "DESC", "limit": limit, "confidence": intent["confidence"],
+        }
+
+    def named_values(self, question):
+        """The (column, value) pairs a question names, or None before the values are loaded"""
+        if not self._entities:
+            return None
+        tokens = _tokens(question)
+        found = set()
+        index = 0
+        while index < len(tokens):
+            entity, span = _match(tokens, index, self._entities, self._longest_entity)
+            if entity is not None:
+                found.add(entity)
+            index += span or 1
+        return found
+
+    def generate(self, question, min_confidence=TEMPLATE_SQL_MIN_CONFIDENCE):
+        """SQL for the question, or None when it should go to the LLM"""
+        intent = self.parse(question)
+        if intent is None or intent["confidence"] < min_confidence:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return intent_sql(intent)
+
+    def stats(self):
+        return {
+            "enabled": TEMPLATE_SQL,
+            "ready": self.ready,
+            "data_version": self._version,
+            "values": self.values,
+            "load_ms": round(self.load_seconds * 1000, 1),
+            "loads": self.loads,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def intent_sql(intent):
+    """The SQL statement for a TemplateSQL.parse() intent"""
+    conditions = []
+    for column, values in intent["filters"].items():
+        if len(values) == 1:
+            conditions.append(f"{column} = {_quote(values[0])}")
+        else:
+            conditions.append(f"{column} IN ({', '.join(_quote(value) for value in values)})")
+    for column, operator, *numbers in intent["ranges"]:
+        if operator == "BETWEEN":
+            conditions.append(f"{column} BETWEEN {numbers[0]} AND {numbers[1]}")
+        else:
+            conditions.append(f"{column} {operator} {numbers[0]}")
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    limit = f" LIMIT {intent['limit']}" if intent["limit"] else ""
+
+    if intent["shape"] == "rows":
+        return f"SELECT * FROM {TEMPLATE_TABLE}{where} ORDER BY {intent['metric']} {intent['direction']}{limit};"
+    if intent["aggregate"] == "COUNT":
+        expression, alias = "COUNT(*)", "count"
+    else:
+        expression = f"{intent['aggregate']}({intent['metric']})"
+        alias = f"{intent['aggregate'].lower()}_{intent['metric']}"
+    if intent["shape"] == "scalar":
+        return f"SELECT {expression} AS {alias} FROM {TEMPLATE_TABLE}{where};"
+    group = ", ".join(intent["group"])
+    return f"SELECT {group}, {expression} AS {alias} FROM {TEMPLATE_TABLE}{where} GROUP BY {group} ORDER BY {alias} {intent['direction']}{limit};"
+
+
+_template_sql = None
+_template_sql_lock = threading.Lock()
+
+
+def get_template_sql():
+    """
+    Return the process-wide template parser, or None when neither TEMPLATE_SQL
+    nor the semantic SQL cache (which compares named values with it) is on
+    """
+    global _template_sql
+    if not (TEMPLATE_SQL or question_cache.semantic_enabled):
+        return None
+    if _template_sql is None:
+        with _template_sql_lock:
+            if _template_sql is None:
+                parser = TemplateSQL()
+                engine = get_local_engine()
+                if engine is not None:
+                    engine.add_listener(parser.on_engine_change)
+                    if engine.loaded:
+                        parser.load_in_background(engine)
+                else:
+                    get_version_watcher().add_listener(parser.on_version_change)
+                    parser.load_in_background()
+                question_cache.named_values = parser.named_values
+                _template_sql = parser
+    return _template_sql
+
+
+def template_sql_stats():
+    parser = get_template_sql()
+    return parser.stats() if parser is not None else {"enabled": False}
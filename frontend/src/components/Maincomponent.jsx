@@ -6,6 +6,7 @@ export default function QueryInterface() {
   const [response, setResponse] = useState(null);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   
   const columnMappings = [
@@ -87,23 +88,24 @@ export default function QueryInterface() {
   ];
   
 
-  // Function to submit query to backend API - UPDATED to use GET request
+  // Submit query to the streaming endpoint; the SQL, result rows and summary
+  // are rendered as soon as each one arrives instead of after the whole pipeline
   const handleSubmit = async () => {
     if (!query.trim()) return;
 
     setLoading(true);
     setError(null);
+    setResponse(null);
 
     try {
-      // Changed to GET request with query param named 'text' to match backend
       const response = await fetch(
-        `https://insightgenei-ai.onrender.com/query?text=${encodeURIComponent(
+        `https://insightgenei-ai.onrender.com/query/stream?text=${encodeURIComponent(
           query
         )}`,
         {
           method: "GET",
           headers: {
-            Accept: "application/json",
+            Accept: "application/x-ndjson",
           },
         }
       );
@@ -112,8 +114,57 @@ export default function QueryInterface() {
         throw new Error(`Error: ${response.status}`);
       }
 
-      const data = await response.json();
-      setResponse(data);
+      const applyEvent = (event) => {
+        switch (event.event) {
+          case "sql":
+            setResponse({ sql: event.sql, data: [], summary: "", error: false });
+            break;
+          case "rows": {
+            // Rows arrive as arrays in column order; rebuild records for the table
+            const records = event.rows.map((row) =>
+              Object.fromEntries(event.columns.map((column, i) => [column, row[i]]))
+            );
+            setResponse((prev) => ({ ...prev, data: [...prev.data, ...records] }));
+            break;
+          }
+          case "explanation":
+            setResponse((prev) => ({
+              ...prev,
+              total_count: event.total_count,
+              next_page_token: event.next_page_token,
+            }));
+            break;
+          case "summary":
+            setResponse((prev) => ({ ...prev, summary: prev.summary + event.delta }));
+            break;
+          case "error":
+            if (event.stage === "summary") {
+              setResponse((prev) => ({ ...prev, summary: event.message }));
+            } else {
+              setError(event.message);
+            }
+            break;
+          case "done":
+            setResponse((prev) => (prev ? { ...prev, error: event.error } : prev));
+            break;
+          default:
+            break;
+        }
+      };
+
+      // Each line of the body is one JSON event
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split("\n");
+        buffer = lines.pop();
+        lines.filter((line) => line.trim()).forEach((line) => applyEvent(JSON.parse(line)));
+      }
+      if (buffer.trim()) applyEvent(JSON.parse(buffer));
     } catch (err) {
       setError(err.message || "Failed to fetch response");
       console.error("API Error:", err);
@@ -122,6 +173,34 @@ export default function QueryInterface() {
     }
   };
 
+  // Fetch the next page of rows for the current result (no LLM work server-side)
+  const loadMoreRows = async () => {
+    if (!response?.next_page_token) return;
+    setLoadingMore(true);
+    try {
+      const res = await fetch(
+        `https://insightgenei-ai.onrender.com/query/page?token=${encodeURIComponent(
+          response.next_page_token
+        )}`,
+        { method: "GET", headers: { Accept: "application/json" } }
+      );
+      if (!res.ok) {
+        throw new Error(`Error: ${res.status}`);
+      }
+      const page = await res.json();
+      setResponse((prev) => ({
+        ...prev,
+        data: [...prev.data, ...page.data],
+        next_page_token: page.next_page_token,
+      }));
+    } catch (err) {
+      setError(err.message || "Failed to fetch more rows");
+      console.error("API Error:", err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   // Format currency values
   const formatCurrency = (value) => {
     return new Intl.NumberFormat("en-IN", {
@@ -159,7 +238,7 @@ export default function QueryInterface() {
         <section className="bg-gray-800 p-6 rounded-lg shadow-lg">
           <h2 className="text-2xl font-bold mb-4">Response</h2>
 
-          {loading && (
+          {loading && !response && (
             <div className="flex justify-center items-center min-h-32">
               <div className="animate-pulse text-blue-400">
                 Processing your query... (Note: The first query might take a bit
@@ -180,7 +259,7 @@ export default function QueryInterface() {
             </div>
           )}
 
-          {!loading && !error && response && (
+          {!error && response && (
             <div className="space-y-6">
               {/* Data Table */}
               {response.data && response.data.length > 0 && (
@@ -222,6 +301,20 @@ export default function QueryInterface() {
                       ))}
                     </tbody>
                   </table>
+                  {response.next_page_token && (
+                    <div className="mt-3 flex items-center justify-between text-sm text-gray-400">
+                      <span>
+                        Showing {response.data.length} of {response.total_count} rows
+                      </span>
+                      <button
+                        onClick={loadMoreRows}
+                        disabled={loadingMore}
+                        className="px-4 py-2 bg-gray-700 border border-gray-600 rounded-md text-gray-200 hover:bg-gray-600 disabled:opacity-50"
+                      >
+                        {loadingMore ? "Loading..." : "Load more rows"}
+                      </button>
+                    </div>
+                  )}
                 </div>
               )}
 